@@ -1,6 +1,7 @@
 import { getPost } from "@/lib/queries";
 import { notFound } from "next/navigation";
 import Image from "next/image";
+import { withVariants } from "@/lib/image-loader";
 import ContentBlocksRenderer from "@/components/ContentBlocksRenderer";
 import TripMiniMap from "@/components/TripMiniMap";
 import PostFooter from "@/components/PostFooter";
@@ -63,6 +64,7 @@ export default async function PostDetailPage({ params }: Props) {
     }
   }
   const heroUrl = heroImage?.storage_path || heroImage?.original_url;
+  const heroSrc = heroUrl && withVariants(heroUrl, heroImage?.variants);
 
 
   return (
@@ -72,7 +74,7 @@ export default async function PostDetailPage({ params }: Props) {
         <div className="relative w-full h-[60vh] md:h-[75vh] mb-12 overflow-hidden flex items-end">
           <div className="absolute inset-0 z-0">
             <Image
-              src={heroUrl}
+              src={heroSrc}
               alt={post.title || post.summary || "Hero Image"}
               fill
               priority
@@ -2,6 +2,7 @@
 
 import React, { useState, useEffect, useRef } from "react";
 import Image from "next/image";
+import { withVariants } from "@/lib/image-loader";
 import Link from "next/link";
 import ContentBlocksRenderer from "@/components/ContentBlocksRenderer";
 import PostFooter from "@/components/PostFooter";
@@ -234,7 +235,7 @@ export default function TripContent({ posts, fullPosts, media, tripId }: TripCon
                       {post.thumbnail_path && (
                         <div className="relative w-full sm:w-40 h-40 sm:h-auto shrink-0 bg-cream">
                           <Image
-                            src={post.thumbnail_path}
+                            src={withVariants(post.thumbnail_path, post.thumbnail_variants)}
                             alt={post.title || "Post thumbnail"}
                             fill
                             sizes="(max-width: 640px) 100vw, 160px"
@@ -37,6 +37,7 @@ export default async function TripDetailPage({ params }: Props) {
         mood,
         media_count,
         thumbnail_path,
+        thumbnail_variants,
         latitude,
         longitude,
         country:countries(name, iso_code)
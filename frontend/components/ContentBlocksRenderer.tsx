@@ -1,5 +1,6 @@
 import React from "react";
 import Image from "next/image";
+import { withVariants } from "@/lib/image-loader";
 
 type ContentBlocksRendererProps = {
   blocks: any[];
@@ -182,7 +183,7 @@ function renderImageBlock(block: any, blockIndex: number, mediaList: any[], post
                 style={{ aspectRatio: aspect }}
               >
                 <Image
-                  src={url}
+                  src={withVariants(url, media.variants)}
                   alt={media.alt_text || block.alt_text || "Travel Photo"}
                   fill
                   sizes="(max-width: 768px) 100vw, 50vw"
@@ -300,7 +301,7 @@ function renderImageBlockWithoutOuterGrid(block: any, blockIndex: number, mediaL
               style={{ aspectRatio: aspect }}
             >
               <Image
-                src={url}
+                src={withVariants(url, media.variants)}
                 alt={media.alt_text || block.alt_text || "Travel Photo"}
                 fill
                 sizes="(max-width: 768px) 100vw, 50vw"
@@ -402,10 +403,18 @@ function renderVideoBlock(block: any, blockIndex: number, mediaList: any[], post
   return (
     <div key={blockIndex} className="my-10">
       {blockMedia.map((media: any, i: number) => {
-        const url = media.storage_path || media.original_url;
+        // Web-Rendition + Poster (preprocessing/video_renditions.py), sonst Original
+        const url = media.rendition_path || media.storage_path || media.original_url;
         return (
           <div key={media.media_id || i} className="group overflow-hidden border border-ink/5 rounded-sm shadow-sm">
-            <video src={url} controls playsInline preload="metadata" className="w-full h-auto max-h-[70vh] bg-ink" />
+            <video
+              src={url}
+              poster={media.poster_path || undefined}
+              controls
+              playsInline
+              preload={media.poster_path ? "none" : "metadata"}
+              className="w-full h-auto max-h-[70vh] bg-ink"
+            />
             {(media.caption || block.caption) && (
               <div className="p-3 bg-white border-t border-ink/5">
                 <p className="text-xs text-dust font-body italic">{media.caption || block.caption}</p>
@@ -431,10 +440,18 @@ function renderVideoBlockWithoutOuterGrid(block: any, blockIndex: number, mediaL
   return (
     <div key={blockIndex} className="space-y-4">
       {blockMedia.map((media: any, i: number) => {
-        const url = media.storage_path || media.original_url;
+        // Web-Rendition + Poster (preprocessing/video_renditions.py), sonst Original
+        const url = media.rendition_path || media.storage_path || media.original_url;
         return (
           <div key={media.media_id || i} className="group overflow-hidden border border-ink/5 rounded-sm shadow-sm">
-            <video src={url} controls playsInline preload="metadata" className="w-full h-auto max-h-[70vh] bg-ink" />
+            <video
+              src={url}
+              poster={media.poster_path || undefined}
+              controls
+              playsInline
+              preload={media.poster_path ? "none" : "metadata"}
+              className="w-full h-auto max-h-[70vh] bg-ink"
+            />
             {(media.caption || block.caption) && (
               <div className="p-3 bg-white border-t border-ink/5">
                 <p className="text-xs text-dust font-body italic">{media.caption || block.caption}</p>
@@ -1,8 +1,52 @@
 import type { ImageLoaderProps } from 'next/image'
+import type { MediaVariants } from './types'
+
+// Responsive Derivate in R2 (preprocessing/image_variants.py):
+//   {R2_PUBLIC_URL}/{variants.base}/w{width}.webp
+// Ein normaler R2-Bucket ignoriert ?width=, deshalb wird auf das Derivat umgeschrieben –
+// aber nur, wenn media.variants (bzw. thumbnail_variants) die Breite auch listet.
+// Ältere Uploads und fehlgeschlagene Derivat-Jobs haben keine, dann bleibt es beim Original.
+const R2_PUBLIC_URL = (process.env.NEXT_PUBLIC_R2_PUBLIC_URL || "").replace(/\/$/, "");
+const VARIANTS_ENABLED = process.env.NEXT_PUBLIC_R2_VARIANTS === "1";
+const VARIANTS_FRAGMENT = "#variants=";
+
+// Der Loader sieht nur src und width, deshalb reisen die vorhandenen Derivate im
+// Fragment mit (wird nie an den Server geschickt):
+//   <Image src={withVariants(media.storage_path, media.variants)} ... />
+export function withVariants(src: string, variants: MediaVariants | null | undefined): string {
+  if (!src || !variants?.base || !variants.widths?.length || !variants.formats?.includes("webp")) {
+    return src;
+  }
+  return `${src}${VARIANTS_FRAGMENT}${encodeURIComponent(variants.base)}:${variants.widths.join(",")}`;
+}
+
+function variantUrl(fragment: string, width: number): string | null {
+  if (!VARIANTS_ENABLED || !R2_PUBLIC_URL || !fragment) {
+    return null;
+  }
+  const [base, widthList] = fragment.split(":");
+  const widths = (widthList || "")
+    .split(",")
+    .map(Number)
+    .filter((w) => w > 0)
+    .sort((a, b) => a - b);
+  // Breiter als das größte Derivat (z.B. Lightbox) → Original
+  const target = widths.find((w) => w >= width);
+  if (!base || !target) {
+    return null;
+  }
+  return `${R2_PUBLIC_URL}/${decodeURIComponent(base)}/w${target}.webp`;
+}
 
 export default function myLoader({ src, width, quality }: ImageLoaderProps) {
-  if (src.includes('?')) {
-    return `${src}&width=${width}`;
+  const marker = src.indexOf(VARIANTS_FRAGMENT);
+  const url = marker === -1 ? src : src.slice(0, marker);
+  const variant = marker === -1 ? null : variantUrl(src.slice(marker + VARIANTS_FRAGMENT.length), width);
+  if (variant) {
+    return variant;
+  }
+  if (url.includes('?')) {
+    return `${url}&width=${width}`;
   }
-  return `${src}?width=${width}`;
+  return `${url}?width=${width}`;
 }
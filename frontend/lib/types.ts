@@ -103,6 +103,15 @@ export type PostInsert = {
 // MEDIA
 // ────────────────────────────────────────────────────────────
 
+// Responsive Derivate (preprocessing/image_variants.py): {base}/w{width}.{format}
+export type MediaVariants = {
+  base: string;
+  widths: number[];
+  formats: ("webp" | "avif")[];
+  width: number;
+  height: number;
+};
+
 export type Media = {
   media_id: number;
   post_id: string;
@@ -128,10 +137,13 @@ export type Media = {
   focal_length: number | null;
   photo_taken_at: string | null;
   duration_seconds: number | null;
+  poster_path: string | null;
+  rendition_path: string | null;
   provider: string | null;
   alt_text: string | null;
   caption: string | null;
   tags: string[] | null;
+  variants: MediaVariants | null;
   created_at: string;
 };
 
@@ -289,6 +301,7 @@ export type TimelineRow = {
 
 export type PostWithThumbnail = Post & {
   thumbnail_path: string | null;
+  thumbnail_variants: MediaVariants | null;
 };
 
 // ────────────────────────────────────────────────────────────
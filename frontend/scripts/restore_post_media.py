@@ -4,10 +4,13 @@ import sys
 import psycopg2
 import urllib.request
 import json
-import boto3
 from pathlib import Path
 from dotenv import load_dotenv
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "preprocessing"))
+from media_index import MediaIndex, BLOG_MEDIA_DIR
+from storage_backend import get_storage
+
 # Load env variables from root env
 dotenv_path = "/home/simple_simon/Codes/traveling_planet_earth/.env"
 load_dotenv(dotenv_path)
@@ -18,10 +21,6 @@ db_host = "aws-1-eu-west-1.pooler.supabase.com"
 db_port = "5432"
 db_name = "postgres"
 
-R2_ACCOUNT_ID = os.getenv("R2_ACCOUNT_ID")
-R2_ACCESS_KEY = os.getenv("R2_ACCESS_KEY")
-R2_SECRET_KEY = os.getenv("R2_SECRET_KEY")
-R2_BUCKET_NAME = "simplestravelmedia"
 R2_PUBLIC_URL = os.getenv("R2_PUBLIC_URL")
 
 conn_str = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
@@ -60,18 +59,15 @@ def main():
             print(json.dumps({"success": True, "restored": 0, "message": "No image blocks found in the post content blocks."}))
             sys.exit(0)
             
-        # Set up R2 client
-        s3 = boto3.client(
-            "s3",
-            endpoint_url=f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com",
-            aws_access_key_id=R2_ACCESS_KEY,
-            aws_secret_access_key=R2_SECRET_KEY,
-            region_name="auto"
-        )
+        # Set up R2 (or STORAGE_BACKEND=local)
+        storage = get_storage()
         
         restored_count = 0
         skipped_upload_count = 0
         
+        # Index the post's local folders once (media/POST_ID and media/blog_media/POST_ID)
+        media_index = MediaIndex(post_ids=[post_id])
+        
         for block_index, block in image_blocks:
             media_list = block.get("media", [])
             if not media_list:
@@ -83,23 +79,9 @@ def main():
             width = img_info.get("width")
             height = img_info.get("height")
             
-            # 1. Determine extension and local filepath by searching local directories
-            local_dirs = [
-                f"/home/simple_simon/Codes/traveling_planet_earth/media/blog_media/{post_id}",
-                f"/home/simple_simon/Codes/traveling_planet_earth/media/{post_id}"
-            ]
-            local_file = None
-            extension = None
-            
-            for ldir in local_dirs:
-                if os.path.exists(ldir):
-                    for fname in os.listdir(ldir):
-                        if fname.startswith(f"block_{block_index}_img_") or fname.startswith(f"block_{block_index}_"):
-                            local_file = os.path.join(ldir, fname)
-                            extension = Path(fname).suffix.lower()
-                            break
-                    if local_file:
-                        break
+            # 1. Determine extension and local filepath from the index (blog_media first)
+            local_file = media_index.find_block(post_id, block_index, prefer=BLOG_MEDIA_DIR)
+            extension = Path(local_file).suffix.lower() if local_file else None
             
             # 2. If no local file is found, try to download from Tumblr URL
             if not local_file:
@@ -141,22 +123,12 @@ def main():
             mime_type = content_types.get(extension, "image/jpeg")
             
             # Check if file already exists in R2 to avoid duplicates
-            r2_exists = False
-            try:
-                s3.head_object(Bucket=R2_BUCKET_NAME, Key=r2_key)
-                r2_exists = True
+            r2_exists = storage.exists(r2_key)
+            if r2_exists:
                 skipped_upload_count += 1
-            except Exception:
-                r2_exists = False
-                
-            if not r2_exists:
+            else:
                 # Upload to R2
-                s3.upload_file(
-                    local_file,
-                    R2_BUCKET_NAME,
-                    r2_key,
-                    ExtraArgs={"ContentType": mime_type}
-                )
+                storage.put(local_file, r2_key, content_type=mime_type)
                 
             r2_url = f"{R2_PUBLIC_URL}/{r2_key}"
             
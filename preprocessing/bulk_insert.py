@@ -0,0 +1,53 @@
+"""
+Gebündelte INSERTs über PostgREST.
+
+Statt eines Requests pro Zeile gehen bis zu `batch_size` Zeilen als ein
+Array-Insert raus. Schlägt ein Batch fehl (z.B. weil eine Zeile einen
+Constraint verletzt), wird er halbiert und beide Hälften werden erneut
+versucht, bis die fehlerhaften Zeilen isoliert sind. Eine kaputte Zeile
+kostet so ~2·log2(batch_size) zusätzliche Requests, nicht den ganzen Batch.
+
+Usage:
+    result = insert_rows(supabase, "media", rows)
+    result["inserted"]   # eingefügte Zeilen (mit returning=True: Antwort der DB inkl. IDs)
+    result["failed"]     # [(zeile, fehlermeldung)]
+"""
+
+from postgrest.types import ReturnMethod
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def insert_rows(supabase, table: str, rows: list, batch_size: int = DEFAULT_BATCH_SIZE,
+                returning: bool = False) -> dict:
+    """
+    `rows` in Batches einfügen; fehlerhafte Batches werden per Halbierung aufgelöst.
+
+    Zeilen dürfen unterschiedliche Spalten haben – fehlende Spalten werden NULL
+    (PostgREST `columns` = Vereinigung aller Keys).
+
+    Returns:
+        dict: {"inserted": [...], "failed": [(zeile, fehler)], "requests": Anzahl HTTP-Requests}
+    """
+    result = {"inserted": [], "failed": [], "requests": 0}
+    for start in range(0, len(rows), batch_size):
+        _insert_bisect(supabase, table, rows[start:start + batch_size], returning, result)
+    return result
+
+
+def _insert_bisect(supabase, table: str, batch: list, returning: bool, result: dict):
+    result["requests"] += 1
+    try:
+        response = supabase.table(table).insert(
+            batch,
+            returning=ReturnMethod.representation if returning else ReturnMethod.minimal,
+        ).execute()
+    except Exception as e:
+        if len(batch) == 1:
+            result["failed"].append((batch[0], str(e)))
+            return
+        middle = len(batch) // 2
+        _insert_bisect(supabase, table, batch[:middle], returning, result)
+        _insert_bisect(supabase, table, batch[middle:], returning, result)
+        return
+    result["inserted"].extend(response.data if returning else batch)
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+COPY-Loader für Komplett-Neuaufbau und Disaster Recovery.
+
+Statt JSON über PostgREST werden posts, media und content_blocks aus dem
+Tumblr-Export per `COPY ... FROM STDIN` direkt in Postgres gestreamt:
+
+    1. Export einmal lesen; Zeilen wie in migrate_json_to_supa.py aufbauen
+       (posts gehen direkt in den COPY, media/blocks in Spool-Dateien)
+    2. COPY in temporäre Staging-Tabellen (ON COMMIT DROP)
+    3. INSERT ... SELECT ... ON CONFLICT in die echten Tabellen
+    4. COMMIT – alles oder nichts, eine Transaktion
+
+posts folgt dem aktuellen Schema wie sql/ingest_post.sql: das heuristische
+Land landet in country_old, country_id wird beim Merge über countries.name
+aufgelöst, trip_id über den Trip, in dessen Zeitraum der Post fällt, und
+actual_date fällt auf post_date zurück.
+
+Vorhandene Zeilen bleiben standardmäßig unangetastet (ON CONFLICT DO NOTHING).
+Mit --overwrite werden sie aus dem Export aktualisiert; Spalten, die später
+gepflegt werden (Titel, Ort, Land, Trip, Reisedatum, Begleiter,
+storage_path), bleiben erhalten.
+
+Usage:
+    python3 copy_loader.py                     # Export laden (neue Zeilen)
+    python3 copy_loader.py --overwrite         # vorhandene Zeilen aktualisieren
+    python3 copy_loader.py --dry-run           # alles laden, dann ROLLBACK
+    python3 copy_loader.py --file export.ndjson.zst
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+
+from migrate_json_to_supa import SupabaseMigrator
+from post_export import iter_posts
+
+# Load env variables
+dotenv_path = os.path.join(os.path.dirname(__file__), "../.env")
+load_dotenv(dotenv_path)
+
+db_user = os.environ.get("user", "postgres.sgavinsdlmhiqleczbcx")
+db_password = os.environ.get("password")
+db_host = os.environ.get("host", "aws-1-eu-west-1.pooler.supabase.com")
+db_port = os.environ.get("port", "5432")
+db_name = os.environ.get("database", "postgres")
+
+conn_str = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+
+# Spalten, wie sie SupabaseMigrator._build_*_rows erzeugt (posts.country → country_old, s. post_row)
+POST_COLUMNS = (
+    "post_id", "post_date", "actual_date", "tumblr_timestamp", "slug", "original_url", "short_url",
+    "state", "note_count", "title", "summary", "content_blocks", "layout_info", "country_old",
+    "city", "region", "location_name", "companions", "tags", "media_count", "text_blocks_count",
+)
+MEDIA_COLUMNS = (
+    "post_id", "block_index", "display_order", "media_type", "mime_type", "storage_path",
+    "local_path", "original_url", "tumblr_url", "width", "height", "dominant_colors",
+    "exif_data", "camera_make", "camera_model", "lens", "aperture", "exposure_time", "iso",
+    "focal_length", "photo_taken_at", "alt_text", "provider", "duration_seconds",
+)
+BLOCK_COLUMNS = (
+    "post_id", "block_index", "block_type", "layout_row", "text_content", "text_formatting",
+    "text_subtype", "link_url", "link_title", "link_description",
+)
+
+# Tabelle → (Spalten, Konfliktschlüssel, bei --overwrite nicht anfassen)
+TABLES = {
+    "posts": (POST_COLUMNS, ("post_id",),
+              {"title", "actual_date", "city", "region", "location_name", "country_old",
+               "country_id", "trip_id", "companions"}),
+    "media": (MEDIA_COLUMNS, ("post_id", "block_index", "display_order"), {"storage_path"}),
+    "content_blocks": (BLOCK_COLUMNS, ("post_id", "block_index"), set()),
+}
+
+# Beim Merge berechnete Spalten: Spalte → SQL-Ausdruck über die Staging-Zeile s
+DERIVED_COLUMNS = {
+    "posts": {
+        "actual_date": "COALESCE(s.actual_date, s.post_date)",
+        "country_id": "(SELECT c.country_id FROM countries c WHERE c.name = s.country_old)",
+        # Engster Trip, dessen Zeitraum das Postdatum enthält (wie migrate_countrys_to_supabase.py)
+        "trip_id": "(SELECT t.trip_id FROM trips t "
+                   "WHERE s.post_date::date BETWEEN t.start_date AND t.end_date "
+                   "ORDER BY t.end_date - t.start_date, t.trip_id LIMIT 1)",
+    },
+}
+
+SPOOL_SIZE = 64 * 1024 * 1024  # media/blocks bis 64 MB im Speicher, danach Tempdatei
+
+
+class CopyStream:
+    """Datei-Objekt für `copy_expert`, das Zeilen aus einem Iterator liefert."""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._buffer = ""
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+    readline = read
+
+
+def post_row(builder: SupabaseMigrator, post: dict) -> dict:
+    """posts-Zeile des Migrators für das aktuelle Schema (country wurde zu country_old)."""
+    row = builder._build_post_row(post)
+    row["country_old"] = row.pop("country", None)
+    return row
+
+
+def column_types(cursor, table: str) -> dict:
+    cursor.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = 'public' AND table_name = %s;",
+        (table,),
+    )
+    return dict(cursor.fetchall())
+
+
+def _pg_array(values) -> str:
+    items = []
+    for value in values:
+        if value is None:
+            items.append("NULL")
+        else:
+            items.append('"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"')
+    return "{" + ",".join(items) + "}"
+
+
+def csv_line(row: dict, columns, types: dict) -> str:
+    """
+    Eine CSV-Zeile für COPY (FORMAT csv). NULL = leeres unquotiertes Feld,
+    Strings sind immer quotiert, damit "" ein leerer String bleibt.
+    """
+    unknown = row.keys() - set(columns)
+    if unknown:
+        raise ValueError(f"Unbekannte Spalten für COPY: {sorted(unknown)}")
+    fields = []
+    for column in columns:
+        value = row.get(column)
+        if value is None:
+            fields.append("")
+            continue
+        data_type = types.get(column)
+        if data_type == "ARRAY":
+            value = _pg_array(value)
+        elif data_type in ("json", "jsonb"):
+            value = json.dumps(value, ensure_ascii=False)
+        elif isinstance(value, bool):
+            value = "t" if value else "f"
+        fields.append('"' + str(value).replace('"', '""') + '"')
+    return ",".join(fields) + "\n"
+
+
+class CopyLoader:
+    def __init__(self, json_file: str = None, overwrite: bool = False):
+        # Zeilenaufbau (Heuristiken für Land/Begleiter usw.) aus dem Migrator
+        self.builder = SupabaseMigrator(json_file)
+        self.json_file = self.builder.json_file
+        self.overwrite = overwrite
+        self.staged = {table: 0 for table in TABLES}
+        self.merged = {table: 0 for table in TABLES}
+        self.errors = []
+
+    def _post_lines(self, types: dict, media_spool, block_spool):
+        """Posts als CSV-Zeilen; media/blocks nebenbei in die Spool-Dateien."""
+        for post in iter_posts(self.json_file):
+            try:
+                post_line = csv_line(post_row(self.builder, post), POST_COLUMNS, types["posts"])
+                media_lines = [csv_line(row, MEDIA_COLUMNS, types["media"])
+                               for row in self.builder._build_media_rows(post)]
+                block_lines = [csv_line(row, BLOCK_COLUMNS, types["content_blocks"])
+                               for row in self.builder._build_block_rows(post)]
+            except Exception as e:
+                self.errors.append(f"Post {post.get('id_string')}: {e}")
+                continue
+            media_spool.writelines(media_lines)
+            block_spool.writelines(block_lines)
+            self.staged["media"] += len(media_lines)
+            self.staged["content_blocks"] += len(block_lines)
+            self.staged["posts"] += 1
+            yield post_line
+
+    def _merge_sql(self, table: str) -> str:
+        columns, key, preserve = TABLES[table]
+        derived = DERIVED_COLUMNS.get(table, {})
+        targets = [c for c in columns if c not in derived] + list(derived)
+        values = [f"s.{c}" for c in columns if c not in derived] + \
+                 [f"{expression} AS {c}" for c, expression in derived.items()]
+        keys = ", ".join(key)
+        if self.overwrite:
+            updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in targets if c not in key and c not in preserve)
+            conflict = f"DO UPDATE SET {updates}"
+        else:
+            conflict = "DO NOTHING"
+        # DISTINCT ON: doppelte Posts im Export nur einmal (sonst bricht ON CONFLICT ab)
+        return (f"INSERT INTO {table} ({', '.join(targets)}) "
+                f"SELECT DISTINCT ON ({', '.join(f's.{k}' for k in key)}) {', '.join(values)} "
+                f"FROM stage_{table} s ORDER BY {', '.join(f's.{k}' for k in key)} "
+                f"ON CONFLICT ({keys}) {conflict};")
+
+    def load(self, conn, dry_run: bool = False):
+        cursor = conn.cursor()
+        types = {table: column_types(cursor, table) for table in TABLES}
+
+        for table, (columns, _, _) in TABLES.items():
+            cursor.execute(f"CREATE TEMP TABLE stage_{table} ON COMMIT DROP AS "
+                           f"SELECT {', '.join(columns)} FROM {table} WITH NO DATA;")
+
+        with tempfile.SpooledTemporaryFile(SPOOL_SIZE, mode="w+", encoding="utf-8", newline="") as media_spool, \
+                tempfile.SpooledTemporaryFile(SPOOL_SIZE, mode="w+", encoding="utf-8", newline="") as block_spool:
+            start = time.monotonic()
+            cursor.copy_expert(
+                f"COPY stage_posts ({', '.join(POST_COLUMNS)}) FROM STDIN WITH (FORMAT csv);",
+                CopyStream(self._post_lines(types, media_spool, block_spool)),
+            )
+            for table, spool in (("media", media_spool), ("content_blocks", block_spool)):
+                spool.seek(0)
+                cursor.copy_expert(
+                    f"COPY stage_{table} ({', '.join(TABLES[table][0])}) FROM STDIN WITH (FORMAT csv);",
+                    spool,
+                )
+            print(f"  📥 Staging: {self.staged['posts']} Posts, {self.staged['media']} Media, "
+                  f"{self.staged['content_blocks']} Blocks in {time.monotonic() - start:.1f}s")
+
+        # posts zuerst (Foreign Keys von media/content_blocks)
+        start = time.monotonic()
+        for table in ("posts", "media", "content_blocks"):
+            cursor.execute(self._merge_sql(table))
+            self.merged[table] = cursor.rowcount
+        print(f"  🔀 Merge in {time.monotonic() - start:.1f}s")
+
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+        cursor.close()
+
+    def print_summary(self, dry_run: bool = False):
+        action = "aktualisiert/eingefügt" if self.overwrite else "eingefügt"
+        print("\n" + "=" * 60)
+        print("🧪 DRY RUN (ROLLBACK)" if dry_run else "✅ COPY-LOAD ABGESCHLOSSEN")
+        print("=" * 60)
+        for table, label in (("posts", "Posts"), ("media", "Media"), ("content_blocks", "Blocks")):
+            print(f"  {label:8s} {self.merged[table]:6d} {action}, "
+                  f"{self.staged[table] - self.merged[table]:6d} unverändert (von {self.staged[table]})")
+        if self.errors:
+            print(f"\n⚠️  {len(self.errors)} Posts übersprungen (erste 10):")
+            for error in self.errors[:10]:
+                print(f"  - {error}")
+
+
+def main():
+    dry_run = "--dry-run" in sys.argv
+    overwrite = "--overwrite" in sys.argv
+    json_file = None
+    for i, arg in enumerate(sys.argv):
+        if arg == "--file" and i + 1 < len(sys.argv):
+            json_file = sys.argv[i + 1]
+
+    loader = CopyLoader(json_file, overwrite=overwrite)
+    print(f"📦 Export: {loader.json_file}")
+    print("Connecting to Supabase PostgreSQL database...")
+
+    start = time.monotonic()
+    conn = psycopg2.connect(conn_str)
+    try:
+        loader.load(conn, dry_run=dry_run)
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error during COPY load (rolled back): {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    loader.print_summary(dry_run=dry_run)
+    print(f"\n⏱️  Gesamt: {time.monotonic() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
 import os
 from urllib.parse import urlparse
-import json
+import sys
+import threading
 import requests
 from pathlib import Path
-import time
+from post_export import iter_posts, resolve_export
+from media_manifest import MediaManifest, rel_path_for
+from media_download import (DownloadPool, IncompleteDownload, download_to_file, verify_existing,
+                            DEFAULT_WORKERS, DEFAULT_PER_HOST)
+
+# stats wird von mehreren Download-Threads gleichzeitig aktualisiert
+stats_lock = threading.Lock()
 
 def safe_extension_from_url(url, default="mp4"):
     """
@@ -20,26 +27,42 @@ def safe_extension_from_url(url, default="mp4"):
     return default
 
 
-def download_all_media(json_file="tumblr_posts.json", output_dir="media"):
+def download_all_media(json_file=None, output_dir="media",
+                       workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST, verify=False,
+                       manifest=None):
     """
     Lädt ALLE Medien aus dem Tumblr-Export herunter:
     - Bilder (JPG, PNG, GIF)
     - Videos (MP4, MOV)
     - Audio (MP3, etc.)
+
+    Die Downloads laufen parallel in einem Pool (`workers`), höchstens
+    `per_host` gleichzeitig pro CDN-Host. Mit `verify=True` werden bereits
+    vorhandene Dateien per HEAD auf Vollständigkeit geprüft und bei Bedarf
+    fortgesetzt/neu geladen.
+
+    Jeder Download wird im Media-Manifest (Größe, sha256, Quell-URL)
+    eingetragen; bereits im Manifest als vollständig geführte Dateien werden
+    auch mit `verify=True` nicht erneut geprüft.
     """
     Path(output_dir).mkdir(parents=True, exist_ok=True)
     
-    with open(json_file, 'r', encoding='utf-8') as f:
-        posts = json.load(f)
+    # Export wird Post für Post gestreamt (NDJSON oder Legacy-JSON)
+    json_file = json_file or resolve_export("tumblr_posts")
+    posts = iter_posts(json_file)
     
     stats = {
         'images': 0,
         'videos': 0,
         'audio': 0,
         'skipped': 0,
+        'resumed': 0,
         'errors': []
     }
     
+    pool = DownloadPool(workers=workers, per_host=per_host)
+    manifest = manifest or MediaManifest()
+
     for post_idx, post in enumerate(posts):
         post_id = post.get('id_string', f'unknown_{post_idx}')
         post_dir = Path(output_dir) / post_id
@@ -68,8 +91,7 @@ def download_all_media(json_file="tumblr_posts.json", output_dir="media"):
                     filename = f"block_{block_idx}_img_{media_key}.{extension}"
                     filepath = post_dir / filename
                     
-                    if download_file(url, filepath, stats, 'images'):
-                        print(f"✅ [Images:{stats['images']}, Errors:{len(stats['errors'])}] IMG: {filename}")
+                    pool.submit(download_task, pool, url, filepath, stats, 'images', 'IMG', verify, manifest)
             
             # === VIDEOS ===
             elif block_type == 'video':
@@ -95,8 +117,7 @@ def download_all_media(json_file="tumblr_posts.json", output_dir="media"):
                     filename = f"block_{block_idx}_video.{extension}"
                     filepath = post_dir / filename
                     
-                    if download_file(video_url, filepath, stats, 'videos'):
-                        print(f"✅ [Videos:{stats['videos']}, Errors:{len(stats['errors'])}] VID: {filename}")
+                    pool.submit(download_task, pool, video_url, filepath, stats, 'videos', 'VID', verify, manifest)
             
             # === AUDIO ===
             elif block_type == 'audio':
@@ -116,8 +137,10 @@ def download_all_media(json_file="tumblr_posts.json", output_dir="media"):
                     filename = f"block_{block_idx}_audio.{extension}"
                     filepath = post_dir / filename
                     
-                    if download_file(audio_url, filepath, stats, 'audio'):
-                        print(f"✅ [Audio:{stats['audio']}, Errors:{len(stats['errors'])}] AUD: {filename}")
+                    pool.submit(download_task, pool, audio_url, filepath, stats, 'audio', 'AUD', verify, manifest)
+    
+    # Auf alle laufenden Downloads warten
+    pool.close()
     
     # Zusammenfassung
     print(f"\n{'='*60}")
@@ -125,6 +148,7 @@ def download_all_media(json_file="tumblr_posts.json", output_dir="media"):
     print(f"✅ Videos heruntergeladen:  {stats['videos']}")
     print(f"✅ Audio heruntergeladen:   {stats['audio']}")
     print(f"⏭️  Übersprungen:           {stats['skipped']}")
+    print(f"↩️  Fortgesetzt (Range):    {stats['resumed']}")
     print(f"❌ Fehler:                  {len(stats['errors'])}")
     print(f"{'='*60}")
     
@@ -139,38 +163,85 @@ def download_all_media(json_file="tumblr_posts.json", output_dir="media"):
         print(f"\n💾 Alle Fehler gespeichert in: download_errors.log")
 
 
-def download_file(url, filepath, stats, media_type):
+def download_task(pool, url, filepath, stats, media_type, label, verify=False, manifest=None):
+    """Download im Worker-Thread inkl. Fortschrittsausgabe"""
+    try:
+        ok = download_file(url, filepath, stats, media_type, pool, verify, manifest)
+    except Exception as e:
+        # Im Thread würde die Exception sonst im Future verschwinden
+        with stats_lock:
+            stats['errors'].append(f"Fehler bei {url}: {str(e)}")
+        return
+    if ok:
+        with stats_lock:
+            counts = f"{media_type.capitalize()}:{stats[media_type]}, Errors:{len(stats['errors'])}"
+        print(f"✅ [{counts}] {label}: {filepath.name}")
+
+
+def download_file(url, filepath, stats, media_type, pool=None, verify=False, manifest=None):
     """
     Hilfsfunktion zum Herunterladen einer Datei
     
     Returns:
         bool: True wenn erfolgreich, False wenn übersprungen/Fehler
     """
-    # Überspringen wenn bereits existiert
-    if filepath.exists():
-        stats['skipped'] += 1
-        return False
+    # Manifest-Schlüssel = POST_ID/datei.ext (wie der R2-Key)
+    rel_path = rel_path_for(filepath)
     
     try:
-        response = requests.get(url, timeout=180)  # Längeres Timeout für Videos
-        response.raise_for_status()
+        # Überspringen wenn bereits existiert (mit verify=True nur, wenn vollständig)
+        if filepath.exists():
+            size = filepath.stat().st_size
+            row = manifest.get(rel_path) if manifest else None
+            known_complete = bool(row and row["downloaded_at"] and row["size"] == size)
+            
+            complete = True
+            if verify and not known_complete:
+                complete = pool.verify(url, filepath) if pool is not None else verify_existing(url, filepath)
+            if complete:
+                if manifest and not known_complete:
+                    manifest.record_download(rel_path, size=size, source_url=url)
+                with stats_lock:
+                    stats['skipped'] += 1
+                return False
+            if manifest:
+                manifest.forget_download(rel_path)
         
-        with open(filepath, 'wb') as f:
-            f.write(response.content)
+        # Gemeinsame Keep-Alive-Session statt einer Verbindung pro Datei;
+        # gestreamt in eine .part-Datei, die erst am Ende umbenannt wird.
+        # Eine .part-Datei aus einem abgebrochenen Lauf wird per Range fortgesetzt.
+        if pool is not None:
+            result = pool.download(url, filepath, hash_algo="sha256")
+        else:
+            result = download_to_file(url, filepath, hash_algo="sha256")
         
-        stats[media_type] += 1
+        if manifest:
+            manifest.record_download(rel_path, size=result["size"], sha256=result["hash"], source_url=url)
         
-        # Pause zwischen Downloads (API-freundlich)
-        time.sleep(0.3)
+        with stats_lock:
+            stats[media_type] += 1
+            if result["resumed_from"]:
+                stats['resumed'] += 1
         
         return True
         
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, IncompleteDownload) as e:
         error_msg = f"Fehler bei {url}: {str(e)}"
-        stats['errors'].append(error_msg)
+        with stats_lock:
+            stats['errors'].append(error_msg)
         return False
 
 
 if __name__ == "__main__":
+    # Parallelität anpassen: python3 download_files.py --workers 16 --per-host 6
+    # Vorhandene Dateien gegen Content-Length prüfen: python3 download_files.py --verify
+    workers = DEFAULT_WORKERS
+    per_host = DEFAULT_PER_HOST
+    for i, arg in enumerate(sys.argv):
+        if arg == "--workers" and i + 1 < len(sys.argv):
+            workers = int(sys.argv[i + 1])
+        if arg == "--per-host" and i + 1 < len(sys.argv):
+            per_host = int(sys.argv[i + 1])
+
     print("🚀 Starte Download aller Medien...")
-    download_all_media()
\ No newline at end of file
+    download_all_media(workers=workers, per_host=per_host, verify="--verify" in sys.argv)
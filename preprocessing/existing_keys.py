@@ -0,0 +1,33 @@
+"""
+Was ist schon in der DB? – einmal laden statt pro Post fragen.
+
+Statt `select('post_id').eq('post_id', ...)` pro Post werden alle
+vorhandenen Schlüssel in einem Durchlauf per Keyset-Pagination geladen
+(`WHERE key > letzter_key ORDER BY key LIMIT 1000` – anders als OFFSET
+bleibt jede Seite ein Index-Scan, auch am Ende der Tabelle).
+
+Usage:
+    post_ids = load_post_ids(supabase)          # {"123", ...}
+    if post_id in post_ids: ...
+"""
+
+PAGE_SIZE = 1000  # PostgREST max-rows
+
+
+def keyset_scan(supabase, table: str, columns: str, key: str, page_size: int = PAGE_SIZE):
+    """Alle Zeilen von `table`, seitenweise nach `key` (eindeutig, indiziert) sortiert."""
+    last = None
+    while True:
+        query = supabase.table(table).select(columns).order(key).limit(page_size)
+        if last is not None:
+            query = query.gt(key, last)
+        rows = query.execute().data
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1][key]
+
+
+def load_post_ids(supabase, page_size: int = PAGE_SIZE) -> set:
+    return {row["post_id"] for row in keyset_scan(supabase, "posts", "post_id", "post_id", page_size)}
+
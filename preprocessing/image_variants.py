@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Responsive Bild-Derivate für R2.
+
+Ein normaler R2-Bucket ignoriert `?width=` (frontend/lib/image-loader.ts),
+deshalb liefert jede Karte/Popup sonst das Original in voller Auflösung. Hier
+werden feste Breiten in WebP (und AVIF, falls Pillow es kann) erzeugt und
+unter vorhersagbaren Keys hochgeladen:
+
+    variants/POST_ID/block_0_img_abc/w640.webp
+    variants/POST_ID/block_0_img_abc/w640.avif
+
+Das Rendern läuft in einem Prozess-Pool (CPU-gebunden), die Uploads im
+Thread-Pool von r2_upload. Die Derivate werden in `media.variants` (JSONB)
+vermerkt (sql/add_media_variants.sql).
+
+Usage:
+    python3 image_variants.py --backfill              # alle Bilder ohne Derivate
+    python3 image_variants.py --backfill --limit 50   # nur 50 Bilder
+    python3 image_variants.py --backfill --force      # auch vorhandene neu erzeugen
+    python3 image_variants.py --backfill --workers 8  # Render-Prozesse (Standard: CPU-Kerne)
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+from dotenv import load_dotenv
+from PIL import Image, ImageOps, features
+from supabase import create_client
+
+from media_download import download_to_file
+from media_index import MediaIndex, LOCAL_MEDIA_PATH
+from r2_upload import UploadEngine, get_storage
+from storage_path_writer import StoragePathWriter
+
+# Muss zu VARIANT_WIDTHS in frontend/lib/image-loader.ts passen
+VARIANT_WIDTHS = (320, 640, 1024, 1600)
+VARIANT_FORMATS = ("webp", "avif") if features.check("avif") else ("webp",)
+VARIANTS_PREFIX = "variants"
+QUALITY = {"webp": 80, "avif": 55}
+
+# Animierte GIFs und Vektorgrafiken bleiben Originale
+SOURCE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
+
+RPC_NAME = "bulk_update_media_variants"
+
+
+def variant_base(r2_key: str) -> str:
+    """"POST_ID/block_0_img_abc.jpg" → "variants/POST_ID/block_0_img_abc\""""
+    return f"{VARIANTS_PREFIX}/{os.path.splitext(r2_key)[0]}"
+
+
+def variant_key(r2_key: str, width: int, fmt: str) -> str:
+    return f"{variant_base(r2_key)}/w{width}.{fmt}"
+
+
+def has_variants(path) -> bool:
+    return Path(str(path).split("?")[0]).suffix.lower() in SOURCE_EXTENSIONS
+
+
+def render_variants(source: str, out_dir: str, widths=VARIANT_WIDTHS, formats=VARIANT_FORMATS) -> dict:
+    """
+    Erzeugt alle Breiten × Formate eines Bildes (läuft im Worker-Prozess).
+
+    `source` darf ein lokaler Pfad oder eine URL sein (wird dann erst geladen).
+    Breiten über der Originalbreite werden nicht hochskaliert, sondern in
+    Originalbreite abgelegt – so existiert jeder Key, den der Loader anfragt.
+
+    Returns:
+        dict: {"width", "height", "source_size", "files": [(width, format, pfad, bytes), ...]}
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    if source.startswith("http"):
+        local = out_dir / f"source{Path(source.split('?')[0]).suffix}"
+        download_to_file(source, local)
+        source = str(local)
+
+    files = []
+    with Image.open(source) as img:
+        orig_w, orig_h = img.size
+        if img.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+            # EXIF-Rotation um 90°: Hochformat nach exif_transpose
+            orig_w, orig_h = orig_h, orig_w
+        # JPEG: direkt verkleinert dekodieren (DCT-Skalierung), spart Zeit und RAM
+        img.draft("RGB", (max(widths), max(widths)))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+
+        # Von groß nach klein, jede Stufe aus der vorherigen (schneller als immer vom Original)
+        current = img
+        for width in sorted(widths, reverse=True):
+            target_w = min(width, current.width)
+            if target_w != current.width:
+                target_h = max(1, round(current.height * target_w / current.width))
+                current = current.resize((target_w, target_h), Image.LANCZOS)
+            for fmt in formats:
+                path = out_dir / f"w{width}.{fmt}"
+                if fmt == "webp":
+                    current.save(path, "WEBP", quality=QUALITY[fmt], method=4)
+                else:
+                    current.save(path, "AVIF", quality=QUALITY[fmt])
+                files.append((width, fmt, str(path), path.stat().st_size))
+
+    return {"width": orig_w, "height": orig_h, "source_size": os.path.getsize(source), "files": files}
+
+
+class VariantPipeline:
+    """
+    Rendern im Prozess-Pool → Upload im Thread-Pool → `media.variants` per Write-Behind.
+
+    Args:
+        storage: Speicher-Backend (storage_backend.get_storage)
+        writer: StoragePathWriter(column="variants", rpc_name=RPC_NAME)
+        workers: Render-Prozesse
+        upload_workers: parallele Uploads
+    """
+
+    def __init__(self, storage, writer, workers: int = None, upload_workers: int = 16):
+        self.workers = workers or os.cpu_count() or 2
+        self.writer = writer
+        self.engine = UploadEngine(storage, workers=upload_workers)
+        self.tmp_root = Path(tempfile.mkdtemp(prefix="variants_"))
+        self.stats = {"images": 0, "files": 0, "errors": 0, "source_bytes": 0, "w640_bytes": 0}
+        self._open = {}  # media_id → {"remaining", "failed", "variants", "dir"}
+
+    def run(self, jobs):
+        """
+        jobs: Iterable von (media_id, quelle, r2_key); quelle = lokaler Pfad oder URL.
+        Es sind höchstens 2×workers Bilder gleichzeitig in Arbeit (konstanter Speicher).
+        """
+        pending = {}
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for media_id, source, r2_key in jobs:
+                if len(pending) >= self.workers * 2:
+                    self._collect(pending)
+                out_dir = self.tmp_root / str(media_id)
+                future = pool.submit(render_variants, str(source), str(out_dir))
+                pending[future] = (media_id, r2_key, out_dir)
+                self._book_uploads(wait_all=False)
+            while pending:
+                self._collect(pending)
+        self._book_uploads(wait_all=True)
+        self.engine.close()
+        shutil.rmtree(self.tmp_root, ignore_errors=True)
+        return self.stats
+
+    def _collect(self, pending):
+        """Wartet auf mindestens ein fertig gerendertes Bild und reiht es zum Upload ein."""
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        for future in done:
+            media_id, r2_key, out_dir = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"  ❌ Render-Fehler media_id {media_id} ({r2_key}): {e}")
+                self.stats["errors"] += 1
+                shutil.rmtree(out_dir, ignore_errors=True)
+                continue
+
+            self._open[media_id] = {
+                "remaining": len(result["files"]),
+                "failed": False,
+                "dir": out_dir,
+                "variants": {
+                    "base": variant_base(r2_key),
+                    "widths": list(VARIANT_WIDTHS),
+                    "formats": list(VARIANT_FORMATS),
+                    "width": result["width"],
+                    "height": result["height"],
+                },
+            }
+            self.stats["source_bytes"] += result["source_size"]
+            for width, fmt, path, size in result["files"]:
+                if width == 640 and fmt == "webp":
+                    self.stats["w640_bytes"] += size
+                self.engine.submit(path, variant_key(r2_key, width, fmt), tag=media_id)
+        self._book_uploads(wait_all=False)
+
+    def _book_uploads(self, wait_all: bool):
+        """Hochgeladene Derivate verbuchen; komplette Bilder in `media.variants` eintragen."""
+        for result in self.engine.results(wait=wait_all):
+            media_id = result["tag"]
+            entry = self._open[media_id]
+            entry["remaining"] -= 1
+            if result["error"]:
+                entry["failed"] = True
+                print(f"  ❌ Upload-Fehler {result['r2_key']}: {result['error']}")
+            else:
+                self.stats["files"] += 1
+
+            if entry["remaining"] == 0:
+                del self._open[media_id]
+                shutil.rmtree(entry["dir"], ignore_errors=True)
+                if entry["failed"]:
+                    self.stats["errors"] += 1
+                    continue
+                self.writer.add(media_id, entry["variants"])
+                self.stats["images"] += 1
+                if self.stats["images"] % 50 == 0:
+                    print(f"  🖼️  {self.stats['images']} Bilder mit Derivaten")
+
+    def summary(self) -> str:
+        s = self.stats
+        ratio = f", w640.webp = {s['w640_bytes'] / s['source_bytes'] * 100:.1f}% der Originalgröße" \
+            if s["source_bytes"] and s["w640_bytes"] else ""
+        return f"Derivate: {s['images']} Bilder, {s['files']} Dateien, {s['errors']} Fehler{ratio}"
+
+
+def make_variants_writer(supabase):
+    return StoragePathWriter(supabase, column="variants", rpc_name=RPC_NAME)
+
+
+def create_variants(storage, supabase, jobs, workers: int = None) -> str:
+    """Derivate für (media_id, lokaler Pfad, r2_key)-Jobs erzeugen. Gibt die Zusammenfassung zurück."""
+    jobs = [job for job in jobs if has_variants(job[2])]
+    if not jobs:
+        return "Derivate: keine Bilder"
+    writer = make_variants_writer(supabase)
+    pipeline = VariantPipeline(storage, writer, workers=workers)
+    pipeline.run(jobs)
+    writer.close()
+    return pipeline.summary()
+
+
+# ============================================================================
+# BACKFILL
+# ============================================================================
+
+def backfill(limit: int = None, force: bool = False, workers: int = None):
+    """Derivate für alle vorhandenen Bilder in R2 nachziehen."""
+    load_dotenv()
+    r2_public_url = os.getenv("R2_PUBLIC_URL", "").rstrip("/")
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+    storage = get_storage()
+
+    print("\n📥 Lade Bild-Einträge aus DB...")
+    rows = []
+    page_size = 1000
+    offset = 0
+    while True:
+        query = supabase.table("media") \
+            .select("media_id, local_path, storage_path") \
+            .eq("media_type", "image") \
+            .not_.is_("storage_path", "null")
+        if not force:
+            query = query.is_("variants", "null")
+        result = query.order("media_id").range(offset, offset + page_size - 1).execute()
+        if not result.data:
+            break
+        rows.extend(result.data)
+        if len(result.data) < page_size:
+            break
+        offset += page_size
+
+    # Nur Bilder, die im Bucket liegen; lokale Datei bevorzugt, sonst aus R2 laden
+    index = MediaIndex(LOCAL_MEDIA_PATH)
+    jobs = []
+    for row in rows:
+        storage_path = row["storage_path"]
+        if not storage_path.startswith(f"{r2_public_url}/"):
+            continue
+        r2_key = storage_path[len(r2_public_url) + 1:].split("?")[0]
+        if not has_variants(r2_key):
+            continue
+        local = index.find(r2_key)
+        jobs.append((row["media_id"], local or storage_path, r2_key))
+    if limit:
+        jobs = jobs[:limit]
+
+    print(f"📊 {len(jobs)} Bilder ohne Derivate ({sum(1 for j in jobs if not j[1].startswith('http'))} lokal)")
+    print(f"   Breiten: {', '.join(map(str, VARIANT_WIDTHS))} | Formate: {', '.join(VARIANT_FORMATS)}\n")
+    print(f"✅ {create_variants(storage, supabase, jobs, workers=workers)}")
+
+
+if __name__ == "__main__":
+    limit = None
+    workers = None
+    for i, arg in enumerate(sys.argv):
+        if arg == "--limit" and i + 1 < len(sys.argv):
+            limit = int(sys.argv[i + 1])
+        if arg == "--workers" and i + 1 < len(sys.argv):
+            workers = int(sys.argv[i + 1])
+
+    if "--backfill" not in sys.argv:
+        print(__doc__)
+        exit(0)
+
+    backfill(limit=limit, force="--force" in sys.argv, workers=workers)
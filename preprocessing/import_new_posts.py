@@ -1,9 +1,25 @@
 #!/usr/bin/env python3
 """
 Tumblr Incremental Import Script
-Fetches posts newer than 2025-11-10 07:50:15 GMT, downloads media locally,
-inserts into Supabase under Trip ID 18, uploads media to Cloudflare R2,
-and updates metadata (countries, actual_date).
+Fetches posts newer than the newest post already in the DB
+(max(posts.tumblr_timestamp)), downloads media locally,
+uploads media to Cloudflare R2, writes each post with its media and
+content blocks atomically via the `ingest_post` RPC (sql/ingest_post.sql)
+under Trip ID 18, and updates metadata (countries, actual_date).
+
+The four steps run as a pipeline (pipeline.py): Tumblr pager → media
+downloader → R2 uploader → DB writer, connected by bounded queues, so
+uploads start with the first downloaded post and DB writes with the
+first uploaded one.
+A stage summary (utilization, waits, queue fill) is printed at the end.
+
+Usage:
+    python3 import_new_posts.py              # posts newer than the DB watermark
+    python3 import_new_posts.py --reimport   # whole trip again; existing posts are
+                                             # diffed, only changes are written/uploaded
+    python3 import_new_posts.py --refresh    # bypass the Tumblr response cache
+    python3 import_new_posts.py --download-workers 8 --upload-workers 8
+    python3 import_new_posts.py --plan       # discovery only: estimated calls, bytes, wall time
 """
 
 import os
@@ -11,22 +27,28 @@ import sys
 import json
 import time
 import re
-import requests
-import boto3
 from pathlib import Path
 from urllib.parse import urlparse
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 from supabase import create_client
+from tumblr_fetch import TumblrFetcher
+from tumblr_cache import ResponseCache
+from media_download import download_to_file
+from media_manifest import MediaManifest, rel_path_for
+from image_variants import create_variants
+from video_renditions import create_renditions
+from r2_upload import get_storage, upload_file, pool_size_for
+from pipeline import Pipeline, Stage, PipelineAborted
+from existing_keys import load_post_ids, PAGE_SIZE
+from post_diff import load_stored_post, diff_post, is_empty, apply_diff, describe, count_requests
+from storage_backend import put_operations
+from run_plan import RunPlan, record_throughput
 
 # 1. Load config
 load_dotenv("/home/simple_simon/Codes/traveling_planet_earth/.env")
 
-# Cloudflare R2 Config
-R2_ACCOUNT_ID = os.getenv("R2_ACCOUNT_ID")
-R2_ACCESS_KEY = os.getenv("R2_ACCESS_KEY")
-R2_SECRET_KEY = os.getenv("R2_SECRET_KEY")
-R2_BUCKET_NAME = "simplestravelmedia"
+# Cloudflare R2 Config (credentials/bucket are read by storage_backend.get_storage)
 R2_PUBLIC_URL = os.getenv("R2_PUBLIC_URL")
 
 # Supabase Config
@@ -43,9 +65,25 @@ TUMBLR_OAUTH_TOKEN = os.getenv("TUMBLR_OAUTH_TOKEN")
 TUMBLR_OAUTH_SECRET = os.getenv("TUMBLR_OAUTH_SECRET")
 BLOG_NAME = "simplestravel.tumblr.com"
 
-# Target oldest post date
+# Pipeline worker pools (pager and DB writer run with one worker each)
+DEFAULT_DOWNLOAD_WORKERS = 8
+DEFAULT_UPLOAD_WORKERS = 8
+
+# Fallback watermark if the posts table is empty (start of Trip 18)
 TARGET_DT = datetime.strptime("2025-11-10 07:50:15", "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
 
+def get_db_watermark(supabase):
+    """Newest tumblr_timestamp already stored in posts (falls back to TARGET_DT)."""
+    res = supabase.table('posts') \
+        .select('tumblr_timestamp') \
+        .not_.is_('tumblr_timestamp', 'null') \
+        .order('tumblr_timestamp', desc=True) \
+        .limit(1) \
+        .execute()
+    if res.data:
+        return int(res.data[0]['tumblr_timestamp'])
+    return int(TARGET_DT.timestamp())
+
 # 2. Date-based Country Partitioning
 def get_country_id_and_name(dt):
     date_str = dt.strftime("%Y-%m-%d")
@@ -79,385 +117,571 @@ def safe_extension_from_url(url, default="jpg"):
         return ext.lstrip(".")
     return default
 
-def download_file(url, filepath):
+def download_file(url, filepath, manifest=None):
     if filepath.exists() and filepath.stat().st_size > 0:
+        if manifest and not manifest.is_downloaded(rel_path_for(filepath)):
+            manifest.record_download(rel_path_for(filepath), size=filepath.stat().st_size, source_url=url)
         return True
     try:
-        response = requests.get(url, timeout=180)
-        response.raise_for_status()
-        with open(filepath, 'wb') as f:
-            f.write(response.content)
+        print(f"  Downloading {rel_path_for(filepath)}...")
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        # Streamed to <file>.part and renamed on completion (constant memory)
+        start = time.monotonic()
+        result = download_to_file(url, filepath, hash_algo="sha256")
+        record_throughput("download", result["size"], time.monotonic() - start)
+        if manifest:
+            manifest.record_download(rel_path_for(filepath), size=result["size"],
+                                     sha256=result["hash"], source_url=url)
         time.sleep(0.2)
         return True
     except Exception as e:
         print(f"    ❌ Error downloading {url}: {e}")
         return False
 
-# 5. Content-Type map for R2 upload
-def get_content_type(filepath):
-    ext = Path(filepath).suffix.lower()
-    content_type_map = {
-        ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".gif": "image/gif", ".webp": "image/webp",
-        ".mp4": "video/mp4", ".webm": "video/webm", ".mov": "video/quicktime",
-        ".mp3": "audio/mpeg", ".wav": "audio/wav", ".ogg": "audio/ogg", ".m4a": "audio/mp4"
-    }
-    return content_type_map.get(ext, "application/octet-stream")
+def fetch_new_posts(fetcher, watermark):
+    """Walk the blog with the `before` cursor (newest first) and stop at the first known post."""
+    return list(fetcher.iter_posts(
+        stop=lambda post: post.get('timestamp', 0) <= watermark,
+        reblog_info=True,
+        notes_info=True,
+        npf=True
+    ))
 
-def main():
-    print("="*60)
-    print("🚀 STARTING INCREMENTAL TUMBLR IMPORT FOR TRIP 18")
-    print("="*60)
+def prepare_post(post, manifest, fetch=download_file):
+    """
+    Download a post's media and build its rows.
+    Returns (post_data, media_records, block_rows); media URLs in the
+    content blocks are rewritten to the local copies. `fetch(url, filepath,
+    manifest)` returns whether the file is available (--plan only checks).
+    Raises if a download failed, so the post is not written without its media
+    and the gapless DB stage stops in front of it.
+    """
+    post_id = post.get('id_string')
+    date_str = post.get('date').replace(" GMT", "")
+    post_dt = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
 
-    # Initialize clients
-    import pytumblr
-    tumblr_client = pytumblr.TumblrRestClient(
-        TUMBLR_CONSUMER_KEY, TUMBLR_CONSUMER_SECRET,
-        TUMBLR_OAUTH_TOKEN, TUMBLR_OAUTH_SECRET
-    )
+    post_media_dir = Path(LOCAL_MEDIA_PATH) / post_id
     
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-    
-    s3 = boto3.client(
-        "s3",
-        endpoint_url=f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com",
-        aws_access_key_id=R2_ACCESS_KEY,
-        aws_secret_access_key=R2_SECRET_KEY,
-        region_name="auto"
-    )
-
-    # Fetch new posts from Tumblr
-    print("\n📥 Fetching new posts from Tumblr...")
-    new_posts = []
-    offset = 0
-    limit = 20
-    done = False
+    content_blocks = post.get('content', [])
+    layout_info = post.get('layout', None)
     
-    while not done:
-        response = tumblr_client.posts(
-            BLOG_NAME,
-            limit=limit,
-            offset=offset,
-            reblog_info=True,
-            notes_info=True,
-            npf=True
-        )
-        
-        posts = response.get("posts", [])
-        if not posts:
-            break
-            
-        for post in posts:
-            date_str = post.get('date').replace(" GMT", "")
-            post_dt = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
-            
-            if post_dt <= TARGET_DT:
-                done = True
-                break
-                
-            new_posts.append(post)
-            
-        if done:
-            break
-        offset += limit
-
-    total_posts = len(new_posts)
-    print(f"✅ Found {total_posts} new posts since target date.")
+    # Determine country and companions
+    country_id, country_name = get_country_id_and_name(post_dt)
+    companions = extract_companions(post)
     
-    # Sort oldest first (chronological order)
-    new_posts = list(reversed(new_posts))
+    media_records = []
+    media_count = 0
+    text_blocks_count = 0
     
-    imported_post_ids = []
-    stats = {"inserted": 0, "skipped": 0, "errors": 0}
+    failed_urls = []
+    def fetched(url, filepath):
+        if fetch(url, filepath, manifest):
+            return True
+        failed_urls.append(url)
+        return False
     
-    for idx, post in enumerate(new_posts, 1):
-        post_id = post.get('id_string')
-        date_str = post.get('date').replace(" GMT", "")
-        post_dt = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
-        
-        print(f"\n[{idx}/{total_posts}] Processing Post: {post_id} ({date_str})")
-        
-        # Check if already exists in DB
-        existing = supabase.table('posts').select('post_id').eq('post_id', post_id).execute()
-        if existing.data:
-            print("  ⚠️ Already exists in DB. Deleting to re-import cleanly...")
-            try:
-                supabase.table('posts').delete().eq('post_id', post_id).execute()
-            except Exception as e:
-                print(f"    ❌ Delete error: {e}")
-            
-        # Create local directory
-        post_media_dir = Path(LOCAL_MEDIA_PATH) / post_id
-        post_media_dir.mkdir(parents=True, exist_ok=True)
+    # Process content blocks and download media
+    for block_idx, block in enumerate(content_blocks):
+        block_type = block.get('type')
         
-        content_blocks = post.get('content', [])
-        layout_info = post.get('layout', None)
-        
-        # Determine country and companions
-        country_id, country_name = get_country_id_and_name(post_dt)
-        companions = extract_companions(post)
-        
-        media_records = []
-        media_count = 0
-        text_blocks_count = 0
-        
-        # Process content blocks and download media
-        for block_idx, block in enumerate(content_blocks):
-            block_type = block.get('type')
+        if block_type == 'text':
+            text_blocks_count += 1
             
-            if block_type == 'text':
-                text_blocks_count += 1
+        elif block_type == 'image':
+            media_items = block.get('media', [])
+            if media_items:
+                # Find the largest media item by dimension (width * height)
+                largest_media = max(media_items, key=lambda m: (m.get('width', 0) or 0) * (m.get('height', 0) or 0))
                 
-            elif block_type == 'image':
-                media_items = block.get('media', [])
-                if media_items:
-                    # Find the largest media item by dimension (width * height)
-                    largest_media = max(media_items, key=lambda m: (m.get('width', 0) or 0) * (m.get('height', 0) or 0))
-                    
-                    url = largest_media.get('url')
-                    if url:
-                        media_key = largest_media.get('media_key', '').split(':')[0]
-                        extension = safe_extension_from_url(url, "jpg")
-                        filename = f"block_{block_idx}_img_{media_key}.{extension}"
-                        filepath = post_media_dir / filename
-                        
-                        print(f"  Downloading image: {filename}...")
-                        if download_file(url, filepath):
-                            media_count += 1
-                            # Update url in JSON block to local path for the frontend
-                            largest_media['original_tumblr_url'] = url
-                            largest_media['url'] = f"/media/{post_id}/{filename}"
-                            
-                            # Prepare media row data
-                            exif_data = block.get('exif', {})
-                            photo_taken_at = None
-                            if exif_data.get('Time'):
-                                try:
-                                    photo_taken_at = datetime.fromtimestamp(exif_data['Time'], tz=timezone.utc).isoformat()
-                                except:
-                                    pass
-                                    
-                            colors = block.get('colors', {})
-                            
-                            media_records.append({
-                                'post_id': post_id,
-                                'block_index': block_idx,
-                                'display_order': 0,
-                                'media_type': 'image',
-                                'mime_type': largest_media.get('type'),
-                                'local_path': f"media/{post_id}/{filename}",
-                                'original_url': url,
-                                'tumblr_url': url,
-                                'width': largest_media.get('width'),
-                                'height': largest_media.get('height'),
-                                'dominant_colors': colors if colors else None,
-                                'exif_data': exif_data if exif_data else None,
-                                'camera_make': exif_data.get('CameraMake'),
-                                'camera_model': exif_data.get('CameraModel'),
-                                'lens': exif_data.get('Lens'),
-                                'aperture': exif_data.get('Aperture'),
-                                'exposure_time': exif_data.get('ExposureTime'),
-                                'iso': exif_data.get('ISO'),
-                                'focal_length': exif_data.get('FocalLength'),
-                                'photo_taken_at': photo_taken_at,
-                                'alt_text': block.get('alt_text')
-                            })
-                        
-            elif block_type == 'video':
-                video_url = None
-                provider = block.get('provider', 'tumblr')
-                if 'media' in block:
-                    video_url = block['media'].get('url')
-                elif 'url' in block:
-                    video_url = block['url']
-                    
-                if video_url and 'tumblr' in video_url.lower():
-                    extension = safe_extension_from_url(video_url, "mp4")
-                    filename = f"block_{block_idx}_video.{extension}"
+                url = largest_media.get('url')
+                if url:
+                    media_key = largest_media.get('media_key', '').split(':')[0]
+                    extension = safe_extension_from_url(url, "jpg")
+                    filename = f"block_{block_idx}_img_{media_key}.{extension}"
                     filepath = post_media_dir / filename
                     
-                    print(f"  Downloading video: {filename}...")
-                    if download_file(video_url, filepath):
+                    if fetched(url, filepath):
                         media_count += 1
-                        # Update in JSON
-                        block['media'] = block.get('media', {})
-                        block['media']['original_tumblr_url'] = video_url
-                        block['media']['url'] = f"/media/{post_id}/{filename}"
-                        if 'url' in block:
-                            block['url'] = f"/media/{post_id}/{filename}"
-                            
+                        # Update url in JSON block to local path for the frontend
+                        largest_media['original_tumblr_url'] = url
+                        largest_media['url'] = f"/media/{post_id}/{filename}"
+                        
+                        # Prepare media row data
+                        exif_data = block.get('exif', {})
+                        photo_taken_at = None
+                        if exif_data.get('Time'):
+                            try:
+                                photo_taken_at = datetime.fromtimestamp(exif_data['Time'], tz=timezone.utc).isoformat()
+                            except:
+                                pass
+                                
+                        colors = block.get('colors', {})
+                        
                         media_records.append({
                             'post_id': post_id,
                             'block_index': block_idx,
                             'display_order': 0,
-                            'media_type': 'video',
+                            'media_type': 'image',
+                            'mime_type': largest_media.get('type'),
                             'local_path': f"media/{post_id}/{filename}",
-                            'original_url': video_url,
-                            'tumblr_url': video_url,
-                            'provider': provider,
-                            'duration_seconds': block.get('duration')
+                            'original_url': url,
+                            'tumblr_url': url,
+                            'width': largest_media.get('width'),
+                            'height': largest_media.get('height'),
+                            'dominant_colors': colors if colors else None,
+                            'exif_data': exif_data if exif_data else None,
+                            'camera_make': exif_data.get('CameraMake'),
+                            'camera_model': exif_data.get('CameraModel'),
+                            'lens': exif_data.get('Lens'),
+                            'aperture': exif_data.get('Aperture'),
+                            'exposure_time': exif_data.get('ExposureTime'),
+                            'iso': exif_data.get('ISO'),
+                            'focal_length': exif_data.get('FocalLength'),
+                            'photo_taken_at': photo_taken_at,
+                            'alt_text': block.get('alt_text')
                         })
-                        
-            elif block_type == 'audio':
-                audio_url = None
-                if 'media' in block:
-                    audio_url = block['media'].get('url')
-                elif 'url' in block:
-                    audio_url = block['url']
                     
-                if audio_url and 'tumblr' in audio_url.lower():
-                    extension = safe_extension_from_url(audio_url, "mp3")
-                    filename = f"block_{block_idx}_audio.{extension}"
-                    filepath = post_media_dir / filename
+        elif block_type == 'video':
+            video_url = None
+            provider = block.get('provider', 'tumblr')
+            if 'media' in block:
+                video_url = block['media'].get('url')
+            elif 'url' in block:
+                video_url = block['url']
+                
+            if video_url and 'tumblr' in video_url.lower():
+                extension = safe_extension_from_url(video_url, "mp4")
+                filename = f"block_{block_idx}_video.{extension}"
+                filepath = post_media_dir / filename
+                
+                if fetched(video_url, filepath):
+                    media_count += 1
+                    # Update in JSON
+                    block['media'] = block.get('media', {})
+                    block['media']['original_tumblr_url'] = video_url
+                    block['media']['url'] = f"/media/{post_id}/{filename}"
+                    if 'url' in block:
+                        block['url'] = f"/media/{post_id}/{filename}"
+                        
+                    media_records.append({
+                        'post_id': post_id,
+                        'block_index': block_idx,
+                        'display_order': 0,
+                        'media_type': 'video',
+                        'local_path': f"media/{post_id}/{filename}",
+                        'original_url': video_url,
+                        'tumblr_url': video_url,
+                        'provider': provider,
+                        'duration_seconds': block.get('duration')
+                    })
                     
-                    print(f"  Downloading audio: {filename}...")
-                    if download_file(audio_url, filepath):
-                        media_count += 1
-                        # Update in JSON
-                        block['media'] = block.get('media', {})
-                        block['media']['original_tumblr_url'] = audio_url
-                        block['media']['url'] = f"/media/{post_id}/{filename}"
-                        if 'url' in block:
-                            block['url'] = f"/media/{post_id}/{filename}"
-                            
-                        media_records.append({
-                            'post_id': post_id,
-                            'block_index': block_idx,
-                            'display_order': 0,
-                            'media_type': 'audio',
-                            'local_path': f"media/{post_id}/{filename}",
-                            'original_url': audio_url,
-                            'tumblr_url': audio_url,
-                            'provider': block.get('provider', 'tumblr')
-                        })
+        elif block_type == 'audio':
+            audio_url = None
+            if 'media' in block:
+                audio_url = block['media'].get('url')
+            elif 'url' in block:
+                audio_url = block['url']
+                
+            if audio_url and 'tumblr' in audio_url.lower():
+                extension = safe_extension_from_url(audio_url, "mp3")
+                filename = f"block_{block_idx}_audio.{extension}"
+                filepath = post_media_dir / filename
+                
+                if fetched(audio_url, filepath):
+                    media_count += 1
+                    # Update in JSON
+                    block['media'] = block.get('media', {})
+                    block['media']['original_tumblr_url'] = audio_url
+                    block['media']['url'] = f"/media/{post_id}/{filename}"
+                    if 'url' in block:
+                        block['url'] = f"/media/{post_id}/{filename}"
+                        
+                    media_records.append({
+                        'post_id': post_id,
+                        'block_index': block_idx,
+                        'display_order': 0,
+                        'media_type': 'audio',
+                        'local_path': f"media/{post_id}/{filename}",
+                        'original_url': audio_url,
+                        'tumblr_url': audio_url,
+                        'provider': block.get('provider', 'tumblr')
+                    })
 
-        # Insert Post in DB
-        summary = post.get('summary', '')
-        if not summary:
-            for b in content_blocks:
-                if b.get('type') == 'text':
-                    summary = b.get('text', '')[:500]
-                    break
+    if failed_urls:
+        raise Exception(f"{len(failed_urls)} media download(s) failed: {', '.join(failed_urls)}")
 
-        post_data = {
+    # Insert Post in DB
+    summary = post.get('summary', '')
+    if not summary:
+        for b in content_blocks:
+            if b.get('type') == 'text':
+                summary = b.get('text', '')[:500]
+                break
+
+    post_data = {
+        'post_id': post_id,
+        'post_date': post_dt.isoformat(),
+        'actual_date': post_dt.isoformat(), # default fallback
+        'tumblr_timestamp': post.get('timestamp'),
+        'slug': post.get('slug'),
+        'original_url': post.get('post_url'),
+        'short_url': post.get('short_url'),
+        'state': post.get('state', 'published'),
+        'note_count': post.get('note_count', 0),
+        'title': None,
+        'summary': summary,
+        'content_blocks': content_blocks,
+        'layout_info': layout_info,
+        'country_id': country_id,
+        'country_old': country_name,
+        'trip_id': 18,
+        'companions': companions,
+        'tags': post.get('tags', []) if post.get('tags') else None,
+        'media_count': media_count,
+        'text_blocks_count': text_blocks_count
+    }
+
+    # Content block rows
+    layout_map = {}
+    if layout_info and layout_info[0].get('display'):
+        for row_idx, row in enumerate(layout_info[0]['display']):
+            for block_idx_layout in row.get('blocks', []):
+                layout_map[block_idx_layout] = row_idx
+
+    block_rows = []
+    for block_idx, block in enumerate(content_blocks):
+        block_data = {
             'post_id': post_id,
-            'post_date': post_dt.isoformat(),
-            'actual_date': post_dt.isoformat(), # default fallback
-            'tumblr_timestamp': post.get('timestamp'),
-            'slug': post.get('slug'),
-            'original_url': post.get('post_url'),
-            'short_url': post.get('short_url'),
-            'state': post.get('state', 'published'),
-            'note_count': post.get('note_count', 0),
-            'title': None,
-            'summary': summary,
-            'content_blocks': content_blocks,
-            'layout_info': layout_info,
-            'country_id': country_id,
-            'country_old': country_name,
-            'trip_id': 18,
-            'companions': companions,
-            'tags': post.get('tags', []) if post.get('tags') else None,
-            'media_count': media_count,
-            'text_blocks_count': text_blocks_count
+            'block_index': block_idx,
+            'block_type': block.get('type'),
+            'layout_row': layout_map.get(block_idx)
         }
+        if block.get('type') == 'text':
+            block_data['text_content'] = block.get('text')
+            block_data['text_formatting'] = block.get('formatting')
+            block_data['text_subtype'] = block.get('subtype')
+        elif block.get('type') == 'link':
+            block_data['link_url'] = block.get('url')
+            block_data['link_title'] = block.get('title')
+            block_data['link_description'] = block.get('description')
+        block_rows.append(block_data)
+
+    return post_data, media_records, block_rows
+
+def upload_targets(manifest, media_records, stored=None):
+    """(media row, local file, r2_key) for each file of a post that still has to go to R2."""
+    stored_paths = {(m['block_index'], m['display_order']): m.get('storage_path')
+                    for m in (stored or {}).get('media') or []}
+    for media_row in media_records:
+        r2_key = media_row['local_path'].removeprefix("media/").lstrip("/") # e.g. post_id/file.jpg
+        
+        # Re-import: only new or changed files (manifest resets uploads on new sha256)
+        key = (media_row['block_index'], media_row['display_order'])
+        if stored_paths.get(key) == f"{R2_PUBLIC_URL}/{r2_key}" and manifest.is_uploaded(r2_key):
+            continue
+        yield media_row, Path(LOCAL_MEDIA_PATH) / r2_key, r2_key
+
+def upload_post_media(storage, manifest, media_records, stored=None):
+    """
+    Upload a post's files to Cloudflare R2 and set storage_path on their rows.
+    Returns {(block_index, display_order): (local file, r2_key)} of the uploaded files.
+    """
+    uploaded = {}
+    for media_row, full_local, r2_key in upload_targets(manifest, media_records, stored):
+        if full_local.exists():
+            print(f"  Uploading {r2_key} to CF R2...")
+            upload_file(storage, full_local, r2_key, manifest=manifest)
+            media_row['storage_path'] = f"{R2_PUBLIC_URL}/{r2_key}"
+            uploaded[(media_row['block_index'], media_row['display_order'])] = (full_local, r2_key)
+            print(f"    ✅ Uploaded: {media_row['storage_path']}")
+    return uploaded
+
+def write_post(supabase, post_data, media_records, block_rows, stored=None, uploaded=None):
+    """
+    Write a post to the DB. Returns (status, media_ids) with status
+    "inserted", "updated" or "unchanged" and media_ids
+    {(block_index, display_order): media_id}.
+    """
+    post_id = post_data['post_id']
+    if stored:
+        # Existing post: only changed columns, media and blocks, in one transaction
+        # (sql/apply_post_diff.sql)
+        diff = diff_post(post_data, media_records, block_rows, stored)
+        if is_empty(diff) and not uploaded:
+            print(f"  ⏭️ {post_id} unchanged.")
+            return "unchanged", {}
+        media_ids = apply_diff(supabase, post_id, diff)
+        print(f"  ✅ {post_id} updated ({describe(diff)}, {len(uploaded or {})} uploads)")
+        return "updated", media_ids
+
+    # New post, media and content blocks in one transaction (sql/ingest_post.sql)
+    result = supabase.rpc('ingest_post', {
+        'doc': {'post': post_data, 'media': media_records, 'blocks': block_rows}
+    }).execute()
+    media_ids = {(row['block_index'], row['display_order']): row['media_id']
+                 for row in result.data['media']}
+    print(f"  ✅ {post_id}: post, {len(media_records)} media, {len(block_rows)} blocks written to DB")
+    return "inserted", media_ids
+
+def plan_import(plan, fetcher, cache, manifest, supabase, watermark, existing_post_ids, reimport):
+    """
+    --plan: page through Tumblr and check local files, the manifest and (with
+    --reimport) the stored rows like a real run would, but download, upload
+    and write nothing. Sizes of files not on disk yet are the manifest's
+    average for their extension.
+    """
+    start = time.monotonic()
+    new_posts = fetch_new_posts(fetcher, watermark)
+    # Pages served from the cache are still API calls in the real run
+    plan.measure("tumblr", fetcher.request_count + cache.hits, time.monotonic() - start)
+    
+    average_sizes = manifest.average_sizes()
+    fallback_size = sum(average_sizes.values()) // len(average_sizes) if average_sizes else 0
+    def estimated_size(path):
+        if path.exists() and path.stat().st_size > 0:
+            return path.stat().st_size
+        return average_sizes.get(path.suffix.lower(), fallback_size)
+    
+    missing = []
+    def check(url, filepath, manifest):
+        if not (filepath.exists() and filepath.stat().st_size > 0):
+            missing.append(filepath)
+            plan.add("download", estimated_size(filepath))
+        return True
+    
+    written = inserted = skipped = unchanged = 0
+    by_type = {}
+    for post in reversed(new_posts):
+        post_id = post.get('id_string')
+        stored = None
+        if post_id in existing_post_ids:
+            if not reimport:
+                skipped += 1
+                continue
+            with plan.timed("postgrest"):
+                stored = load_stored_post(supabase, post_id)
+        
+        post_data, media_records, block_rows = prepare_post(post, manifest, fetch=check)
+        uploads = 0
+        for media_row, full_local, r2_key in upload_targets(manifest, media_records, stored):
+            size = estimated_size(full_local)
+            plan.add("upload", size)
+            plan.add("storage", put_operations(size), timed=False)
+            media_row['storage_path'] = f"{R2_PUBLIC_URL}/{r2_key}"
+            by_type[media_row['media_type']] = by_type.get(media_row['media_type'], 0) + 1
+            uploads += 1
+        
+        if stored:
+            diff = diff_post(post_data, media_records, block_rows, stored)
+            if is_empty(diff) and not uploads:
+                unchanged += 1
+                continue
+            plan.add("postgrest", count_requests(diff))
+        else:
+            plan.add("postgrest")  # ingest_post RPC
+            inserted += 1
+        written += 1
+    
+    plan.add_derivatives(by_type.get('image', 0), by_type.get('video', 0))
+    if inserted:
+        # actual_date backfill (1 read + 1 update per new post) and trip countries (4)
+        plan.add("postgrest", 1 + inserted + 4)
+    plan.note(f"{len(new_posts)} new posts: {written} to write, {skipped} already in DB"
+              + (f", {unchanged} unchanged" if reimport else ""))
+    if missing:
+        plan.note(f"{len(missing)} files to download (sizes estimated from the manifest average)")
+    print(plan.report())
+
+def main():
+    print("="*60)
+    print("🚀 STARTING INCREMENTAL TUMBLR IMPORT FOR TRIP 18")
+    print("="*60)
+
+    download_workers = DEFAULT_DOWNLOAD_WORKERS
+    upload_workers = DEFAULT_UPLOAD_WORKERS
+    for i, arg in enumerate(sys.argv):
+        if arg == "--download-workers" and i + 1 < len(sys.argv):
+            download_workers = int(sys.argv[i + 1])
+        if arg == "--upload-workers" and i + 1 < len(sys.argv):
+            upload_workers = int(sys.argv[i + 1])
+    plan = None
+    if "--plan" in sys.argv:
+        plan = RunPlan("import_new_posts", pipelined=True,
+                       workers={"download": download_workers, "upload": upload_workers,
+                                "storage": upload_workers})
+
+    # Initialize clients
+    import pytumblr
+    tumblr_client = pytumblr.TumblrRestClient(
+        TUMBLR_CONSUMER_KEY, TUMBLR_CONSUMER_SECRET,
+        TUMBLR_OAUTH_TOKEN, TUMBLR_OAUTH_SECRET
+    )
+    
+    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    
+    # R2 (or STORAGE_BACKEND=local for test runs)
+    storage = None if plan else get_storage(max_pool_connections=pool_size_for(upload_workers))
+    
+    # Local media manifest (downloads, R2 uploads, media_id)
+    manifest = MediaManifest()
+    variant_jobs = []  # (media_id, local file, r2_key) for responsive derivatives
+    rendition_jobs = []  # (media_id, local file, r2_key) for video posters/renditions
+
+    # Everything at or below the watermark is already in the DB.
+    # --reimport walks the whole trip again and only writes what changed.
+    reimport = "--reimport" in sys.argv
+    start = time.monotonic()
+    watermark = int(TARGET_DT.timestamp()) if reimport else get_db_watermark(supabase)
+    if plan and not reimport:
+        plan.measure("postgrest", 1, time.monotonic() - start)
+    watermark_dt = datetime.fromtimestamp(watermark, tz=timezone.utc)
+    print(f"\n🔖 {'Re-import from' if reimport else 'DB watermark'}: "
+          f"{watermark_dt.strftime('%Y-%m-%d %H:%M:%S')} GMT")
 
+    # All post_ids in the DB in one paginated sweep instead of one query per post
+    start = time.monotonic()
+    existing_post_ids = load_post_ids(supabase)
+    if plan:
+        plan.measure("postgrest", len(existing_post_ids) // PAGE_SIZE + 1, time.monotonic() - start)
+    
+    # Cached `before` pages make reruns (debugging DB/R2 steps) cheap; the head
+    # page is always fetched live so new posts are never missed. --refresh bypasses
+    cache = ResponseCache(refresh="--refresh" in sys.argv)
+    fetcher = TumblrFetcher(tumblr_client, BLOG_NAME, cache=cache)
+    
+    if plan:
+        plan_import(plan, fetcher, cache, manifest, supabase, watermark, existing_post_ids, reimport)
+        return
+    
+    # Only new posts get the EXIF actual_date backfill; re-imported posts keep
+    # their curated columns and get just the diffed ones (post_diff.POST_SYNC_COLUMNS)
+    inserted_post_ids = []
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0, "errors": 0}
+    
+    # Stage 1 – pager: walk the blog with the `before` cursor and stop at the
+    # first known post. The cursor runs newest first; the pages (~1 call per
+    # 20 posts, `before` pages cached) are collected and handed on oldest first, so the DB
+    # writer can follow right behind the first finished upload.
+    def fetch_posts():
+        new_posts = fetch_new_posts(fetcher, watermark)
+        cache.evict()
+        print(f"✅ Found {len(new_posts)} new posts since watermark. ({cache.summary()})")
+        
+        # Sort oldest first (chronological order)
+        for post in reversed(new_posts):
+            post_id = post.get('id_string')
+            # Already in the DB (e.g. same timestamp as the watermark)
+            if post_id in existing_post_ids and not reimport:
+                print(f"  ⏭️ {post_id} already exists in DB. Skipping.")
+                stats["skipped"] += 1
+                continue
+            yield {"post_id": post_id, "post": post}
+    
+    # Stage 2 – downloader: stored rows to diff against (--reimport), media files, rows
+    def download(job):
+        if job["post_id"] in existing_post_ids:
+            job["stored"] = load_stored_post(supabase, job["post_id"])
+        job["post_data"], job["media_records"], job["block_rows"] = prepare_post(job["post"], manifest)
+        return job
+    
+    # Stage 3 – uploader: media to Cloudflare R2 first, so storage_path goes in with the rows
+    def upload(job):
+        job["uploaded"] = upload_post_media(storage, manifest, job["media_records"], job.get("stored"))
+        return job
+    
+    # Stage 4 – DB writer: one worker, posts in pager order (oldest first). A run
+    # that stops halfway leaves a gapless prefix, so the next watermark skips nothing.
+    # gapless: once a post failed (download, upload or here), no newer post is
+    # written – it would raise max(tumblr_timestamp) above the failed one.
+    def write(job):
+        post_id = job["post_id"]
         try:
-            # 1. Insert post
-            supabase.table('posts').insert(post_data).execute()
-            print("  ✅ Post inserted into DB")
-            
-            # 2. Insert media items
-            for media_row in media_records:
-                supabase.table('media').insert(media_row).execute()
-            if media_records:
-                print(f"  ✅ {len(media_records)} media entries inserted into DB")
-                
-            # 3. Insert content blocks
-            layout_map = {}
-            if layout_info and layout_info[0].get('display'):
-                for row_idx, row in enumerate(layout_info[0]['display']):
-                    for block_idx_layout in row.get('blocks', []):
-                        layout_map[block_idx_layout] = row_idx
-
-            for block_idx, block in enumerate(content_blocks):
-                block_data = {
-                    'post_id': post_id,
-                    'block_index': block_idx,
-                    'block_type': block.get('type'),
-                    'layout_row': layout_map.get(block_idx)
-                }
-                if block.get('type') == 'text':
-                    block_data['text_content'] = block.get('text')
-                    block_data['text_formatting'] = block.get('formatting')
-                    block_data['text_subtype'] = block.get('subtype')
-                elif block.get('type') == 'link':
-                    block_data['link_url'] = block.get('url')
-                    block_data['link_title'] = block.get('title')
-                    block_data['link_description'] = block.get('description')
-                
-                supabase.table('content_blocks').insert(block_data).execute()
-            print(f"  ✅ {len(content_blocks)} content blocks inserted into DB")
-            
-            # 4. Upload media to Cloudflare R2 and update storage_path
-            for media_row in media_records:
-                local_rel = media_row['local_path'] # e.g. media/post_id/file.jpg
-                full_local = Path(LOCAL_MEDIA_PATH) / local_rel.removeprefix("media/").lstrip("/")
-                
-                if full_local.exists():
-                    r2_key = local_rel.removeprefix("media/").lstrip("/") # e.g. post_id/file.jpg
-                    content_type = get_content_type(full_local)
-                    
-                    print(f"  Uploading {r2_key} to CF R2...")
-                    s3.upload_file(
-                        str(full_local),
-                        R2_BUCKET_NAME,
-                        r2_key,
-                        ExtraArgs={"ContentType": content_type}
-                    )
-                    
-                    r2_url = f"{R2_PUBLIC_URL}/{r2_key}"
-                    
-                    # Update DB
-                    supabase.table("media") \
-                        .update({"storage_path": r2_url}) \
-                        .eq("post_id", post_id) \
-                        .eq("block_index", media_row['block_index']) \
-                        .eq("display_order", media_row['display_order']) \
-                        .execute()
-                    print(f"    ✅ Uploaded: {r2_url}")
-            
-            imported_post_ids.append(post_id)
-            stats["inserted"] += 1
-            
+            status, media_ids = write_post(supabase, job["post_data"], job["media_records"],
+                                           job["block_rows"], job.get("stored"), job["uploaded"])
         except Exception as e:
-            print(f"  ❌ DB Error processing post {post_id}: {e}")
-            stats["errors"] += 1
+            if "PGRST202" in str(e):
+                rpc = "apply_post_diff" if job.get("stored") else "ingest_post"
+                raise PipelineAborted(f"RPC {rpc} not found – run: python3 run_{rpc}_migration.py")
+            raise
+        stats[status] += 1
+        if status == "unchanged":
+            return job
+        existing_post_ids.add(post_id)
+        
+        # media_id for manifest and derivative jobs
+        for key, media_id in media_ids.items():
+            if key not in job["uploaded"]:
+                continue
+            full_local, r2_key = job["uploaded"][key]
+            manifest.record_media_id(r2_key, media_id)
+            media_type = next(m['media_type'] for m in job["media_records"]
+                              if (m['block_index'], m['display_order']) == key)
+            if media_type == 'image':
+                variant_jobs.append((media_id, full_local, r2_key))
+            elif media_type == 'video':
+                rendition_jobs.append((media_id, full_local, r2_key))
+        
+        if status == "inserted":
+            inserted_post_ids.append(post_id)
+        return job
+    
+    def report_error(stage, job, error):
+        print(f"  ❌ {stage} error for post {job['post_id']}: {error}")
+    
+    print(f"\n📥 Importing posts (downloads: {download_workers} workers, uploads: {upload_workers} workers)...")
+    pipeline = Pipeline(fetch_posts(), [
+        Stage("download", download, workers=download_workers),
+        Stage("upload", upload, workers=upload_workers),
+        Stage("db", write, ordered=True, gapless=True),
+    ], source_name="pager", on_error=report_error)
+    try:
+        pipeline.run()
+    except PipelineAborted as e:
+        print(f"  ❌ {e}")
+        sys.exit(1)
+    stats["errors"] = pipeline.error_count()
+    print(f"\n📊 Stages:\n{pipeline.summary()}")
+    if pipeline.gap is not None:
+        written = stats["inserted"] + stats["updated"] + stats["unchanged"]
+        print(f"  ⛔ Stopped writing at the first failed post: {pipeline.total - written} posts not "
+              f"written. The watermark stays below the failure, the next run retries them.")
 
-    # Step 6: Backfill actual_date from EXIF photo dates
-    if imported_post_ids:
-        backfill_actual_dates(supabase, imported_post_ids)
-        update_trip_metadata(supabase, imported_post_ids)
+    # Step 5: Responsive image derivatives (WebP/AVIF widths) for the new images
+    if variant_jobs:
+        print(f"\n🖼️  Creating derivatives for {len(variant_jobs)} images...")
+        print(f"✅ {create_variants(storage, supabase, variant_jobs)}")
+    if rendition_jobs:
+        print(f"\n🎬 Creating posters/renditions for {len(rendition_jobs)} videos...")
+        print(f"✅ {create_renditions(storage, supabase, R2_PUBLIC_URL, rendition_jobs)}")
+
+    # Step 6: Backfill actual_date from EXIF photo dates (new posts only)
+    if inserted_post_ids:
+        backfill_actual_dates(supabase, inserted_post_ids)
+        update_trip_metadata(supabase)
 
     # Print summary
     print("\n" + "="*60)
     print("🏁 IMPORT PHASE COMPLETED")
     print("="*60)
-    print(f"  Processed posts: {total_posts}")
+    print(f"  Processed posts: {pipeline.total + stats['skipped']}")
     print(f"  Inserted:        {stats['inserted']}")
+    if reimport:
+        print(f"  Updated:         {stats['updated']}")
+        print(f"  Unchanged:       {stats['unchanged']}")
     print(f"  Skipped:         {stats['skipped']}")
     print(f"  Errors:          {stats['errors']}")
     print("="*60)
 
 
-def backfill_actual_dates(supabase, imported_post_ids):
+def backfill_actual_dates(supabase, inserted_post_ids):
     print("\n" + "="*60)
     print("⏳ STEP 6: BACKFILL ACTUAL DATES FROM EXIF")
     print("="*60)
     
-    # Fetch all media for these imported posts with photo_taken_at
+    # Fetch all media for these new posts with photo_taken_at
     media_res = supabase.table("media") \
         .select("post_id, photo_taken_at") \
-        .in_("post_id", imported_post_ids) \
+        .in_("post_id", inserted_post_ids) \
         .not_.is_("photo_taken_at", "null") \
         .execute()
         
@@ -493,36 +717,13 @@ def backfill_actual_dates(supabase, imported_post_ids):
     print(f"  Exif backfill completed. Updated {updated_count} posts.")
 
 
-def update_trip_metadata(supabase, imported_post_ids):
+def update_trip_metadata(supabase):
     print("\n" + "="*60)
     print("⏳ STEP 7: UPDATE TRIP METADATA & COUNTRIES")
     print("="*60)
     
-    # Fetch dates of imported posts
-    posts_res = supabase.table("posts") \
-        .select("post_date") \
-        .in_("post_id", imported_post_ids) \
-        .execute()
-        
-    dates = [p['post_date'] for p in posts_res.data if p['post_date']]
-    if not dates:
-        print("  ⚠️ No post dates found. Skipping trip date update.")
-        return
-        
-    min_date = min(dates).split('T')[0]
-    max_date = max(dates).split('T')[0]
-    
-    print(f"  Trip 18 calculated date range: {min_date} to {max_date}")
-    
-    # Update trips table for trip_id = 18
-    supabase.table("trips") \
-        .update({
-            "start_date": min_date,
-            "end_date": max_date
-        }) \
-        .eq("trip_id", 18) \
-        .execute()
-    print("  ✅ Updated Trip 18 start_date and end_date.")
+    # trips.start_date/end_date are kept by the sync_trip_dates trigger
+    # (sql/sync_trip_dates_trigger.sql): MIN/MAX(actual_date) over all posts of the trip.
     
     # Add trip_countries associations
     country_ids = [3, 2, 91, 96]
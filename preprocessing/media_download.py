@@ -0,0 +1,227 @@
+"""
+Gepoolter Media-Downloader.
+
+Ein begrenzter Worker-Pool teilt sich eine Keep-Alive-`requests.Session`.
+Pro Host laufen höchstens `per_host` Downloads gleichzeitig, damit die
+Tumblr-CDN-Hosts (64.media.tumblr.com, va.media.tumblr.com, ...) nicht mit
+allen Workern auf einmal getroffen werden.
+
+Downloads werden in Chunks in eine `.part`-Datei gestreamt, gefsynct und erst
+danach atomar umbenannt – der Speicherbedarf hängt nicht von der Dateigröße ab,
+und eine halbe Datei liegt nie unter dem endgültigen Namen. Ein Hash (z.B.
+sha256) kann im selben Durchlauf berechnet werden.
+
+Bricht ein Download ab (Timeout, WLAN weg), bleibt die `.part`-Datei liegen
+und der nächste Versuch setzt per HTTP-Range beim letzten Byte fort. Die
+Größe wird gegen Content-Length/Content-Range geprüft; bestehende Dateien
+können mit `verify_existing` gegen den Server geprüft werden.
+
+Usage:
+    with DownloadPool(workers=8, per_host=4) as pool:
+        for url, path in jobs:
+            pool.submit(pool.download, url, path)
+"""
+
+import hashlib
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+
+DEFAULT_WORKERS = 8
+DEFAULT_PER_HOST = 4
+DEFAULT_TIMEOUT = 180  # Längeres Timeout für Videos
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+
+def part_path(filepath) -> Path:
+    """Temporärer Pfad während des Downloads: datei.mp4 → datei.mp4.part"""
+    filepath = Path(filepath)
+    return filepath.with_name(filepath.name + ".part")
+
+
+class IncompleteDownload(IOError):
+    """Übertragene Größe passt nicht zu Content-Length (`.part` bleibt für Resume liegen)."""
+
+
+def _total_from_content_range(value: str):
+    """'bytes 100-999/1000' bzw. 'bytes */1000' → 1000"""
+    if not value or "/" not in value:
+        return None
+    total = value.rsplit("/", 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+
+def _expected_size(response, offset: int):
+    """Erwartete Gesamtgröße laut Server, None wenn unbekannt."""
+    if response.headers.get("Content-Encoding", "identity") != "identity":
+        # Transparente Dekompression: Content-Length gilt für die komprimierten Bytes
+        return None
+    if response.status_code == 206:
+        return _total_from_content_range(response.headers.get("Content-Range"))
+    length = response.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+def _hash_file(hasher, path: Path):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+
+
+def download_to_file(url: str, filepath, session=None, timeout: int = DEFAULT_TIMEOUT,
+                     hash_algo: str = None, resume: bool = True) -> dict:
+    """
+    Streamt eine URL in eine Datei (konstanter Speicher).
+
+    Geschrieben wird nach `<datei>.part`; nach fsync und Größenprüfung wird
+    atomar auf den Zielnamen umbenannt. Existiert bereits eine `.part`-Datei,
+    wird per `Range: bytes=N-` fortgesetzt. Bei Netzwerkfehlern bleibt die
+    `.part`-Datei für den nächsten Versuch liegen, bei HTTP-Fehlern wird sie
+    entfernt.
+
+    Returns:
+        dict: {"size": Bytes, "hash": Hex-Digest oder None, "resumed_from": Offset}
+
+    Raises:
+        IncompleteDownload: Datei kürzer/länger als vom Server angekündigt
+    """
+    filepath = Path(filepath)
+    part = part_path(filepath)
+    http = session or requests
+    hasher = hashlib.new(hash_algo) if hash_algo else None
+    offset = part.stat().st_size if resume and part.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    try:
+        with http.get(url, stream=True, timeout=timeout, headers=headers) as response:
+            if offset and response.status_code == 416:
+                # Range hinter dem Ende: .part ist entweder schon komplett oder kaputt
+                total = _total_from_content_range(response.headers.get("Content-Range"))
+                if total != offset:
+                    part.unlink(missing_ok=True)
+                    return download_to_file(url, filepath, session, timeout, hash_algo, resume=False)
+                expected = total
+            else:
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    # Server ignoriert Range → von vorne
+                    offset = 0
+                expected = _expected_size(response, offset)
+
+                if hasher and offset:
+                    _hash_file(hasher, part)
+                with open(part, "ab" if offset else "wb") as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        if not chunk:
+                            continue
+                        f.write(chunk)
+                        if hasher:
+                            hasher.update(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+    except requests.exceptions.HTTPError:
+        part.unlink(missing_ok=True)
+        raise
+
+    size = part.stat().st_size
+    if expected is not None and size != expected:
+        if size > expected:
+            part.unlink(missing_ok=True)
+        raise IncompleteDownload(f"{url}: {size} von {expected} Bytes empfangen")
+
+    if hasher and response.status_code == 416:
+        _hash_file(hasher, part)
+
+    os.replace(part, filepath)
+    return {"size": size, "hash": hasher.hexdigest() if hasher else None, "resumed_from": offset}
+
+
+def verify_existing(url: str, filepath, session=None, timeout: int = 30) -> bool:
+    """
+    Prüft eine vorhandene Datei per HEAD gegen die Content-Length des Servers.
+
+    Ist die Datei kürzer (abgeschnittener Download), wird sie zur `.part`-Datei
+    und beim nächsten Download per Range fortgesetzt; ist sie länger, wird sie
+    gelöscht. In beiden Fällen ist sie damit zum erneuten Download markiert.
+
+    Returns:
+        bool: True wenn die Datei vollständig ist (oder der Server keine Größe nennt)
+    """
+    filepath = Path(filepath)
+    http = session or requests
+    response = http.head(url, timeout=timeout, allow_redirects=True)
+    if not response.ok:
+        return True  # nichts zu vergleichen, Datei behalten
+    expected = _expected_size(response, 0)
+    if expected is None:
+        return True
+
+    size = filepath.stat().st_size
+    if size == expected:
+        return True
+    if size < expected:
+        os.replace(filepath, part_path(filepath))
+    else:
+        filepath.unlink()
+    return False
+
+
+class DownloadPool:
+    """
+    Thread-Pool mit gemeinsamer Session und Limit pro Host.
+
+    `submit` blockiert, sobald `max_pending` Aufgaben offen sind – so bleibt
+    der Speicher konstant, auch wenn der Aufrufer einen großen Export streamt.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, per_host: int = DEFAULT_PER_HOST,
+                 max_pending: int = None):
+        self.workers = workers
+        self.per_host = per_host
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._host_slots = defaultdict(lambda: threading.BoundedSemaphore(per_host))
+        self._host_lock = threading.Lock()
+        self._pending = threading.BoundedSemaphore(max_pending or workers * 4)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def host_slot(self, url: str) -> threading.BoundedSemaphore:
+        """Semaphore, die die gleichzeitigen Downloads eines Hosts begrenzt."""
+        host = urlparse(url).netloc
+        with self._host_lock:
+            return self._host_slots[host]
+
+    def download(self, url: str, filepath, **kwargs) -> dict:
+        """Streaming-Download über die gemeinsame Session, innerhalb des Host-Limits."""
+        with self.host_slot(url):
+            return download_to_file(url, filepath, session=self.session, **kwargs)
+
+    def verify(self, url: str, filepath) -> bool:
+        """verify_existing über die gemeinsame Session, innerhalb des Host-Limits."""
+        with self.host_slot(url):
+            return verify_existing(url, filepath, session=self.session)
+
+    def submit(self, fn, *args, **kwargs):
+        """Aufgabe einreihen; blockiert, wenn zu viele Aufgaben offen sind."""
+        self._pending.acquire()
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,118 @@
+"""
+In-Memory-Index über den lokalen Media-Ordner.
+
+Ein einziger `os.scandir`-Durchlauf über LOCAL_MEDIA_PATH (inkl.
+`blog_media/`) ersetzt das `os.listdir` + Namensvergleich pro Media-Zeile.
+Danach ist jede Suche ein Dict-Lookup:
+
+    index = MediaIndex()
+    index.find("POST_ID/block_0_img_abc.jpg")   # exakt oder ohne "_img_"
+    index.find_block("POST_ID", 0)              # erste Datei "block_0_..."
+
+Struktur:
+    media/POST_ID/datei.jpg
+    media/blog_media/POST_ID/datei.jpg
+"""
+
+import os
+import re
+
+# Lokaler Media-Ordner (wie in upload_to_r2.py)
+LOCAL_MEDIA_PATH = "/home/simple_simon/Codes/traveling_planet_earth/media"
+BLOG_MEDIA_DIR = "blog_media"
+
+BLOCK_PATTERN = re.compile(r"^block_(\d+)_")
+
+
+def normalize_name(filename: str) -> str:
+    """block_0_img_abc.jpg und block_0_abc.jpg gelten als dieselbe Datei."""
+    return filename.replace("_img_", "_")
+
+
+class MediaIndex:
+    """
+    Index aller Dateien unter `root`.
+
+    Args:
+        root: Media-Ordner
+        post_ids: nur diese Post-Ordner einlesen (z.B. für Einzel-Post-Skripte)
+    """
+
+    def __init__(self, root: str = LOCAL_MEDIA_PATH, post_ids=None):
+        self.root = str(root)
+        self.post_ids = set(post_ids) if post_ids is not None else None
+        self.folders = {}      # post_id → [Ordnerpfade], media/POST_ID vor blog_media/POST_ID
+        self._exact = {}       # (post_id, dateiname) → Pfad
+        self._normalized = {}  # (post_id, normalisierter Name) → Pfad
+        self._blocks = {}      # (post_id, block_index) → [Pfade]
+        self.file_count = 0
+
+        blog_media = os.path.join(self.root, BLOG_MEDIA_DIR)
+        self._scan_root(self.root, skip=BLOG_MEDIA_DIR)
+        self._scan_root(blog_media)
+
+    def _scan_root(self, root: str, skip: str = None):
+        try:
+            entries = list(os.scandir(root))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if not entry.is_dir() or entry.name == skip:
+                continue
+            if self.post_ids is not None and entry.name not in self.post_ids:
+                continue
+            self._scan_folder(entry.name, entry.path)
+
+    def _scan_folder(self, post_id: str, folder: str):
+        self.folders.setdefault(post_id, []).append(folder)
+        # sortiert, damit "erste passende Datei" stabil ist
+        for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+            if not entry.is_file() or entry.name.endswith(".part"):
+                continue
+            self.file_count += 1
+            # Erste Fundstelle gewinnt (media/POST_ID vor blog_media/POST_ID)
+            self._exact.setdefault((post_id, entry.name), entry.path)
+            self._normalized.setdefault((post_id, normalize_name(entry.name)), entry.path)
+            match = BLOCK_PATTERN.match(entry.name)
+            if match:
+                self._blocks.setdefault((post_id, int(match.group(1))), []).append(entry.path)
+
+    def has_folder(self, post_id: str) -> bool:
+        return post_id in self.folders
+
+    def find(self, relative_path: str):
+        """
+        "POST_ID/datei.jpg" → absoluter Pfad der passenden Datei oder None.
+        Exakter Name zuerst, sonst Vergleich ohne "_img_".
+        """
+        post_id, _, filename = relative_path.lstrip("/").rpartition("/")
+        post_id = post_id.rsplit("/", 1)[-1]
+        return (self._exact.get((post_id, filename))
+                or self._normalized.get((post_id, normalize_name(filename))))
+
+    def find_block(self, post_id: str, block_index: int, prefer: str = None):
+        """
+        Erste Datei "block_{block_index}_..." eines Posts.
+        `prefer` = Unterordner, der bei mehreren Fundstellen Vorrang hat (z.B. "blog_media").
+        """
+        paths = self._blocks.get((post_id, block_index))
+        if not paths:
+            return None
+        if prefer:
+            preferred_folder = os.path.join(self.root, prefer, post_id)
+            for path in paths:
+                if os.path.dirname(path) == preferred_folder:
+                    return path
+        return paths[0]
+
+    def __len__(self):
+        return self.file_count
+
+    def __contains__(self, relative_path: str):
+        return self.find(relative_path) is not None
+
+
+if __name__ == "__main__":
+    index = MediaIndex()
+    print(f"📂 {index.root}: {len(index.folders)} Post-Ordner, {len(index)} Dateien")
+    print(f"   {len(index._normalized)} normalisierte Namen, {len(index._blocks)} Block-Einträge")
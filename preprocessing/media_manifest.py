@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Lokales Media-Manifest (SQLite), gemeinsam genutzt von Downloader, Uploader
+und Validatoren.
+
+Pro Media-Datei wird festgehalten: Quell-URL, lokaler Pfad, Größe, sha256,
+R2-Key, R2-ETag und die `media_id` aus der DB. Damit wird "Was muss noch
+geladen / hochgeladen werden?" zu einer indizierten Abfrage statt eines
+Dateisystem- und Netzwerk-Crawls.
+
+Schlüssel ist der Pfad relativ zum Media-Ordner, z.B. "POST_ID/block_0_img_abc.jpg"
+(entspricht dem R2-Key).
+
+Usage:
+    python3 media_manifest.py              # Status anzeigen
+    python3 media_manifest.py --scan       # vorhandene Dateien aufnehmen
+    python3 media_manifest.py --scan --hash  # ... inkl. sha256
+"""
+
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_MANIFEST_PATH = os.getenv("MEDIA_MANIFEST_PATH", str(PROJECT_ROOT / "media_manifest.sqlite3"))
+
+# Lokaler Media-Ordner (wie in upload_to_r2.py)
+LOCAL_MEDIA_PATH = "/home/simple_simon/Codes/traveling_planet_earth/media"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media_files (
+    rel_path        TEXT PRIMARY KEY,   -- POST_ID/datei.jpg (= R2-Key)
+    post_id         TEXT,
+    source_url      TEXT,
+    size            INTEGER,
+    sha256          TEXT,
+    downloaded_at   REAL,
+    r2_key          TEXT,
+    r2_etag         TEXT,
+    uploaded_sha256 TEXT,
+    uploaded_at     REAL,
+    media_id        INTEGER,
+    updated_at      REAL
+);
+
+-- "Was fehlt noch?" als Index-Abfragen
+CREATE INDEX IF NOT EXISTS idx_media_files_pending_download
+    ON media_files(rel_path) WHERE downloaded_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_media_files_pending_upload
+    ON media_files(rel_path) WHERE downloaded_at IS NOT NULL AND uploaded_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_media_files_media_id ON media_files(media_id);
+CREATE INDEX IF NOT EXISTS idx_media_files_r2_key ON media_files(r2_key);
+"""
+
+
+def rel_path_for(filepath) -> str:
+    """media/POST_ID/datei.jpg → "POST_ID/datei.jpg" (Manifest-Schlüssel)"""
+    filepath = Path(filepath)
+    return f"{filepath.parent.name}/{filepath.name}"
+
+
+def file_sha256(path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class MediaManifest:
+    """
+    Thread-sicherer Zugriff auf das Manifest.
+
+    Eine Verbindung wird von allen Threads geteilt (Lock), WAL erlaubt
+    parallele Leser aus anderen Prozessen.
+    """
+
+    def __init__(self, path: str = DEFAULT_MANIFEST_PATH):
+        self.path = str(path)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def _upsert(self, rel_path: str, **fields):
+        fields = {k: v for k, v in fields.items() if v is not None}
+        fields["updated_at"] = time.time()
+        columns = ", ".join(["rel_path"] + list(fields))
+        placeholders = ", ".join(["?"] * (len(fields) + 1))
+        updates = ", ".join(f"{k} = excluded.{k}" for k in fields)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO media_files ({columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT(rel_path) DO UPDATE SET {updates}",
+                [rel_path] + list(fields.values()),
+            )
+
+    # ------------------------------------------------------------------
+    # Schreiben
+    # ------------------------------------------------------------------
+
+    def register(self, rel_path: str, source_url: str = None, post_id: str = None):
+        """Datei als bekannt (noch nicht zwingend geladen) eintragen."""
+        self._upsert(rel_path, source_url=source_url, post_id=post_id or rel_path.split("/")[0])
+
+    def record_download(self, rel_path: str, size: int, sha256: str = None,
+                        source_url: str = None, post_id: str = None):
+        """
+        Erfolgreichen Download eintragen. Hat sich der Inhalt (sha256)
+        geändert, gilt die Datei wieder als nicht hochgeladen.
+        """
+        previous = self.get(rel_path)
+        self._upsert(rel_path, size=size, sha256=sha256, source_url=source_url,
+                     post_id=post_id or rel_path.split("/")[0], downloaded_at=time.time())
+        if previous and sha256 and previous["uploaded_sha256"] not in (None, sha256):
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE media_files SET uploaded_at = NULL WHERE rel_path = ?", (rel_path,)
+                )
+
+    def record_upload(self, rel_path: str, r2_key: str, etag: str = None, sha256: str = None):
+        """Erfolgreichen Upload nach R2 eintragen."""
+        row = self.get(rel_path)
+        self._upsert(rel_path, r2_key=r2_key, r2_etag=(etag or "").strip('"') or None,
+                     uploaded_sha256=sha256 or (row["sha256"] if row else None),
+                     uploaded_at=time.time())
+        if not row or not row["downloaded_at"]:
+            # Upload beweist, dass die Datei lokal vorhanden war
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE media_files SET downloaded_at = uploaded_at WHERE rel_path = ?",
+                    (rel_path,),
+                )
+
+    def record_media_id(self, rel_path: str, media_id: int):
+        self._upsert(rel_path, media_id=media_id)
+
+    def forget_download(self, rel_path: str):
+        """Datei zum erneuten Download markieren (z.B. nach fehlgeschlagener Prüfung)."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE media_files SET downloaded_at = NULL, size = NULL, sha256 = NULL, "
+                "updated_at = ? WHERE rel_path = ?",
+                (time.time(), rel_path),
+            )
+
+    # ------------------------------------------------------------------
+    # Lesen
+    # ------------------------------------------------------------------
+
+    def get(self, rel_path: str):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM media_files WHERE rel_path = ?", (rel_path,)
+            ).fetchone()
+
+    def is_downloaded(self, rel_path: str) -> bool:
+        row = self.get(rel_path)
+        return bool(row and row["downloaded_at"])
+
+    def is_uploaded(self, rel_path: str) -> bool:
+        row = self.get(rel_path)
+        return bool(row and row["uploaded_at"])
+
+    def pending_downloads(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM media_files WHERE downloaded_at IS NULL ORDER BY rel_path"
+            ).fetchall()
+
+    def pending_uploads(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM media_files WHERE downloaded_at IS NOT NULL AND uploaded_at IS NULL "
+                "ORDER BY rel_path"
+            ).fetchall()
+
+    def counts(self) -> dict:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) AS total, "
+                "COUNT(downloaded_at) AS downloaded, "
+                "COUNT(uploaded_at) AS uploaded, "
+                "COUNT(media_id) AS linked, "
+                "COALESCE(SUM(size), 0) AS bytes "
+                "FROM media_files"
+            ).fetchone()
+        return dict(row)
+
+    def average_sizes(self) -> dict:
+        """Durchschnittliche Dateigröße pro Endung, z.B. {".jpg": 812345} (für Schätzungen)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rel_path, size FROM media_files WHERE size IS NOT NULL"
+            ).fetchall()
+        totals = {}
+        for rel_path, size in rows:
+            total = totals.setdefault(os.path.splitext(rel_path)[1].lower(), [0, 0])
+            total[0] += size
+            total[1] += 1
+        return {ext: size // count for ext, (size, count) in totals.items()}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def scan_local_files(manifest: MediaManifest, media_root: str = LOCAL_MEDIA_PATH, with_hash: bool = False):
+    """Vorhandene Dateien unter media_root ins Manifest übernehmen."""
+    root = Path(media_root)
+    count = 0
+    for path in root.rglob("*"):
+        if not path.is_file() or path.name.endswith(".part"):
+            continue
+        rel_path = path.relative_to(root).as_posix()
+        row = manifest.get(rel_path)
+        size = path.stat().st_size
+        if row and row["downloaded_at"] and row["size"] == size and (row["sha256"] or not with_hash):
+            continue
+        manifest.record_download(rel_path, size=size, sha256=file_sha256(path) if with_hash else None)
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    with MediaManifest() as manifest:
+        if "--scan" in sys.argv:
+            print(f"🔍 Scanne {LOCAL_MEDIA_PATH}...")
+            added = scan_local_files(manifest, with_hash="--hash" in sys.argv)
+            print(f"✅ {added} Dateien aufgenommen/aktualisiert")
+
+        c = manifest.counts()
+        print("\n" + "="*40)
+        print(f"📒 Manifest: {manifest.path}")
+        print("="*40)
+        print(f"  Dateien gesamt:     {c['total']}")
+        print(f"  Heruntergeladen:    {c['downloaded']} ({c['bytes'] / 1024 / 1024:.1f} MB)")
+        print(f"  In R2:              {c['uploaded']}")
+        print(f"  Mit media_id:       {c['linked']}")
+        print(f"  Download offen:     {len(manifest.pending_downloads())}")
+        print(f"  Upload offen:       {len(manifest.pending_uploads())}")
+        print("="*40)
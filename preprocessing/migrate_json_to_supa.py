@@ -2,17 +2,27 @@
 """
 Supabase Data Migration Script
 Migriert Tumblr JSON-Daten in Supabase PostgreSQL
+
+Posts, Media und Content Blocks gehen als Array-Inserts (Standard 500 Zeilen
+pro Request) raus; fehlerhafte Batches werden halbiert, bis die kaputte
+Zeile isoliert ist (bulk_insert.py). Welche Posts/Media schon existieren,
+wird vorab in einem Durchlauf geladen (existing_keys.py) und lokal geprüft.
+
+Usage:
+    python3 migrate_json_to_supa.py
+    python3 migrate_json_to_supa.py --batch-size 200
 """
 
 import os
 import sys
-import json
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 from dotenv import load_dotenv
 from supabase import create_client, Client
-import time
+from post_export import iter_posts, resolve_export
+from bulk_insert import insert_rows, DEFAULT_BATCH_SIZE
+from existing_keys import load_post_ids
 
 # .env laden
 load_dotenv()
@@ -26,10 +36,13 @@ class SupabaseMigrator:
     Migriert Tumblr-JSON-Daten in Supabase
     """
     
-    def __init__(self, json_file: str = "tumblr_posts_local.json"):
-        self.json_file = json_file
+    def __init__(self, json_file: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.json_file = json_file or resolve_export("tumblr_posts_local")
+        self.batch_size = batch_size  # Zeilen pro Insert-Request (und Posts pro Durchlauf)
         self.supabase: Optional[Client] = None
-        self.posts_data: List[Dict] = []
+        self.post_count = 0
+        self.date_range = "Unbekannt"
+        self.existing_posts = set()  # post_id
         
         # Statistiken
         self.stats = {
@@ -48,79 +61,120 @@ class SupabaseMigrator:
         print(f"✅ Supabase verbunden: {SUPABASE_URL}")
     
     def load_json(self):
-        """JSON-Daten laden"""
+        """Export prüfen (Anzahl + Zeitraum), Posts werden erst beim Migrieren gestreamt"""
         print(f"\n📦 Lade JSON-Daten: {self.json_file}")
         
         if not Path(self.json_file).exists():
             raise FileNotFoundError(f"JSON-Datei nicht gefunden: {self.json_file}")
         
-        with open(self.json_file, 'r', encoding='utf-8') as f:
-            self.posts_data = json.load(f)
-        
-        print(f"✅ {len(self.posts_data)} Posts geladen")
-        print(f"   Zeitraum: {self._get_date_range()}")
-    
-    def _get_date_range(self) -> str:
-        """Ermittle Datum-Bereich"""
-        dates = [p.get('date', '') for p in self.posts_data if p.get('date')]
-        if not dates:
-            return "Unbekannt"
-        return f"{min(dates)} bis {max(dates)}"
+        oldest = newest = None
+        self.post_count = 0
+        for post in iter_posts(self.json_file):
+            self.post_count += 1
+            date = post.get('date')
+            if date:
+                oldest = date if oldest is None else min(oldest, date)
+                newest = date if newest is None else max(newest, date)
+        if oldest:
+            self.date_range = f"{oldest} bis {newest}"
+        
+        print(f"✅ {self.post_count} Posts geladen")
+        print(f"   Zeitraum: {self.date_range}")
     
     def migrate_all(self):
-        """Hauptmigration"""
+        """Hauptmigration: Posts in Batches, pro Tabelle ein Array-Insert je BATCH_SIZE Zeilen"""
         print("\n" + "="*60)
         print("🚀 STARTE MIGRATION")
         print("="*60)
         
-        total = len(self.posts_data)
+        # Vorhandene Schlüssel einmal laden statt pro Batch nachzufragen
+        # (media/blocks entstehen nur für hier neu eingefügte Posts, die noch keine haben)
+        self.existing_posts = load_post_ids(self.supabase)
+        print(f"📋 Bereits in der DB: {len(self.existing_posts)} Posts")
         
-        for idx, post in enumerate(self.posts_data, 1):
-            try:
-                post_id = post.get('id_string')
-                
-                print(f"\n[{idx}/{total}] Migriere Post: {post_id}")
-                
-                # 1. Prüfe ob Post bereits existiert
-                if self._post_exists(post_id):
-                    print(f"  ⏭️  Überspringe (bereits vorhanden)")
-                    self.stats['posts']['skipped'] += 1
-                    continue
-                
-                # 2. Post einfügen
-                self._insert_post(post)
-                
-                # 3. Media einfügen
-                self._insert_media(post)
-                
-                # 4. Content Blocks einfügen
-                self._insert_content_blocks(post)
-                
-                self.stats['posts']['inserted'] += 1
-                
-                # Rate limiting (Supabase free tier)
-                if idx % 50 == 0:
-                    print(f"\n⏸️  Pause (50 Posts verarbeitet)...")
-                    time.sleep(2)
-                
-            except Exception as e:
-                error_msg = f"Post {post.get('id_string')}: {str(e)}"
-                self.stats['posts']['errors'] += 1
-                self.stats['errors'].append(error_msg)
-                print(f"  ❌ Fehler: {str(e)[:80]}")
+        total = self.post_count
+        done = 0
+        batch = []
+        
+        for post in iter_posts(self.json_file):
+            batch.append(post)
+            if len(batch) >= self.batch_size:
+                self._migrate_batch(batch)
+                done += len(batch)
+                batch = []
+                print(f"\n[{done}/{total}] Posts verarbeitet")
+        
+        if batch:
+            self._migrate_batch(batch)
+            done += len(batch)
+            print(f"\n[{done}/{total}] Posts verarbeitet")
         
         self._print_summary()
     
-    def _post_exists(self, post_id: str) -> bool:
-        """Prüfe ob Post bereits existiert"""
-        try:
-            result = self.supabase.table('posts').select('post_id').eq('post_id', post_id).execute()
-            return len(result.data) > 0
-        except:
-            return False
+    def _migrate_batch(self, posts: List[Dict]):
+        """
+        Ein Batch Posts: Existenz-Check (lokal), dann posts → media → content_blocks.
+        Media/Blocks nur für Posts, die tatsächlich eingefügt wurden (Foreign Key).
+        """
+        # 1. Prüfe welche Posts bereits existieren
+        new_posts = []
+        for post in posts:
+            post_id = post.get('id_string')
+            if post_id in self.existing_posts:
+                self.stats['posts']['skipped'] += 1
+                continue
+            self.existing_posts.add(post_id)  # Duplikate im Export nur einmal
+            new_posts.append(post)
+        
+        if not new_posts:
+            print(f"  ⏭️  {len(posts)} Posts übersprungen (bereits vorhanden)")
+            return
+        
+        # 2. Posts einfügen
+        post_rows = []
+        for post in new_posts:
+            try:
+                post_rows.append(self._build_post_row(post))
+            except Exception as e:
+                self._record_error('posts', f"Post {post.get('id_string')}: {str(e)}")
+        
+        result = insert_rows(self.supabase, 'posts', post_rows, batch_size=self.batch_size)
+        for row, error in result['failed']:
+            self._record_error('posts', f"Post {row['post_id']}: {error}")
+        inserted_ids = {row['post_id'] for row in result['inserted']}
+        self.stats['posts']['inserted'] += len(inserted_ids)
+        requests = result['requests']
+        
+        inserted_posts = [post for post in new_posts if post.get('id_string') in inserted_ids]
+        
+        # 3. Media einfügen
+        media_rows = [row for post in inserted_posts for row in self._build_media_rows(post)]
+        result = insert_rows(self.supabase, 'media', media_rows, batch_size=self.batch_size)
+        for row, error in result['failed']:
+            self._record_error('media', f"Media {row['post_id']}/block_{row['block_index']}: {error}")
+        media_inserted = len(result['inserted'])
+        self.stats['media']['inserted'] += media_inserted
+        requests += result['requests']
+        
+        # 4. Content Blocks einfügen
+        block_rows = [row for post in inserted_posts for row in self._build_block_rows(post)]
+        result = insert_rows(self.supabase, 'content_blocks', block_rows, batch_size=self.batch_size)
+        for row, error in result['failed']:
+            self._record_error('blocks', f"Block {row['post_id']}/{row['block_index']}: {error}")
+        blocks_inserted = len(result['inserted'])
+        self.stats['blocks']['inserted'] += blocks_inserted
+        requests += result['requests']
+        
+        print(f"  ✅ {len(inserted_ids)} Posts, {media_inserted} Media, {blocks_inserted} Blocks "
+              f"in {requests} Requests ({len(posts) - len(new_posts)} übersprungen)")
+    
+    def _record_error(self, table: str, error_msg: str):
+        self.stats[table]['errors'] += 1
+        self.stats['errors'].append(error_msg)
+        print(f"  ❌ Fehler: {error_msg[:80]}")
     
-    def _insert_post(self, post: Dict):
-        """Post einfügen"""
+    def _build_post_row(self, post: Dict) -> Dict:
+        """Zeile für `posts`"""
         post_id = post.get('id_string')
         
         # Datum parsen
@@ -180,21 +234,14 @@ class SupabaseMigrator:
             'media_count': media_count,
             'text_blocks_count': text_blocks_count
         }
-        
-        # In Supabase einfügen
-        result = self.supabase.table('posts').insert(post_data).execute()
-        
-        if result.data:
-            print(f"  ✅ Post eingefügt")
-        else:
-            raise Exception("Post konnte nicht eingefügt werden")
+        return post_data
     
-    def _insert_media(self, post: Dict):
-        """Media-Einträge einfügen"""
+    def _build_media_rows(self, post: Dict) -> List[Dict]:
+        """Zeilen für `media`"""
         post_id = post.get('id_string')
         content_blocks = post.get('content', [])
         
-        media_inserted = 0
+        rows = []
         
         for block_idx, block in enumerate(content_blocks):
             block_type = block.get('type')
@@ -256,12 +303,7 @@ class SupabaseMigrator:
                         'alt_text': block.get('alt_text')
                     }
                     
-                    try:
-                        self.supabase.table('media').insert(media_data).execute()
-                        media_inserted += 1
-                    except Exception as e:
-                        self.stats['media']['errors'] += 1
-                        print(f"    ⚠️  Media-Fehler: {str(e)[:50]}")
+                    rows.append(media_data)
             
             # === VIDEOS ===
             elif block_type == 'video':
@@ -293,11 +335,7 @@ class SupabaseMigrator:
                         'duration_seconds': block.get('duration')
                     }
                     
-                    try:
-                        self.supabase.table('media').insert(media_data).execute()
-                        media_inserted += 1
-                    except Exception as e:
-                        self.stats['media']['errors'] += 1
+                    rows.append(media_data)
             
             # === AUDIO ===
             elif block_type == 'audio':
@@ -325,18 +363,12 @@ class SupabaseMigrator:
                         'provider': block.get('provider', 'tumblr')
                     }
                     
-                    try:
-                        self.supabase.table('media').insert(media_data).execute()
-                        media_inserted += 1
-                    except Exception as e:
-                        self.stats['media']['errors'] += 1
-        
-        if media_inserted > 0:
-            print(f"  ✅ {media_inserted} Media-Einträge")
-            self.stats['media']['inserted'] += media_inserted
+                    rows.append(media_data)
+        
+        return rows
     
-    def _insert_content_blocks(self, post: Dict):
-        """Content Blocks einfügen"""
+    def _build_block_rows(self, post: Dict) -> List[Dict]:
+        """Zeilen für `content_blocks`"""
         post_id = post.get('id_string')
         content_blocks = post.get('content', [])
         
@@ -349,7 +381,7 @@ class SupabaseMigrator:
                 for block_idx in row.get('blocks', []):
                     layout_map[block_idx] = row_idx
         
-        blocks_inserted = 0
+        rows = []
         
         for block_idx, block in enumerate(content_blocks):
             block_type = block.get('type')
@@ -373,15 +405,9 @@ class SupabaseMigrator:
                 block_data['link_title'] = block.get('title')
                 block_data['link_description'] = block.get('description')
             
-            try:
-                self.supabase.table('content_blocks').insert(block_data).execute()
-                blocks_inserted += 1
-            except Exception as e:
-                self.stats['blocks']['errors'] += 1
+            rows.append(block_data)
         
-        if blocks_inserted > 0:
-            print(f"  ✅ {blocks_inserted} Content-Blocks")
-            self.stats['blocks']['inserted'] += blocks_inserted
+        return rows
     
     def _extract_companions(self, post: Dict) -> Optional[List[str]]:
         """Versuche Begleiter zu extrahieren (heuristisch)"""
@@ -505,7 +531,12 @@ def main():
     print("🚀 SUPABASE DATA MIGRATION")
     print("="*60)
     
-    migrator = SupabaseMigrator("tumblr_posts_local.json")
+    batch_size = DEFAULT_BATCH_SIZE
+    for i, arg in enumerate(sys.argv):
+        if arg == "--batch-size" and i + 1 < len(sys.argv):
+            batch_size = int(sys.argv[i + 1])
+    
+    migrator = SupabaseMigrator(batch_size=batch_size)
     
     try:
         # 1. Verbinden
@@ -0,0 +1,290 @@
+"""
+Stufen-Pipeline mit begrenzten Queues und Metriken pro Stufe.
+
+Eine Quelle (Iterator, z.B. der Tumblr-Pager) speist eine Kette von Stufen,
+jede mit eigenem Worker-Pool. Zwischen den Stufen liegen Queues mit fester
+Größe: ist eine Stufe langsamer, läuft ihre Queue voll und die Stufe davor
+blockiert (Backpressure) – es liegen nie mehr als `queue_size` Items
+zwischen zwei Stufen. So arbeiten Netzwerk, Platte und DB gleichzeitig und
+die Laufzeit nähert sich der der langsamsten Stufe.
+
+Eine Stufenfunktion bekommt ein Item und gibt das Item für die nächste
+Stufe zurück (None = verwerfen). Exceptions zählen als Fehler der Stufe,
+das Item wird verworfen; `PipelineAborted` hält die ganze Pipeline an.
+
+Mit `ordered=True` sieht eine Stufe (ein Worker) die Items in der
+Reihenfolge der Quelle, egal in welcher Reihenfolge die Stufen davor
+fertig werden. `gapless=True` dazu: ist ein Item in dieser oder einer
+früheren Stufe fehlgeschlagen, wird kein späteres mehr verarbeitet und die
+Pipeline angehalten (`pipeline.gap`) – z.B. damit ein DB-Writer nie an
+einem fehlgeschlagenen Post vorbei schreibt. Mit None verworfene Items
+gelten nicht als Lücke.
+
+Usage:
+    pipeline = Pipeline(fetch_posts(), [
+        Stage("download", download_post, workers=8),
+        Stage("upload", upload_post, workers=8),
+        Stage("db", write_post, ordered=True, gapless=True),
+    ], source_name="pager")
+    pipeline.run()
+    print(pipeline.summary())
+"""
+
+import queue
+import threading
+import time
+
+POLL_INTERVAL = 0.1  # Sekunden; so oft prüfen blockierte Worker auf Abbruch
+
+_END = object()      # Ende des Streams (einmal pro Worker der nächsten Stufe)
+_DROPPED = object()  # in einer früheren Stufe verworfen (Platzhalter für die Reihenfolge)
+_FAILED = object()   # in einer früheren Stufe fehlgeschlagen (dito)
+
+
+class PipelineAborted(Exception):
+    """Aus einer Stufenfunktion geworfen: die ganze Pipeline anhalten."""
+
+
+class Stage:
+    def __init__(self, name: str, fn, workers: int = 1, queue_size: int = None, ordered: bool = False,
+                 gapless: bool = False):
+        if ordered and workers != 1:
+            raise ValueError(f"Stufe {name}: geordnete Stufen haben genau einen Worker")
+        if gapless and not ordered:
+            raise ValueError(f"Stufe {name}: gapless geht nur mit ordered=True")
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue_size = queue_size or 2 * workers  # Input-Queue dieser Stufe
+        self.ordered = ordered
+        self.gapless = gapless
+
+        # Metriken
+        self.items = 0      # erfolgreich verarbeitet
+        self.dropped = 0    # fn hat None geliefert
+        self.errors = 0
+        self.busy = 0.0     # Sekunden in fn, über alle Worker
+        self.starved = 0.0  # Sekunden gewartet auf Input
+        self.blocked = 0.0  # Sekunden gewartet auf Platz in der nächsten Queue (Backpressure)
+        self.max_queue = 0  # höchster Füllstand der Input-Queue
+        self._lock = threading.Lock()
+        self._running = workers
+
+    def _add(self, **deltas):
+        with self._lock:
+            for name, value in deltas.items():
+                setattr(self, name, getattr(self, name) + value)
+
+
+class Pipeline:
+    def __init__(self, source, stages: list, source_name: str = "source", on_error=None):
+        """
+        Args:
+            source: Iterable mit den Items für die erste Stufe
+            stages: Stage-Objekte in Verarbeitungsreihenfolge
+            on_error: optional on_error(stage_name, item, exception), aus dem Worker-Thread
+        """
+        self.source = source
+        self.stages = [Stage(source_name, None)] + list(stages)
+        self.on_error = on_error
+        # queues[i] ist die Input-Queue von stages[i + 1]
+        self.queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages[1:]]
+        self.total = 0  # Items aus der Quelle
+        self.wall = 0.0
+        self.gap = None  # (Stufe, Position in der Quelle) des Fehlers, an dem eine gapless-Stufe anhielt
+        self._abort = threading.Event()
+        self._error = None
+
+    # --- Queues ---
+
+    def _put(self, stage: Stage, outbox, envelope) -> bool:
+        start = time.monotonic()
+        try:
+            while not self._abort.is_set():
+                try:
+                    outbox.put(envelope, timeout=POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            stage._add(blocked=time.monotonic() - start)
+
+    def _get(self, stage: Stage, inbox):
+        """Nächstes Envelope, None bei Abbruch."""
+        with stage._lock:
+            stage.max_queue = max(stage.max_queue, inbox.qsize())
+        start = time.monotonic()
+        try:
+            while not self._abort.is_set():
+                try:
+                    return inbox.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+            return None
+        finally:
+            stage._add(starved=time.monotonic() - start)
+
+    def _fail(self, error: Exception):
+        if self._error is None:
+            self._error = error
+        self._abort.set()
+
+    def _halt(self, stage: Stage, seq: int):
+        """gapless-Stufe an einer Lücke: alles anhalten, ohne Fehler zu werfen."""
+        self.gap = (stage.name, seq)
+        self._abort.set()
+
+    # --- Threads ---
+
+    def _run_source(self):
+        stage = self.stages[0]
+        items = iter(self.source)
+        while not self._abort.is_set():
+            start = time.monotonic()
+            try:
+                item = next(items)
+            except StopIteration:
+                break
+            except Exception as e:
+                self._fail(e)
+                break
+            finally:
+                stage._add(busy=time.monotonic() - start)
+            stage._add(items=1)
+            if not self._put(stage, self.queues[0], (self.total, item)):
+                break
+            self.total += 1
+        self._stage_done(0)
+
+    def _process(self, index: int, seq: int, item):
+        """fn auf ein Item anwenden und das Ergebnis weiterreichen. False bei Abbruch."""
+        stage = self.stages[index]
+        result = item  # _DROPPED/_FAILED aus früheren Stufen unverändert weiterreichen
+        if item is not _DROPPED and item is not _FAILED:
+            start = time.monotonic()
+            try:
+                result = stage.fn(item)
+            except PipelineAborted as e:
+                self._fail(e)
+                return False
+            except Exception as e:
+                stage._add(errors=1)
+                if self.on_error:
+                    self.on_error(stage.name, item, e)
+                result = _FAILED
+            else:
+                if result is None:
+                    stage._add(dropped=1)
+                    result = _DROPPED
+                else:
+                    stage._add(items=1)
+            finally:
+                stage._add(busy=time.monotonic() - start)
+        if index + 1 < len(self.stages):
+            return self._put(stage, self.queues[index], (seq, result))
+        return True
+
+    def _run_worker(self, index: int):
+        stage = self.stages[index]
+        inbox = self.queues[index - 1]
+        while True:
+            envelope = self._get(stage, inbox)
+            if envelope is None or envelope is _END:
+                break
+            if not self._process(index, *envelope):
+                break
+        self._stage_done(index)
+
+    def _run_ordered(self, index: int):
+        stage = self.stages[index]
+        inbox = self.queues[index - 1]
+        pending = {}  # seq → Item, das vor der Reihe fertig wurde
+        next_seq = 0
+        while True:
+            envelope = self._get(stage, inbox)
+            if envelope is None or envelope is _END:
+                break
+            seq, item = envelope
+            pending[seq] = item
+            while next_seq in pending:
+                if not self._process_ordered(index, next_seq, pending.pop(next_seq)):
+                    self._stage_done(index)
+                    return
+                next_seq += 1
+        self._stage_done(index)
+
+    def _process_ordered(self, index: int, seq: int, item) -> bool:
+        """_process für geordnete Stufen; False bei Abbruch oder Lücke (gapless)."""
+        stage = self.stages[index]
+        if stage.gapless and item is _FAILED:
+            self._halt(stage, seq)
+            return False
+        errors = stage.errors  # nur dieser eine Worker ändert sie
+        if not self._process(index, seq, item):
+            return False
+        if stage.gapless and stage.errors > errors:
+            self._halt(stage, seq)
+            return False
+        return True
+
+    def _stage_done(self, index: int):
+        """Letzter Worker einer Stufe: Ende an alle Worker der nächsten Stufe melden."""
+        stage = self.stages[index]
+        with stage._lock:
+            stage._running -= 1
+            last = stage._running == 0
+        if not last:
+            return
+        if index + 1 < len(self.stages):
+            for _ in range(self.stages[index + 1].workers):
+                if not self._put(stage, self.queues[index], _END):
+                    return
+
+    def run(self):
+        """Alle Stufen starten und warten, bis die letzte fertig ist. Wirft den Abbruchgrund."""
+        threads = [threading.Thread(target=self._run_source, name=self.stages[0].name, daemon=True)]
+        for index, stage in enumerate(self.stages[1:], 1):
+            target = self._run_ordered if stage.ordered else self._run_worker
+            for n in range(stage.workers):
+                threads.append(threading.Thread(target=target, args=(index,),
+                                                name=f"{stage.name}-{n}", daemon=True))
+
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            # Laufende Items zu Ende bringen, dann raus
+            self._abort.set()
+            for thread in threads:
+                thread.join()
+            raise
+        finally:
+            self.wall = time.monotonic() - start
+        if self._error is not None:
+            raise self._error
+
+    # --- Auswertung ---
+
+    def error_count(self) -> int:
+        return sum(stage.errors for stage in self.stages)
+
+    def summary(self) -> str:
+        """Tabelle pro Stufe; Auslastung = busy / (Worker × Laufzeit). Die höchste ist der Engpass."""
+        lines = [f"  {'Stufe':10s} {'Worker':>6s} {'Items':>6s} {'Fehler':>6s} {'Auslast.':>8s} "
+                 f"{'wartet':>8s} {'blockiert':>9s} {'Queue max':>9s}"]
+        bottleneck, highest = None, -1.0
+        for stage in self.stages:
+            utilization = stage.busy / (stage.workers * self.wall) if self.wall else 0.0
+            if utilization > highest:
+                bottleneck, highest = stage, utilization
+            queue_max = "-" if stage.fn is None else f"{stage.max_queue}/{stage.queue_size}"
+            lines.append(f"  {stage.name:10s} {stage.workers:6d} {stage.items:6d} {stage.errors:6d} "
+                         f"{utilization:8.0%} {stage.starved:7.1f}s {stage.blocked:8.1f}s {queue_max:>9s}")
+        lines.append(f"  ⏱️  {self.wall:.1f}s gesamt, Engpass: {bottleneck.name} ({highest:.0%} ausgelastet)")
+        if self.gap is not None:
+            lines.append(f"  ⛔ {self.gap[0]} angehalten: Item #{self.gap[1]} fehlgeschlagen, spätere nicht verarbeitet")
+        return "\n".join(lines)
@@ -0,0 +1,152 @@
+"""
+Diff zwischen einem frisch aufgebauten Tumblr-Post und den gespeicherten Zeilen.
+
+Für den Re-Import (import_new_posts.py --reimport): statt einen vorhandenen
+Post komplett neu zu schreiben, werden nur geänderte Spalten, neue/geänderte/
+entfernte Media-Zeilen und Content Blocks geschrieben – in einer Transaktion
+über die RPC apply_post_diff (sql/apply_post_diff.sql, einmalig installieren:
+python3 run_apply_post_diff_migration.py). Ein unveränderter Post kostet einen
+Lese-Request und keinen einzigen Schreibzugriff (keine Trigger, keine Uploads).
+
+Usage:
+    stored = load_stored_post(supabase, post_id)
+    diff = diff_post(post_data, media_records, block_rows, stored)
+    if not is_empty(diff):
+        media_ids = apply_diff(supabase, post_id, diff)
+"""
+
+from datetime import datetime
+
+# Spalten aus Tumblr; kuratierte Spalten (title, actual_date, country, trip,
+# companions) fasst der Re-Import nicht an – wie ingest_post bei ON CONFLICT
+POST_SYNC_COLUMNS = (
+    "post_date", "tumblr_timestamp", "slug", "original_url", "short_url", "state",
+    "note_count", "summary", "content_blocks", "layout_info", "tags", "media_count",
+    "text_blocks_count",
+)
+
+# Werte, die spätere Schritte nachtragen (Upload, ffprobe): None löscht sie nicht
+MEDIA_KEEP_IF_NONE = {"storage_path", "width", "height", "duration_seconds"}
+
+TIMESTAMP_COLUMNS = {"post_date", "photo_taken_at"}
+
+
+def load_stored_post(supabase, post_id: str):
+    """
+    Post inkl. media und content_blocks in einem Request (PostgREST-Embedding) oder None.
+    Die Blocks kommen als "blocks", weil posts.content_blocks schon die JSONB-Spalte ist.
+    """
+    result = supabase.table("posts") \
+        .select("*, media(*), blocks:content_blocks(*)") \
+        .eq("post_id", post_id) \
+        .execute()
+    return result.data[0] if result.data else None
+
+
+def _normalize(column: str, value):
+    if column in TIMESTAMP_COLUMNS and isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value
+
+
+def changed_columns(new: dict, old: dict, columns=None, keep_if_none=()) -> dict:
+    """Spalten aus `new`, deren Wert von `old` abweicht."""
+    changes = {}
+    for column in columns or new.keys():
+        if column not in new:
+            continue
+        value = new[column]
+        if value is None and column in keep_if_none:
+            continue
+        if _normalize(column, value) != _normalize(column, old.get(column)):
+            changes[column] = value
+    return changes
+
+
+def diff_post(post_data: dict, media_records: list, block_rows: list, stored: dict) -> dict:
+    """
+    Returns:
+        dict mit "post" (geänderte Spalten), "media_insert", "media_update" [(media_id, änderungen)],
+        "media_delete" [media_id], "media_ids" {(block_index, display_order): media_id},
+        "blocks_insert", "blocks_update" [(block_id, änderungen)], "blocks_delete" [block_id]
+    """
+    diff = {
+        "post": changed_columns(post_data, stored, POST_SYNC_COLUMNS),
+        "media_insert": [], "media_update": [], "media_delete": [], "media_ids": {},
+        "blocks_insert": [], "blocks_update": [], "blocks_delete": [],
+    }
+
+    stored_media = {(m["block_index"], m["display_order"]): m for m in stored.get("media") or []}
+    for row in media_records:
+        key = (row["block_index"], row["display_order"])
+        old = stored_media.pop(key, None)
+        if old is None:
+            diff["media_insert"].append(row)
+            continue
+        diff["media_ids"][key] = old["media_id"]
+        changes = changed_columns(row, old, keep_if_none=MEDIA_KEEP_IF_NONE)
+        changes.pop("post_id", None)
+        if changes:
+            diff["media_update"].append((old["media_id"], changes))
+    # Im Post nicht mehr vorhanden (R2-Objekt bleibt, siehe scratch/check_r2_orphans.py)
+    diff["media_delete"] = [m["media_id"] for m in stored_media.values()]
+
+    stored_blocks = {b["block_index"]: b for b in stored.get("blocks") or []}
+    for row in block_rows:
+        old = stored_blocks.pop(row["block_index"], None)
+        if old is None:
+            diff["blocks_insert"].append(row)
+            continue
+        changes = changed_columns(row, old)
+        changes.pop("post_id", None)
+        if changes:
+            diff["blocks_update"].append((old["block_id"], changes))
+    diff["blocks_delete"] = [b["block_id"] for b in stored_blocks.values()]
+
+    return diff
+
+
+def is_empty(diff: dict) -> bool:
+    return not any(value for key, value in diff.items() if key != "media_ids")
+
+
+def describe(diff: dict) -> str:
+    parts = []
+    if diff["post"]:
+        parts.append(f"post: {', '.join(sorted(diff['post']))}")
+    for prefix in ("media", "blocks"):
+        inserted, updated, deleted = (len(diff[f"{prefix}_{op}"]) for op in ("insert", "update", "delete"))
+        if inserted or updated or deleted:
+            parts.append(f"{prefix} +{inserted} ~{updated} -{deleted}")
+    return "; ".join(parts) or "unverändert"
+
+
+def count_requests(diff: dict) -> int:
+    """PostgREST-Requests, die apply_diff für `diff` schickt (für --plan)."""
+    return 0 if is_empty(diff) else 1
+
+
+def apply_diff(supabase, post_id: str, diff: dict) -> dict:
+    """
+    Änderungen in einer Transaktion schreiben (RPC apply_post_diff, sql/apply_post_diff.sql):
+    entweder der ganze Diff oder nichts, ein Abbruch hinterlässt keinen halb geschriebenen Post.
+    Returns: {(block_index, display_order): media_id} aller Media des Posts.
+    """
+    doc = {
+        "post_id": post_id,
+        "post": diff["post"],
+        "media_insert": diff["media_insert"],
+        "media_update": [{"media_id": media_id, "changes": changes}
+                         for media_id, changes in diff["media_update"]],
+        "media_delete": diff["media_delete"],
+        "blocks_insert": diff["blocks_insert"],
+        "blocks_update": [{"block_id": block_id, "changes": changes}
+                          for block_id, changes in diff["blocks_update"]],
+        "blocks_delete": diff["blocks_delete"],
+    }
+    result = supabase.rpc("apply_post_diff", {"doc": doc}).execute()
+    return {(row["block_index"], row["display_order"]): row["media_id"]
+            for row in result.data["media"]}
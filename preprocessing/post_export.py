@@ -0,0 +1,215 @@
+"""
+Streaming-Export für Tumblr-Posts (NDJSON, optional gzip/zstd-komprimiert).
+
+Ein Post pro Zeile, geschrieben sobald eine Seite ankommt. Nach jeder Seite
+wird geflusht, damit ein abgebrochenes Backup alles bis dahin Geladene behält.
+Die Reader lesen Post für Post (konstanter Speicher) und verstehen auch das
+alte `tumblr_posts.json` (ein großes JSON-Array).
+
+Dateiformat wird über die Endung bestimmt:
+    *.ndjson        unkomprimiert
+    *.ndjson.gz     gzip
+    *.ndjson.zst    zstd (benötigt `pip install zstandard`)
+    *.json          Legacy-Array (nur lesen)
+"""
+
+import gzip
+import io
+import json
+import os
+import zlib
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Reihenfolge, in der nach einem vorhandenen Export gesucht wird
+EXPORT_SUFFIXES = (".ndjson.zst", ".ndjson.gz", ".ndjson", ".json")
+
+# Fehler beim Lesen eines abgeschnittenen (komprimierten) Datei-Endes
+TRUNCATION_ERRORS = (EOFError, zlib.error) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+def resolve_export(base: str) -> str:
+    """
+    Findet den vorhandenen Export zu einem Basisnamen,
+    z.B. "tumblr_posts" → "tumblr_posts.ndjson.gz" oder "tumblr_posts.json".
+    """
+    for suffix in EXPORT_SUFFIXES:
+        candidate = f"{base}{suffix}"
+        if Path(candidate).exists():
+            return candidate
+    return f"{base}.ndjson.gz"
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise RuntimeError("Für .zst-Dateien wird das Paket 'zstandard' benötigt (pip install zstandard)")
+
+
+def _open_binary(path: str, mode: str):
+    """Öffnet eine (ggf. komprimierte) Datei binär: mode ist 'rb', 'wb' oder 'ab'."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    if path.endswith(".zst"):
+        _require_zstd()
+        raw = open(path, mode)
+        if mode == "rb":
+            return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+        return zstandard.ZstdCompressor(level=10).stream_writer(raw)
+    return open(path, mode)
+
+
+class NDJSONWriter:
+    """
+    Schreibt Posts zeilenweise in einen NDJSON-Export.
+
+    Usage:
+        with NDJSONWriter("tumblr_posts.ndjson.gz") as writer:
+            writer.write_many(posts)
+    """
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = str(path)
+        self.count = 0
+        self._f = _open_binary(self.path, "ab" if append else "wb")
+
+    def write(self, post: dict):
+        line = json.dumps(post, ensure_ascii=False, separators=(",", ":"))
+        self._f.write(line.encode("utf-8") + b"\n")
+        self.count += 1
+
+    def write_many(self, posts):
+        """Schreibt eine Seite Posts und flusht danach."""
+        for post in posts:
+            self.write(post)
+        self.flush()
+
+    def flush(self):
+        if zstandard is not None and isinstance(self._f, zstandard.ZstdCompressionWriter):
+            # Abgeschlossener Frame pro Seite → bei Abbruch bleibt alles lesbar
+            self._f.flush(zstandard.FLUSH_FRAME)
+        else:
+            self._f.flush()
+
+    def close(self):
+        if self._f is not None:
+            self.flush()
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def iter_posts(path: str):
+    """
+    Liefert die Posts eines Exports einzeln (Generator).
+
+    Ein abgeschnittenes Dateiende (abgebrochenes Backup) wird toleriert:
+    es werden alle vollständig geschriebenen Zeilen geliefert.
+    """
+    path = str(path)
+    if not Path(path).exists():
+        raise FileNotFoundError(f"Export nicht gefunden: {path}")
+
+    if path.endswith(".json"):
+        # Legacy-Format: ein großes Array
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+        return
+
+    with _open_binary(path, "rb") as raw:
+        reader = io.BufferedReader(raw) if not hasattr(raw, "peek") else raw
+        while True:
+            try:
+                line = reader.readline()
+            except TRUNCATION_ERRORS:
+                print(f"⚠️  {path}: Datei endet unvollständig, lese nur bis hierhin")
+                return
+            if not line:
+                return
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # Letzte Zeile eines abgebrochenen Laufs
+                print(f"⚠️  {path}: unvollständige Zeile übersprungen")
+
+
+def count_posts(path: str) -> int:
+    """Zählt die Posts eines Exports, ohne sie im Speicher zu halten."""
+    return sum(1 for _ in iter_posts(path))
+
+
+def write_posts(path: str, posts):
+    """Schreibt ein Iterable von Posts in einen (neuen) Export."""
+    with NDJSONWriter(path) as writer:
+        for post in posts:
+            writer.write(post)
+    return writer.count
+
+
+# ============================================================================
+# CURSOR (inkrementelle Backups)
+# ============================================================================
+
+def cursor_path(export_path: str) -> str:
+    """Cursor-Datei liegt neben dem Export: tumblr_posts.ndjson.gz.cursor.json"""
+    return f"{export_path}.cursor.json"
+
+
+def load_cursor(export_path: str) -> dict:
+    """
+    Liest den Cursor eines Exports.
+
+    Felder:
+        newest_timestamp / newest_id   neuester bekannter Post
+        offset                         bis hierhin ist ein Voll-Backup geladen
+        complete                       Voll-Backup vollständig durchgelaufen
+    """
+    path = cursor_path(export_path)
+    if not Path(path).exists() or not Path(export_path).exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_cursor(export_path: str, cursor: dict):
+    """Schreibt den Cursor atomar (tmp-Datei + rename)."""
+    path = cursor_path(export_path)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cursor, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def merge_new_posts(export_path: str, new_posts: list) -> int:
+    """
+    Stellt neue Posts an den Anfang eines bestehenden Exports.
+
+    Der alte Export wird zeilenweise umkopiert; Posts, die in `new_posts`
+    erneut vorkommen (z.B. bearbeitet), werden durch die neue Version ersetzt.
+    Die Datei wird erst am Ende atomar ersetzt.
+
+    Returns:
+        int: Anzahl Posts im neuen Export
+    """
+    new_ids = {p.get("id_string") for p in new_posts}
+    tmp = f"{export_path}.merge{''.join(Path(export_path).suffixes)}"
+
+    with NDJSONWriter(tmp) as writer:
+        writer.write_many(new_posts)
+        for post in iter_posts(export_path):
+            if post.get("id_string") not in new_ids:
+                writer.write(post)
+
+    os.replace(tmp, export_path)
+    return writer.count
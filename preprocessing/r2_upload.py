@@ -0,0 +1,105 @@
+"""
+Paralleler Upload nach Cloudflare R2 (oder ein anderes Speicher-Backend).
+
+Ein Thread-Pool lädt viele Dateien gleichzeitig hoch; große Dateien (Videos)
+gehen per Multipart in mehreren Teilen parallel. Der boto3-Client bekommt
+genug Verbindungen im Pool für Worker × Multipart-Threads, sonst warten die
+Threads auf freie Verbindungen ("Connection pool is full").
+
+Usage:
+    storage = get_storage(max_pool_connections=pool_size_for(16))
+    with UploadEngine(storage, workers=16) as engine:
+        for local_path, r2_key in jobs:
+            engine.submit(local_path, r2_key, tag=...)
+        for result in engine.results():
+            ...
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from run_plan import record_throughput
+from storage_backend import TRANSFER_CONFIG, get_storage  # noqa: F401 (Re-Export für die Skripte)
+
+DEFAULT_WORKERS = 16
+
+
+def pool_size_for(workers: int) -> int:
+    """Verbindungen für `workers` parallele Uploads mit je max_concurrency Multipart-Teilen."""
+    return max(workers, DEFAULT_WORKERS) * TRANSFER_CONFIG.max_concurrency
+
+
+def upload_file(storage, local_path, r2_key: str, manifest=None) -> dict:
+    """
+    Eine Datei hochladen (Multipart ab Schwellwert) und im Manifest eintragen.
+
+    Returns:
+        dict: {"size": Bytes, "etag": ETag ohne Anführungszeichen}
+    """
+    start = time.monotonic()
+    result = storage.put(local_path, r2_key)
+    # Durchsatz pro Datei für Schätzungen im --plan-Modus (run_plan.py)
+    record_throughput("upload", result["size"], time.monotonic() - start)
+    if manifest:
+        manifest.record_upload(r2_key, r2_key, etag=result["etag"])
+    return result
+
+
+class UploadEngine:
+    """
+    Thread-Pool für Uploads in ein Speicher-Backend (storage_backend.py).
+
+    `submit` blockiert, sobald `max_pending` Uploads offen sind. `results()`
+    liefert pro Datei ein dict mit local_path, r2_key, size, etag, tag und
+    ggf. error – in Abschlussreihenfolge, Fehler werden nicht geworfen.
+    """
+
+    def __init__(self, storage, workers: int = DEFAULT_WORKERS, manifest=None,
+                 max_pending: int = None):
+        self.storage = storage
+        self.manifest = manifest
+        self._pending = threading.BoundedSemaphore(max_pending or workers * 4)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def _run(self, local_path, r2_key, tag):
+        result = {"local_path": str(local_path), "r2_key": r2_key, "tag": tag, "error": None}
+        try:
+            result.update(upload_file(self.storage, local_path, r2_key, manifest=self.manifest))
+        except Exception as e:
+            result["error"] = str(e)
+        return result
+
+    def submit(self, local_path, r2_key: str, tag=None):
+        """Upload einreihen; `tag` wird unverändert im Ergebnis zurückgegeben."""
+        self._pending.acquire()
+        future = self._executor.submit(self._run, local_path, r2_key, tag)
+        future.add_done_callback(lambda _: self._pending.release())
+        with self._lock:
+            self._futures.add(future)
+        return future
+
+    def results(self, wait: bool = True):
+        """
+        Ergebnisse der eingereihten Uploads, sobald sie fertig sind.
+        Mit wait=False nur die bereits abgeschlossenen (zum Abarbeiten zwischendurch).
+        """
+        with self._lock:
+            if wait:
+                futures, self._futures = self._futures, set()
+            else:
+                futures = {f for f in self._futures if f.done()}
+                self._futures -= futures
+        for future in as_completed(futures):
+            yield future.result()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
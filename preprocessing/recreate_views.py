@@ -35,7 +35,7 @@ try:
     LEFT JOIN media m ON p.post_id = m.post_id
     GROUP BY p.post_id;
 
-    -- 3. Re-create posts_with_thumbnail view to expand p.* and capture actual_date
+    -- 3. Re-create posts_with_thumbnail view to expand p.* and capture actual_date + thumbnail_variants
     CREATE OR REPLACE VIEW posts_with_thumbnail AS
     SELECT 
         p.*,
@@ -46,7 +46,15 @@ try:
             AND m.media_type = 'image'
             ORDER BY m.block_index, m.display_order
             LIMIT 1
-        ) as thumbnail_path
+        ) as thumbnail_path,
+        (
+            SELECT m.variants
+            FROM media m
+            WHERE m.post_id = p.post_id 
+            AND m.media_type = 'image'
+            ORDER BY m.block_index, m.display_order
+            LIMIT 1
+        ) as thumbnail_variants
     FROM posts p;
     """
     
@@ -0,0 +1,113 @@
+"""
+Welche Bucket-Keys kommen in einem Text vor? – ein Durchlauf pro Text.
+
+Die Orphan-/Duplikat-Skripte prüfen jede DB-Zeile (Post-Summary,
+content_blocks-JSON, Community-Beiträge) auf Erwähnungen von Bucket-Keys.
+`for key in keys: if key in text` kostet Keys × Zeilen × Textlänge; hier
+wird stattdessen einmal ein Aho-Corasick-Automat über alle Keys gebaut und
+jeder Text in einem Durchlauf gescannt (linear in Textlänge + Treffer).
+
+Gefunden werden Keys als beliebige Teilstrings – wie vorher mit `in`.
+Reines URL-Parsing würde nicht reichen: content_blocks verweisen auch über
+lokale Pfade (/media/POST_ID/datei.jpg) auf Keys, und ein übersehener
+Verweis hieße, dass eine benutzte Datei als verwaist gelöscht wird.
+
+Ist pyahocorasick installiert, wird dessen C-Implementierung genutzt,
+sonst der Automat in reinem Python.
+
+Usage:
+    scanner = KeyScanner(storage.list())
+    for key in scanner.find(text):
+        referenced_keys.add(key)
+"""
+
+import re
+import urllib.parse
+
+try:
+    import ahocorasick  # pip install pyahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+def storage_key(path: str, public_url: str) -> str:
+    """storage_path (Public-URL) → Bucket-Key, z.B. https://pub-….r2.dev/123/a.jpg → 123/a.jpg"""
+    key = path
+    if public_url and public_url in key:
+        key = key.split(public_url)[-1].lstrip('/')
+    elif "r2.dev" in key:
+        key = re.sub(r'https?://[^/]+/', '', key)
+    # URL-Encoding auflösen (z.B. %20 -> Leerzeichen)
+    return urllib.parse.unquote(key)
+
+
+class KeyScanner:
+    def __init__(self, keys):
+        """keys: alle Bucket-Keys (Iterable, z.B. das Dict aus storage.list())."""
+        keys = [key for key in keys if key]
+        self.size = len(keys)
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for key in keys:
+                self._automaton.add_word(key, key)
+            if keys:
+                self._automaton.make_automaton()
+        else:
+            self._automaton = None
+            self._build(keys)
+
+    def _build(self, keys):
+        # Trie: goto[node] = {zeichen: kind}, word[node] = Key, der in node endet
+        self._goto = [{}]
+        self._word = [None]
+        for key in keys:
+            node = 0
+            for ch in key:
+                child = self._goto[node].get(ch)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto[node][ch] = child
+                    self._goto.append({})
+                    self._word.append(None)
+                node = child
+            self._word[node] = key
+
+        # Breitensuche: fail = längstes echtes Suffix, das auch im Trie liegt;
+        # output = nächster Knoten auf der fail-Kette, in dem ein Key endet
+        self._fail = [0] * len(self._goto)
+        self._output = [0] * len(self._goto)
+        level = list(self._goto[0].values())
+        while level:
+            next_level = []
+            for node in level:
+                for ch, child in self._goto[node].items():
+                    fallback = self._fail[node]
+                    while fallback and ch not in self._goto[fallback]:
+                        fallback = self._fail[fallback]
+                    target = self._goto[fallback].get(ch, 0)
+                    if target == child:  # Tiefe 1: fail zeigt auf die Wurzel
+                        target = 0
+                    self._fail[child] = target
+                    self._output[child] = target if self._word[target] else self._output[target]
+                    next_level.append(child)
+            level = next_level
+
+    def find(self, text: str) -> set:
+        """Alle Keys, die in `text` vorkommen."""
+        if not text or not self.size:
+            return set()
+        if self._automaton is not None:
+            return {key for _, key in self._automaton.iter(text)}
+
+        goto, fail, word, output = self._goto, self._fail, self._word, self._output
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            match = node if word[node] else output[node]
+            while match:
+                found.add(word[match])
+                match = output[match]
+        return found
@@ -0,0 +1,225 @@
+"""
+--plan: abschätzen, was ein Lauf kostet, bevor er läuft.
+
+Im Plan-Modus machen die Skripte nur ihre Discovery (lokaler Zustand,
+Bucket-Inventar, DB-Lesezugriffe) und tragen hier ein, was der echte Lauf
+tun würde. Der Bericht zeigt Tumblr-Calls, Download-/Upload-Bytes,
+PostgREST- und SQL-Round-Trips, Storage-Operationen und die erwartete
+Laufzeit – für die Planung großer Jobs in ruhigen Zeitfenstern.
+
+Laufzeit aus gemessenem Durchsatz:
+    - Latenzen: die Discovery-Requests selbst werden gestoppt (plan.timed)
+    - Bandbreite: echte Läufe protokollieren den Durchsatz pro Datei
+      (record_throughput → .cache/throughput.json), der Plan nimmt den
+      gleitenden Mittelwert
+    - ohne Messung oder Historie: DEFAULT_RATES (im Bericht markiert)
+
+Usage:
+    plan = RunPlan("upload_to_r2", workers={"upload": 16})
+    with plan.timed("postgrest"):
+        rows = supabase.table("media").select("*").execute()
+    plan.add("upload", os.path.getsize(path))
+    plan.add("storage", put_operations(os.path.getsize(path)), timed=False)
+    print(plan.report())
+"""
+
+import atexit
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+THROUGHPUT_FILE = PROJECT_ROOT / ".cache" / "throughput.json"
+
+# Einheiten pro Sekunde und Stream, falls nichts gemessen wurde
+DEFAULT_RATES = {
+    "tumblr": 2.0,              # Calls/s
+    "download": 5 * 1024**2,    # Bytes/s
+    "upload": 5 * 1024**2,      # Bytes/s
+    "postgrest": 5.0,           # Requests/s
+    "sql": 20.0,                # Round-Trips/s
+    "storage": 10.0,            # Operationen/s (PUT/DELETE/LIST-Seite)
+}
+
+LABELS = {
+    "tumblr": "Tumblr-Calls",
+    "download": "Download",
+    "upload": "Upload",
+    "postgrest": "PostgREST-Requests",
+    "sql": "SQL-Round-Trips",
+    "storage": "Storage-Operationen",
+}
+BYTE_KINDS = {"download", "upload"}
+
+EWMA_WEIGHT = 0.2  # Gewicht einer neuen Messung im gleitenden Mittel
+
+_lock = threading.Lock()
+_pending = {}  # kind → [Menge, Sekunden] dieses Prozesses, beim Beenden gespeichert
+
+
+def load_throughput() -> dict:
+    """Gespeicherter Durchsatz pro Art: {kind: Einheiten/s pro Stream}."""
+    try:
+        return {kind: entry["rate"] for kind, entry in json.loads(THROUGHPUT_FILE.read_text()).items()}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def record_throughput(kind: str, amount: float, seconds: float):
+    """Eine Messung aus einem echten Lauf (z.B. Bytes einer Datei und Dauer ihres Uploads)."""
+    if seconds <= 0 or amount <= 0:
+        return
+    with _lock:
+        if not _pending:
+            atexit.register(_save)
+        total = _pending.setdefault(kind, [0.0, 0.0])
+        total[0] += amount
+        total[1] += seconds
+
+
+def _save():
+    with _lock:
+        measured = {kind: amount / seconds for kind, (amount, seconds) in _pending.items() if seconds}
+        _pending.clear()
+    if not measured:
+        return
+    try:
+        stored = json.loads(THROUGHPUT_FILE.read_text())
+    except (OSError, ValueError):
+        stored = {}
+    for kind, rate in measured.items():
+        old = stored.get(kind, {}).get("rate")
+        stored[kind] = {
+            "rate": rate if old is None else (1 - EWMA_WEIGHT) * old + EWMA_WEIGHT * rate,
+            "updated_at": time.time(),
+        }
+    try:
+        THROUGHPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
+        THROUGHPUT_FILE.write_text(json.dumps(stored, indent=2))
+    except OSError:
+        pass
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds // 60:.0f}m {seconds % 60:02.0f}s"
+    return f"{seconds // 3600:.0f}h {seconds % 3600 // 60:02.0f}m"
+
+
+class RunPlan:
+    """
+    Zähler für einen geplanten Lauf.
+
+    Args:
+        name: Skriptname für die Überschrift
+        workers: parallele Streams pro Art, z.B. {"upload": 16}; Standard 1
+        pipelined: True = Arten laufen gleichzeitig (import_new_posts), die
+                   Laufzeit ist die der langsamsten; sonst nacheinander (Summe)
+    """
+
+    def __init__(self, name: str, workers: dict = None, pipelined: bool = False):
+        self.name = name
+        self.workers = workers or {}
+        self.pipelined = pipelined
+        self.counts = {kind: 0 for kind in LABELS}
+        self.notes = []
+        self._measured = {}  # kind → [Anzahl, Sekunden] aus plan.timed
+        self._untimed = {kind: 0 for kind in LABELS}
+
+    def add(self, kind: str, amount: float = 1, timed: bool = True):
+        """
+        timed=False: nur zählen, die Zeit steckt schon in einer anderen Art
+        (z.B. die PUTs eines Uploads im Upload-Durchsatz).
+        """
+        self.counts[kind] += amount
+        if not timed:
+            self._untimed[kind] += amount
+
+    def note(self, text: str):
+        """Zusatzzeile im Bericht (z.B. Anzahl Dateien, Annahmen)."""
+        self.notes.append(text)
+
+    def measure(self, kind: str, calls: int, seconds: float):
+        """
+        Discovery-Requests, die der echte Lauf genauso macht: sie zählen mit,
+        ihre Dauer liefert die aktuelle Latenz.
+        """
+        measured = self._measured.setdefault(kind, [0, 0.0])
+        measured[0] += calls
+        measured[1] += seconds
+        self.counts[kind] += calls
+
+    @contextmanager
+    def timed(self, kind: str, calls: int = 1):
+        """measure() für einen Block mit bekannter Anzahl Requests."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.measure(kind, calls, time.monotonic() - start)
+
+    def add_derivatives(self, images: int, videos: int):
+        """Responsive Bild-Derivate und Video-Poster/-Renditions für neu hochgeladene Dateien."""
+        from image_variants import VARIANT_WIDTHS, VARIANT_FORMATS
+        from storage_path_writer import DEFAULT_BATCH_SIZE
+
+        if images:
+            self.add("storage", images * len(VARIANT_WIDTHS) * len(VARIANT_FORMATS))
+            self.add("postgrest", -(-images // DEFAULT_BATCH_SIZE))
+        if videos:
+            self.add("storage", videos * 2)  # Poster + 720p-Rendition
+            self.add("postgrest", -(-videos // DEFAULT_BATCH_SIZE))
+        if images or videos:
+            self.note(f"Derivate: {images} Bilder, {videos} Videos (Rechenzeit und Bytes nicht geschätzt)")
+
+    def rate(self, kind: str):
+        """(Einheiten/s pro Stream, Quelle)"""
+        calls, seconds = self._measured.get(kind, (0, 0.0))
+        if calls and seconds > 0:
+            return calls / seconds, "gemessen"
+        history = load_throughput().get(kind)
+        if history:
+            return history, "Historie"
+        return DEFAULT_RATES[kind], "Annahme"
+
+    def estimate(self) -> dict:
+        """{kind: (Sekunden, Quelle)} für alle Arten mit Arbeit."""
+        estimates = {}
+        for kind, amount in self.counts.items():
+            if not amount:
+                continue
+            rate, source = self.rate(kind)
+            timed = amount - self._untimed[kind]
+            estimates[kind] = (timed / (rate * self.workers.get(kind, 1)), source)
+        return estimates
+
+    def report(self) -> str:
+        estimates = self.estimate()
+        lines = ["", "=" * 60, f"📋 PLAN: {self.name} (nichts wurde geschrieben)", "=" * 60]
+        for kind, label in LABELS.items():
+            amount = self.counts[kind]
+            if not amount:
+                continue
+            value = format_bytes(amount) if kind in BYTE_KINDS else f"{amount:,.0f}"
+            seconds, source = estimates[kind]
+            parallel = self.workers.get(kind, 1)
+            lines.append(f"  {label:20s} {value:>12s}   ~{format_duration(seconds):>8s} "
+                         f"({parallel}× parallel, {source})")
+        total = max((s for s, _ in estimates.values()), default=0.0) if self.pipelined \
+            else sum(s for s, _ in estimates.values())
+        lines.append(f"  ⏱️  Erwartete Laufzeit: ~{format_duration(total)}"
+                     f"{' (Stufen überlappen, langsamste zählt)' if self.pipelined else ''}")
+        for text in self.notes:
+            lines.append(f"  ℹ️  {text}")
+        return "\n".join(lines)
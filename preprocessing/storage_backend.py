@@ -0,0 +1,322 @@
+"""
+Speicher-Backends für die Medien-Objekte.
+
+Alle Upload-, Orphan- und Restore-Skripte sprechen nur noch diese
+Schnittstelle an statt direkt boto3:
+
+    storage = get_storage()
+    storage.put("/pfad/bild.jpg", "POST_ID/bild.jpg")   # → {"size", "etag"}
+    storage.head("POST_ID/bild.jpg")                     # → {"size", "etag", "content_type"} oder None
+    storage.list("POST_ID/")                             # → {key: {"size", "etag"}}
+    storage.copy("POST_ID/bild.jpg", "backup/bild.jpg")
+    storage.delete("backup/bild.jpg")
+
+Backends:
+    R2Backend     Cloudflare R2 (S3-kompatibel), Standard
+    LocalBackend  Verzeichnis auf der Platte, gleiche Semantik inkl. ETags
+                  (MD5 bzw. S3-Multipart-ETag "md5-N") – zum Testen und für
+                  Lasttests ohne echten Bucket
+
+Auswahl per .env:
+    STORAGE_BACKEND=r2 | local
+    LOCAL_STORAGE_ROOT=./local_bucket    (nur für local)
+    R2_BUCKET_NAME=simplestravelmedia
+"""
+
+import hashlib
+import json
+from abc import ABC, abstractmethod
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+DEFAULT_BUCKET = "simplestravelmedia"
+DEFAULT_LOCAL_ROOT = "local_bucket"
+DEFAULT_POOL_CONNECTIONS = 64
+MB = 1024 * 1024
+
+# Ab 16 MB Multipart in 16-MB-Teilen, 4 Teile pro Datei gleichzeitig
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=16 * MB,
+    multipart_chunksize=16 * MB,
+    max_concurrency=4,
+    use_threads=True,
+)
+
+CONTENT_TYPES = {
+    # Images
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".avif": "image/avif",
+    ".svg": "image/svg+xml",
+    ".bmp": "image/bmp",
+    ".tiff": "image/tiff",
+    ".tif": "image/tiff",
+
+    # Videos
+    ".mp4": "video/mp4",
+    ".webm": "video/webm",
+    ".mov": "video/quicktime",
+    ".avi": "video/x-msvideo",
+    ".mkv": "video/x-matroska",
+    ".flv": "video/x-flv",
+    ".wmv": "video/x-ms-wmv",
+    ".m4v": "video/mp4",
+
+    # Audio
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".ogg": "audio/ogg",
+    ".m4a": "audio/mp4",
+    ".aac": "audio/aac",
+    ".flac": "audio/flac",
+    ".wma": "audio/x-ms-wma",
+}
+
+
+def content_type_for(path) -> str:
+    return CONTENT_TYPES.get(Path(path).suffix.lower(), "application/octet-stream")
+
+
+def make_r2_client(max_pool_connections: int = DEFAULT_POOL_CONNECTIONS):
+    """
+    S3-kompatibler R2-Client mit großem Verbindungspool und adaptiven Retries.
+    Credentials kommen aus der Umgebung (.env muss vorher geladen sein).
+    """
+    return boto3.client(
+        "s3",
+        endpoint_url=f"https://{os.getenv('R2_ACCOUNT_ID')}.r2.cloudflarestorage.com",
+        aws_access_key_id=os.getenv("R2_ACCESS_KEY"),
+        aws_secret_access_key=os.getenv("R2_SECRET_KEY"),
+        region_name="auto",  # R2 braucht keine Region
+        config=Config(
+            max_pool_connections=max_pool_connections,
+            retries={"max_attempts": 5, "mode": "adaptive"},
+        ),
+    )
+
+
+def compute_etag(path, transfer_config: TransferConfig = TRANSFER_CONFIG) -> str:
+    """
+    ETag, wie ihn S3/R2 für einen Upload mit `transfer_config` vergibt:
+    MD5 des Inhalts, ab dem Multipart-Schwellwert MD5 der Teil-MD5s + "-Anzahl".
+    """
+    size = os.path.getsize(path)
+    chunk = transfer_config.multipart_chunksize
+    with open(path, "rb") as f:
+        if size < transfer_config.multipart_threshold:
+            digest = hashlib.md5()
+            for block in iter(lambda: f.read(MB), b""):
+                digest.update(block)
+            return digest.hexdigest()
+        parts = [hashlib.md5(block).digest() for block in iter(lambda: f.read(chunk), b"")]
+    return f"{hashlib.md5(b''.join(parts)).hexdigest()}-{len(parts)}"
+
+
+def put_operations(size: int, transfer_config: TransferConfig = TRANSFER_CONFIG) -> int:
+    """API-Calls für den Upload einer Datei: 1 PUT, ab dem Schwellwert Create + Teile + Complete."""
+    if size < transfer_config.multipart_threshold:
+        return 1
+    return -(-size // transfer_config.multipart_chunksize) + 2
+
+
+class StorageBackend(ABC):
+    """Gemeinsame Schnittstelle; ETags immer ohne Anführungszeichen."""
+
+    bucket = None
+
+    @abstractmethod
+    def list(self, prefix: str = "") -> dict:
+        """Alle Objekte unter `prefix`: key → {"size", "etag"}."""
+
+    @abstractmethod
+    def put(self, local_path, key: str, content_type: str = None) -> dict:
+        """Datei hochladen (überschreibt). Returns: {"size", "etag"}."""
+
+    @abstractmethod
+    def head(self, key: str):
+        """{"size", "etag", "content_type"} oder None, wenn es den Key nicht gibt."""
+
+    @abstractmethod
+    def copy(self, source_key: str, key: str) -> dict:
+        """Objekt innerhalb des Buckets kopieren. Returns: {"size", "etag"}."""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Objekt löschen; ein fehlender Key ist kein Fehler (wie bei S3)."""
+
+    def exists(self, key: str) -> bool:
+        return self.head(key) is not None
+
+
+class R2Backend(StorageBackend):
+    def __init__(self, bucket: str = None, client=None,
+                 transfer_config: TransferConfig = TRANSFER_CONFIG,
+                 max_pool_connections: int = DEFAULT_POOL_CONNECTIONS):
+        self.bucket = bucket or os.getenv("R2_BUCKET_NAME", DEFAULT_BUCKET)
+        self.client = client or make_r2_client(max_pool_connections=max_pool_connections)
+        self.transfer_config = transfer_config
+
+    def list(self, prefix: str = "") -> dict:
+        # Paginiertes list_objects_v2 (1000 Keys pro Call)
+        inventory = {}
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                inventory[obj["Key"]] = {"size": obj["Size"], "etag": obj.get("ETag", "").strip('"')}
+        return inventory
+
+    def put(self, local_path, key: str, content_type: str = None) -> dict:
+        self.client.upload_file(
+            str(local_path),
+            self.bucket,
+            key,
+            ExtraArgs={"ContentType": content_type or content_type_for(local_path)},
+            Config=self.transfer_config,
+        )
+        # ETag lokal berechnen statt per head_object nachzufragen (ein Round-Trip
+        # weniger pro Datei); gleiche TransferConfig → gleicher (Multipart-)ETag
+        return {"size": os.path.getsize(local_path), "etag": compute_etag(local_path, self.transfer_config)}
+
+    def head(self, key: str):
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return {
+            "size": response.get("ContentLength"),
+            "etag": response.get("ETag", "").strip('"'),
+            "content_type": response.get("ContentType"),
+        }
+
+    def copy(self, source_key: str, key: str) -> dict:
+        # Managed Copy: große Objekte serverseitig per Multipart
+        self.client.copy({"Bucket": self.bucket, "Key": source_key}, self.bucket, key,
+                         Config=self.transfer_config)
+        info = self.head(key)
+        return {"size": info["size"], "etag": info["etag"]}
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def __str__(self):
+        return f"R2 Bucket {self.bucket}"
+
+
+class LocalBackend(StorageBackend):
+    """
+    Objekte als Dateien unter `root/<key>`. Metadaten (ETag, Content-Type)
+    liegen daneben in `root/.meta/<key>.json`; fehlen sie oder passt die
+    Datei nicht mehr dazu, wird der ETag neu berechnet.
+    """
+
+    META_DIR = ".meta"
+
+    def __init__(self, root=None, transfer_config: TransferConfig = TRANSFER_CONFIG):
+        self.root = Path(root or os.getenv("LOCAL_STORAGE_ROOT", DEFAULT_LOCAL_ROOT)).resolve()
+        self.bucket = str(self.root)
+        self.transfer_config = transfer_config
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if key.startswith("/") or self.root not in path.parents or key.split("/", 1)[0] == self.META_DIR:
+            raise ValueError(f"Ungültiger Key: {key}")
+        return path
+
+    def _meta_path(self, key: str) -> Path:
+        return self.root / self.META_DIR / f"{key}.json"
+
+    def _write_meta(self, key: str, path: Path, etag: str, content_type: str):
+        stat = path.stat()
+        meta_path = self._meta_path(key)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = meta_path.with_name(f"{meta_path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                   "etag": etag, "content_type": content_type}))
+        os.replace(tmp, meta_path)
+
+    def _meta(self, key: str, path: Path) -> dict:
+        stat = path.stat()
+        try:
+            meta = json.loads(self._meta_path(key).read_text())
+            if meta["size"] == stat.st_size and meta["mtime_ns"] == stat.st_mtime_ns:
+                return meta
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+        # Von außen abgelegte oder geänderte Datei
+        meta = {"size": stat.st_size, "etag": compute_etag(path, self.transfer_config),
+                "content_type": content_type_for(key)}
+        self._write_meta(key, path, meta["etag"], meta["content_type"])
+        return meta
+
+    def list(self, prefix: str = "") -> dict:
+        inventory = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if Path(dirpath) == self.root:
+                dirnames[:] = [d for d in dirnames if d != self.META_DIR]
+            for filename in filenames:
+                path = Path(dirpath) / filename
+                key = path.relative_to(self.root).as_posix()
+                if not key.startswith(prefix) or filename.endswith(".tmp"):
+                    continue
+                meta = self._meta(key, path)
+                inventory[key] = {"size": meta["size"], "etag": meta["etag"]}
+        return inventory
+
+    def put(self, local_path, key: str, content_type: str = None) -> dict:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Erst in eine temporäre Datei, dann atomar umbenennen (wie ein fertiger PUT)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(local_path, tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        etag = compute_etag(path, self.transfer_config)
+        self._write_meta(key, path, etag, content_type or content_type_for(local_path))
+        return {"size": path.stat().st_size, "etag": etag}
+
+    def head(self, key: str):
+        path = self._path(key)
+        if not path.is_file():
+            return None
+        meta = self._meta(key, path)
+        return {"size": meta["size"], "etag": meta["etag"], "content_type": meta["content_type"]}
+
+    def copy(self, source_key: str, key: str) -> dict:
+        info = self.head(source_key)
+        if info is None:
+            raise FileNotFoundError(f"NoSuchKey: {source_key}")
+        return self.put(self._path(source_key), key, content_type=info["content_type"])
+
+    def delete(self, key: str):
+        self._path(key).unlink(missing_ok=True)
+        self._meta_path(key).unlink(missing_ok=True)
+
+    def __str__(self):
+        return f"Lokaler Speicher {self.root}"
+
+
+def get_storage(backend: str = None, max_pool_connections: int = DEFAULT_POOL_CONNECTIONS) -> StorageBackend:
+    """Backend laut STORAGE_BACKEND (.env muss vorher geladen sein); Standard ist R2."""
+    backend = (backend or os.getenv("STORAGE_BACKEND", "r2")).lower()
+    if backend == "local":
+        return LocalBackend()
+    if backend == "r2":
+        return R2Backend(max_pool_connections=max_pool_connections)
+    raise ValueError(f"Unbekanntes STORAGE_BACKEND: {backend} (r2 oder local)")
@@ -0,0 +1,142 @@
+"""
+Write-Behind-Puffer für `media.storage_path`.
+
+Statt pro hochgeladener Datei ein PostgREST-UPDATE zu schicken, werden
+(media_id, storage_path)-Paare gesammelt und gebündelt über die RPC
+`bulk_update_storage_paths` (sql/bulk_update_storage_paths.sql) geschrieben.
+
+Geflusht wird, sobald `batch_size` Einträge offen sind, spätestens nach
+`flush_interval` Sekunden und beim Beenden des Prozesses (atexit) – ein
+Absturz verliert also höchstens einen Batch.
+
+Ist die Funktion in der DB (noch) nicht installiert, wird auf Einzel-Updates
+zurückgefallen (python3 run_storage_paths_migration.py installiert sie).
+
+Dasselbe Muster für andere `media`-Spalten (z.B. `variants`):
+    StoragePathWriter(supabase, column="variants", rpc_name="bulk_update_media_variants")
+Mit column=None ist jeder Wert ein dict mehrerer Spalten:
+    StoragePathWriter(supabase, column=None, rpc_name="bulk_update_video_renditions")
+
+Usage:
+    with StoragePathWriter(supabase) as writer:
+        writer.add(media_id, r2_url)
+"""
+
+import atexit
+import threading
+import time
+
+RPC_NAME = "bulk_update_storage_paths"
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 5.0  # Sekunden
+MISSING_FUNCTION_CODES = ("PGRST202", "42883")  # PostgREST / SQLSTATE: Funktion fehlt
+
+
+def _is_missing_function(error: Exception) -> bool:
+    code = getattr(error, "code", None)
+    if code is not None:
+        return code in MISSING_FUNCTION_CODES
+    return any(c in str(error) for c in MISSING_FUNCTION_CODES)
+
+
+class StoragePathWriter:
+    def __init__(self, supabase, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 column: str = "storage_path", rpc_name: str = RPC_NAME):
+        self.supabase = supabase
+        self.column = column
+        self.rpc_name = rpc_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.batches = 0
+        self._buffer = {}  # media_id → neuer Wert (letzter Wert gewinnt)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._use_rpc = True
+        self._closed = threading.Event()
+        self._last_flush = time.monotonic()
+
+        # Zeitbasiertes Flushen, auch wenn gerade nichts Neues hinzukommt
+        self._timer = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._timer.start()
+        atexit.register(self.close)
+
+    def add(self, media_id: int, value):
+        """Update vormerken; flusht, sobald der Batch voll ist."""
+        with self._lock:
+            self._buffer[media_id] = value
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(min(1.0, self.flush_interval)):
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"  ❌ {self.column or 'media'} flush failed: {e}")
+
+    def flush(self) -> int:
+        """Alle offenen Updates schreiben. Gibt die Anzahl geschriebener Einträge zurück."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, {}
+            self._last_flush = time.monotonic()
+            if not batch:
+                return 0
+
+            try:
+                self._write(batch)
+            except Exception:
+                # Batch nicht verlieren: zurück in den Puffer (neuere Werte haben Vorrang)
+                with self._lock:
+                    self._buffer = {**batch, **self._buffer}
+                raise
+
+            self.written += len(batch)
+            self.batches += 1
+            return len(batch)
+
+    def _write(self, batch: dict):
+        if self.column is None:
+            updates = [{"media_id": media_id, **value} for media_id, value in batch.items()]
+        else:
+            updates = [{"media_id": media_id, self.column: value} for media_id, value in batch.items()]
+        if self._use_rpc:
+            try:
+                self.supabase.rpc(self.rpc_name, {"updates": updates}).execute()
+                return
+            except Exception as e:
+                # Funktion fehlt (PGRST202 / SQLSTATE 42883) → Einzel-Updates; andere
+                # Fehler weiterreichen – auch wenn ihr Kontext den Funktionsnamen nennt
+                if not _is_missing_function(e):
+                    raise
+                print(f"  ⚠️  RPC {self.rpc_name} nicht gefunden – Einzel-Updates "
+                      f"(Migration aus sql/ installiert sie)")
+                self._use_rpc = False
+
+        for row in updates:
+            self.supabase.table("media") \
+                .update({k: v for k, v in row.items() if k != "media_id"}) \
+                .eq("media_id", row["media_id"]) \
+                .execute()
+
+    def close(self):
+        """Restliche Updates schreiben und den Timer beenden (idempotent)."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._timer.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+    def summary(self) -> str:
+        return f"DB: {self.written} {self.column or 'media'}-Updates in {self.batches} Batches"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -1,14 +1,17 @@
-import json
 from pathlib import Path
+from post_export import iter_posts, resolve_export
+from media_manifest import MediaManifest
 
-def test_local_media_files(json_file="tumblr_posts_local.json"):
+def test_local_media_files(json_file=None):
     """
     Testet ob alle lokalen Media-URLs tatsächlich existieren
     """
+    json_file = json_file or resolve_export("tumblr_posts_local")
     print(f"🔍 Teste lokale Media-Dateien aus {json_file}...\n")
 
-    with open(json_file, 'r', encoding='utf-8') as f:
-        posts = json.load(f)
+    posts = iter_posts(json_file)
+    manifest = MediaManifest()
+    stale_manifest = 0
 
     total_media = 0
     found_media = 0
@@ -33,10 +36,16 @@ def test_local_media_files(json_file="tumblr_posts_local.json"):
 
                         file_path = Path(relative_path)
 
+                        rel_path = relative_path.removeprefix('media/')
+
                         if file_path.exists():
                             found_media += 1
                         else:
                             missing_media += 1
+                            # Manifest hält die Datei für vorhanden → erneut zum Download markieren
+                            if manifest.is_downloaded(rel_path):
+                                manifest.forget_download(rel_path)
+                                stale_manifest += 1
                             missing_files.append({
                                 'post_id': post_id,
                                 'block': block_idx,
@@ -52,6 +61,8 @@ def test_local_media_files(json_file="tumblr_posts_local.json"):
     print(f"Gesamt Media-Dateien:  {total_media}")
     print(f"✅ Gefunden:           {found_media} ({found_media/total_media*100:.1f}%)")
     print(f"❌ Fehlen:             {missing_media} ({missing_media/total_media*100:.1f}%)")
+    if stale_manifest:
+        print(f"📒 Im Manifest korrigiert: {stale_manifest} (wieder zum Download markiert)")
     print("=" * 60)
 
     if missing_files:
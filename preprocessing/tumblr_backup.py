@@ -1,8 +1,10 @@
 import os
-import json
-import time
+import sys
 import pytumblr
 from dotenv import load_dotenv
+from tumblr_fetch import TumblrFetcher
+from tumblr_cache import ResponseCache
+from post_export import NDJSONWriter, load_cursor, save_cursor, merge_new_posts
 
 load_dotenv()
 
@@ -21,32 +23,137 @@ client = pytumblr.TumblrRestClient(
 # Blog-Name: https://www.tumblr.com/blog/simplestravel
 BLOG_NAME = "simplestravel.tumblr.com"
 
-all_posts = []
-limit = 20  # max. Posts pro API-Call
-offset = 0
-
-while True:
-    response = client.posts(
-        BLOG_NAME,
-        limit=limit,
-        offset=offset,
-        reblog_info=True,
-        notes_info=True,
-        npf=True  # NPF = neues Post-Format
-    )
-    
-    posts = response.get("posts", [])
-    if not posts:
-        break
-
-    all_posts.extend(posts)
-    offset += limit
-
-    print(f"Geladen: {len(all_posts)} Posts")
-    time.sleep(0.5)  # API-freundlich
-
-# JSON-Datei speichern
-with open("tumblr_posts.json", "w", encoding="utf-8") as f:
-    json.dump(all_posts, f, ensure_ascii=False, indent=2)
-
-print(f"\n✅ Fertig! {len(all_posts)} Posts in tumblr_posts.json gespeichert.")
+# Parameter für jeden /posts-Call
+POST_PARAMS = dict(
+    reblog_info=True,
+    notes_info=True,
+    npf=True  # NPF = neues Post-Format
+)
+
+
+def is_known(post, cursor):
+    """True, wenn der Post laut Cursor schon im Export ist."""
+    if post.get("is_pinned"):
+        # Angepinnte Posts stehen oben, obwohl sie alt sind
+        return False
+    return (post.get("timestamp", 0) <= cursor["newest_timestamp"]
+            or post.get("id_string") == cursor["newest_id"])
+
+
+def update_cursor(cursor, posts):
+    """Neuesten Post und erreichte Position (ältester Post) im Cursor nachführen."""
+    newest = max(posts, key=lambda p: p.get("timestamp", 0))
+    if newest.get("timestamp", 0) > cursor.get("newest_timestamp", 0):
+        cursor["newest_timestamp"] = newest.get("timestamp", 0)
+        cursor["newest_id"] = newest.get("id_string")
+
+    oldest = min(p.get("timestamp", 0) for p in posts)
+    if oldest < cursor.get("oldest_timestamp", oldest + 1):
+        cursor["oldest_timestamp"] = oldest
+        cursor["oldest_ids"] = []
+    if oldest == cursor["oldest_timestamp"]:
+        cursor["oldest_ids"] += [p.get("id_string") for p in posts if p.get("timestamp", 0) == oldest]
+
+
+def full_backup(fetcher, output_file, cursor, parallel=False):
+    """
+    Lädt den ganzen Blog. Nach jeder Seite wird die erreichte Position im
+    Cursor gespeichert; ein abgebrochener Lauf setzt beim nächsten Start dort
+    fort und hängt an den Export an.
+
+    Standard ist der `before`-Cursor (stabil, wenn während des Laufs gepostet
+    wird). Mit parallel=True werden Offset-Fenster parallel geladen; doppelt
+    gelieferte Posts werden dabei per ID verworfen.
+    """
+    start = cursor.get("offset", 0)
+    if start:
+        # Export einmal sauber neu schreiben: schneidet ein abgebrochenes
+        # Dateiende ab, danach entspricht die Position der echten Post-Anzahl
+        start = merge_new_posts(output_file, [])
+        print(f"↩️  Setze abgebrochenes Backup bei Post {start} fort")
+
+    if parallel:
+        pages = (posts for _, posts in fetcher.iter_pages(start=start, **POST_PARAMS))
+    elif start and "oldest_timestamp" in cursor:
+        pages = fetcher.iter_pages_before(
+            before=cursor["oldest_timestamp"] + 1,
+            seen=cursor.get("oldest_ids"),
+            **POST_PARAMS
+        )
+    else:
+        pages = fetcher.iter_pages_before(**POST_PARAMS)
+
+    seen_ids = set()
+    with NDJSONWriter(output_file, append=bool(start)) as writer:
+        # Tempo wird vom Rate-Limit der API bestimmt, nicht von einer festen Pause
+        for posts in pages:
+            if parallel:
+                posts = [p for p in posts if p.get("id_string") not in seen_ids]
+                seen_ids.update(p.get("id_string") for p in posts)
+                if not posts:
+                    continue
+            writer.write_many(posts)
+
+            update_cursor(cursor, posts)
+            cursor["offset"] = start + writer.count
+            cursor["complete"] = False
+            save_cursor(output_file, cursor)
+
+            print(f"Geladen: {start + writer.count} Posts (API-Calls: {fetcher.request_count})")
+
+    cursor["complete"] = True
+    save_cursor(output_file, cursor)
+    return start + writer.count
+
+
+def incremental_backup(fetcher, output_file, cursor):
+    """
+    Lädt nur Posts, die neuer als der Cursor sind (neueste zuerst), und
+    stellt sie dem bestehenden Export voran.
+    """
+    new_posts = list(fetcher.iter_posts(stop=lambda p: is_known(p, cursor), **POST_PARAMS))
+    if not new_posts:
+        return 0
+
+    total = merge_new_posts(output_file, new_posts)
+
+    update_cursor(cursor, new_posts)
+    cursor["offset"] = total
+    save_cursor(output_file, cursor)
+
+    print(f"Export enthält jetzt {total} Posts")
+    return len(new_posts)
+
+
+if __name__ == "__main__":
+    # Voll-Backup mit parallelen Offset-Fenstern (python3 tumblr_backup.py --parallel --workers 8)
+    # Zieldatei (python3 tumblr_backup.py --output tumblr_posts.ndjson.zst)
+    # Cursor ignorieren und alles neu laden (python3 tumblr_backup.py --full)
+    # API-Cache umgehen (python3 tumblr_backup.py --refresh)
+    workers = 4
+    output_file = "tumblr_posts.ndjson.gz"
+    for i, arg in enumerate(sys.argv):
+        if arg == "--workers" and i + 1 < len(sys.argv):
+            workers = int(sys.argv[i + 1])
+        if arg == "--output" and i + 1 < len(sys.argv):
+            output_file = sys.argv[i + 1]
+
+    if output_file.endswith(".json"):
+        print("❌ --output muss eine .ndjson(.gz|.zst)-Datei sein")
+        exit(1)
+
+    cache = ResponseCache(refresh="--refresh" in sys.argv)
+    fetcher = TumblrFetcher(client, BLOG_NAME, workers=workers, cache=cache)
+    cursor = {} if "--full" in sys.argv else load_cursor(output_file)
+
+    if cursor.get("complete"):
+        print(f"🔄 Inkrementelles Backup (neuester bekannter Post: {cursor['newest_id']})")
+        count = incremental_backup(fetcher, output_file, cursor)
+        print(f"\n✅ Fertig! {count} neue Posts in {output_file} übernommen "
+              f"(API-Calls: {fetcher.request_count}).")
+    else:
+        count = full_backup(fetcher, output_file, cursor, parallel="--parallel" in sys.argv)
+        print(f"\n✅ Fertig! {count} Posts in {output_file} gespeichert.")
+
+    cache.evict()
+    print(cache.summary())
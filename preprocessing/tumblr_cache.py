@@ -0,0 +1,116 @@
+"""
+On-Disk-Cache für Tumblr-API-Antworten.
+
+Beim Debuggen späterer Schritte (DB, R2) werden dieselben API-Seiten sonst bei
+jedem Lauf neu geladen. Antworten werden inhaltsadressiert unter
+`.cache/tumblr/` im Projektverzeichnis abgelegt (Schlüssel = SHA-256 über
+Endpoint + Parameter), mit TTL und größenbasierter Eviction (älteste zuerst).
+
+Gecacht werden nur Seiten mit `before`-Cursor: ihr Inhalt hängt nicht davon
+ab, was seitdem gepostet wurde. Die Kopfseite (ohne `before`) und
+Offset-Seiten verschieben sich mit jedem neuen Post und werden immer live
+geladen – sonst würde ein zweiter Lauf innerhalb der TTL neue Posts übersehen.
+
+Usage:
+    cache = ResponseCache(refresh="--refresh" in sys.argv)
+    fetcher = TumblrFetcher(client, BLOG_NAME, cache=cache)
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CACHE_DIR = PROJECT_ROOT / ".cache" / "tumblr"
+DEFAULT_TTL = 6 * 3600            # 6 Stunden
+DEFAULT_MAX_BYTES = 500 * 1024**2  # 500 MB
+
+
+class ResponseCache:
+    """
+    Inhaltsadressierter Cache für JSON-Antworten.
+
+    Args:
+        root: Cache-Verzeichnis
+        ttl: maximales Alter eines Eintrags in Sekunden
+        max_bytes: Obergrenze für die Gesamtgröße, danach fliegen die ältesten raus
+        refresh: True = Cache nicht lesen (aber neu befüllen)
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, ttl: int = DEFAULT_TTL,
+                 max_bytes: int = DEFAULT_MAX_BYTES, refresh: bool = False):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(endpoint: str, params: dict) -> str:
+        normalized = json.dumps(
+            [endpoint, {k: str(v) for k, v in (params or {}).items()}],
+            sort_keys=True,
+        )
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json.gz"
+
+    def get(self, endpoint: str, params: dict):
+        """Gecachte Antwort oder None (abgelaufen, fehlt, --refresh)."""
+        if self.refresh:
+            self.misses += 1
+            return None
+
+        path = self._path(self.key(endpoint, params))
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                path.unlink()
+                self.misses += 1
+                return None
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, OSError, ValueError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return data
+
+    def put(self, endpoint: str, params: dict, data):
+        path = self._path(self.key(endpoint, params))
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(f".tmp{os.getpid()}")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def evict(self):
+        """Abgelaufene Einträge löschen, dann älteste bis unter max_bytes."""
+        now = time.time()
+        entries = []
+        for path in self.root.glob("*/*.json.gz"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - st.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+            else:
+                entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def summary(self) -> str:
+        return f"Cache: {self.hits} Treffer, {self.misses} nicht im Cache"
+
@@ -0,0 +1,293 @@
+"""
+Rate-Limit-bewusster Tumblr-Fetcher.
+
+Statt einer festen Pause zwischen den Seiten wird jede API-Anfrage über einen
+Token-Bucket geschickt, dessen Rate aus den Tumblr-Headern
+(X-Ratelimit-Perhour-* / X-Ratelimit-Perday-*) nachgeführt wird. Mehrere
+Seitenfenster werden parallel geladen, bei 429 wird adaptiv zurückgefahren.
+
+Zum Durchlaufen des Blogs gibt es zwei Wege:
+    iter_posts()   Cursor über den `before`-Timestamp, seriell, stabil auch
+                   wenn während des Laufs gepostet wird (Standard)
+    iter_pages()   parallele Offset-Fenster, schneller für Voll-Backups
+
+Usage:
+    fetcher = TumblrFetcher(client, BLOG_NAME, workers=4)
+    for post in fetcher.iter_posts(stop=lambda p: p["timestamp"] <= watermark, npf=True):
+        ...
+"""
+
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Tumblr-Limits für registrierte Apps (werden durch die Header überschrieben)
+DEFAULT_HOURLY_LIMIT = 1000
+PAGE_LIMIT = 20  # max. Posts pro API-Call
+
+
+class TokenBucket:
+    """
+    Thread-sicherer Token-Bucket.
+
+    Rate und Obergrenze des Füllstands kommen aus den Rate-Limit-Headern
+    (verbleibende Calls, verteilt auf die Zeit bis zum Reset). Bei 429 halbiert sich die Rate,
+    jeder erfolgreiche Call erhöht sie wieder leicht (AIMD).
+    """
+
+    def __init__(self, rate: float = DEFAULT_HOURLY_LIMIT / 3600, capacity: int = 4):
+        self.rate = rate
+        self.max_rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Blockiert, bis ein Token verfügbar ist."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def update_from_headers(self, headers):
+        """Rate an die von Tumblr gemeldeten Restkontingente anpassen."""
+        windows = []
+        for window in ("Perhour", "Perday"):
+            remaining = headers.get(f"X-Ratelimit-{window}-Remaining")
+            reset = headers.get(f"X-Ratelimit-{window}-Reset")
+            if remaining is None or reset is None:
+                continue
+            try:
+                windows.append((int(remaining), max(1, int(reset))))
+            except ValueError:
+                continue
+
+        if not windows:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            # Die Header können den Füllstand nur senken: mehr Tokens als das
+            # Restkontingent gibt es nicht, aber das Restkontingent ist kein
+            # Burst (Kapazität bleibt fest, on_throttle bleibt wirksam).
+            self._refill(now)
+            self.tokens = min(self.tokens, float(min(r for r, _ in windows)))
+            for remaining, reset in windows:
+                if remaining <= 0:
+                    # Kontingent aufgebraucht: bis zum Reset pausieren
+                    self.blocked_until = max(self.blocked_until, now + reset)
+            # Engstes Fenster bestimmt die nachhaltige Rate
+            self.max_rate = max(min(r / s for r, s in windows), 1 / 3600)
+            self.rate = min(self.rate, self.max_rate)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_throttle(self, retry_after: float):
+        with self._lock:
+            self.rate = max(self.rate / 2, 1 / 3600)
+            self.tokens = 0
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+
+class TumblrFetcher:
+    """
+    Lädt Blog-Seiten über die OAuth-Credentials eines pytumblr-Clients.
+
+    pytumblr gibt die Response-Header nicht heraus, daher werden die Requests
+    hier selbst über eine Keep-Alive-Session mit derselben OAuth-Signatur
+    abgesetzt.
+    """
+
+    def __init__(self, client, blog_name: str, workers: int = 4,
+                 bucket: TokenBucket = None, max_retries: int = 6, cache=None):
+        self.blog_name = blog_name
+        self.cache = cache  # optional tumblr_cache.ResponseCache (nur before-Seiten)
+        self.workers = workers
+        self.bucket = bucket or TokenBucket(capacity=workers)
+        self.max_retries = max_retries
+        self.request_count = 0
+
+        self._host = client.request.host
+        self._auth = client.request.oauth
+        self._session = requests.Session()
+        self._session.headers.update(client.request.headers)
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(workers, 10))
+        self._session.mount("https://", adapter)
+
+    def get(self, path: str, params: dict) -> dict:
+        """
+        GET gegen die Tumblr-API mit Token-Bucket und Backoff.
+
+        Returns:
+            dict: Inhalt von `response` aus der API-Antwort
+        """
+        # Nur Seiten mit before-Cursor sind stabil; Kopf- und Offset-Seiten
+        # ändern sich mit jedem neuen Post und kommen immer live
+        cache = self.cache if "before" in params else None
+        if cache is not None:
+            cached = cache.get(path, params)
+            if cached is not None:
+                return cached
+
+        url = f"{self._host}{path}"
+
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                resp = self._session.get(url, params=params, auth=self._auth, timeout=60)
+            except requests.exceptions.RequestException as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(60, 2 ** attempt) + random.uniform(0, 1)
+                print(f"  ⚠️  Netzwerkfehler ({e}), neuer Versuch in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            self.request_count += 1
+            self.bucket.update_from_headers(resp.headers)
+
+            if resp.status_code == 429 or resp.status_code >= 500:
+                if attempt == self.max_retries:
+                    resp.raise_for_status()
+                retry_after = resp.headers.get("Retry-After")
+                try:
+                    delay = float(retry_after)
+                except (TypeError, ValueError):
+                    delay = min(300, 2 ** (attempt + 1)) + random.uniform(0, 1)
+                self.bucket.on_throttle(delay)
+                print(f"  ⏸️  HTTP {resp.status_code}, Backoff {delay:.1f}s")
+                continue
+
+            resp.raise_for_status()
+            self.bucket.on_success()
+            data = resp.json().get("response", {})
+            if cache is not None:
+                cache.put(path, params, data)
+            return data
+
+        raise RuntimeError(f"Tumblr-Request fehlgeschlagen: {url}")
+
+    def fetch_page(self, offset: int, limit: int = PAGE_LIMIT, **params) -> dict:
+        """Eine Seite `/posts` ab `offset` laden."""
+        return self.get(
+            f"/v2/blog/{self.blog_name}/posts",
+            {"limit": limit, "offset": offset, **params},
+        )
+
+    def iter_pages_before(self, before: int = None, stop=None, seen=None,
+                          limit: int = PAGE_LIMIT, **params):
+        """
+        Läuft mit dem `before`-Cursor vom neuesten zum ältesten Post.
+
+        Jede Folgeseite wird mit `before = ältester Timestamp + 1` geholt und
+        die Posts mit genau diesem Timestamp per ID herausgefiltert, damit an
+        Seitengrenzen mit gleichem Timestamp nichts verloren geht.
+
+        Args:
+            before: Startpunkt (exklusiv), None = neuester Post
+            stop: Prädikat; beim ersten Post mit stop(post) == True endet der
+                  Lauf (dieser Post wird nicht mehr geliefert)
+            seen: IDs, die übersprungen werden (z.B. beim Fortsetzen)
+
+        Yields:
+            list: Posts einer Seite (ohne Duplikate)
+        """
+        path = f"/v2/blog/{self.blog_name}/posts"
+        seen = set(seen or ())
+
+        while True:
+            page_params = {"limit": limit, **params}
+            if before:
+                page_params["before"] = before
+            page = self.get(path, page_params).get("posts", [])
+            if not page:
+                return
+
+            oldest = min(p.get("timestamp", 0) for p in page)
+            fresh = [p for p in page if p.get("id_string") not in seen]
+
+            if not fresh:
+                # Seite bestand nur aus bekannten Grenz-Posts: strikt weiter
+                before = oldest
+                seen.clear()
+                continue
+
+            for i, post in enumerate(fresh):
+                if stop and stop(post):
+                    if i:
+                        yield fresh[:i]
+                    return
+
+            yield fresh
+
+            seen = {p.get("id_string") for p in page if p.get("timestamp", 0) == oldest}
+            before = oldest + 1
+
+    def iter_posts(self, before: int = None, stop=None, seen=None,
+                   limit: int = PAGE_LIMIT, **params):
+        """Wie iter_pages_before, liefert aber einzelne Posts (lazy)."""
+        for page in self.iter_pages_before(before, stop, seen, limit, **params):
+            yield from page
+
+    def iter_pages(self, limit: int = PAGE_LIMIT, start: int = 0, **params):
+        """
+        Lädt alle Seiten des Blogs mit `workers` parallelen Fenstern.
+
+        Die erste Seite liefert `total_posts`, danach laufen immer höchstens
+        `workers` Seiten gleichzeitig. Die Seiten werden in Offset-Reihenfolge
+        ausgegeben. Mit `start` kann ein abgebrochener Lauf fortgesetzt werden.
+
+        Yields:
+            (offset, posts)
+        """
+        first = self.fetch_page(start, limit, **params)
+        posts = first.get("posts", [])
+        if not posts:
+            return
+        yield start, posts
+
+        # total_posts ist nur eine Schätzung (während des Laufs kann gepostet
+        # werden), daher wird weitergeladen, bis eine Seite hinter dem Ende
+        # leer zurückkommt.
+        total = first.get("total_posts") or first.get("blog", {}).get("total_posts", 0)
+        offsets = itertools.count(start + limit, limit)
+        exhausted = False
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = []
+            for _ in range(self.workers):
+                offset = next(offsets)
+                pending.append((offset, executor.submit(self.fetch_page, offset, limit, **params)))
+
+            while pending:
+                offset, future = pending.pop(0)
+                page_posts = future.result().get("posts", [])
+
+                if not page_posts and offset >= total:
+                    exhausted = True
+                if not exhausted:
+                    nxt = next(offsets)
+                    pending.append((nxt, executor.submit(self.fetch_page, nxt, limit, **params)))
+
+                if page_posts:
+                    yield offset, page_posts
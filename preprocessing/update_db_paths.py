@@ -9,6 +9,9 @@ import sys
 from pathlib import Path
 from dotenv import load_dotenv
 from supabase import create_client
+from media_manifest import MediaManifest
+from media_index import MediaIndex
+from storage_path_writer import StoragePathWriter
 
 # Load environment variables
 load_dotenv()
@@ -29,6 +32,8 @@ def main():
 
     print("Connecting to Supabase...")
     supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    manifest = MediaManifest()
+    writer = StoragePathWriter(supabase)
 
     print("Lade alle Media-Einträge...")
     all_media = []
@@ -57,6 +62,10 @@ def main():
     skipped = 0
     errors = 0
 
+    # Einmal den Media-Ordner einlesen statt os.listdir pro Eintrag
+    index = MediaIndex(LOCAL_MEDIA_PATH)
+    print(f"{len(index)} lokale Dateien indiziert.")
+
     print("\nStarte Datenbank-Update...")
     for i, item in enumerate(all_media, 1):
         media_id = item["media_id"]
@@ -74,19 +83,15 @@ def main():
         folder = os.path.dirname(full_local_path)
         expected_filename = os.path.basename(full_local_path)
 
-        if not os.path.exists(folder):
+        # Laut Manifest vorhanden → Ordner nicht durchsuchen
+        known_local = manifest.is_downloaded(relative_path)
+
+        if not known_local and not index.has_folder(os.path.basename(folder)):
             skipped += 1
             continue
 
-        # Datei suchen (exakt oder mit _img_ Fuzzy Matching)
-        actual_file = None
-        if os.path.exists(full_local_path):
-            actual_file = full_local_path
-        else:
-            for filename in os.listdir(folder):
-                if expected_filename.replace("_img_", "_") == filename.replace("_img_", "_"):
-                    actual_file = os.path.join(folder, filename)
-                    break
+        # Datei suchen (exakt oder mit _img_ Fuzzy Matching) – Dict-Lookup im Index
+        actual_file = full_local_path if known_local else index.find(relative_path)
 
         if not actual_file:
             # Wenn lokal gar nicht vorhanden, nehmen wir den Standard-Pfad ohne Upload
@@ -99,23 +104,28 @@ def main():
         r2_url = f"{R2_PUBLIC_URL}/{r2_key}"
 
         try:
-            # DB aktualisieren
-            supabase.table("media") \
-                .update({"storage_path": r2_url}) \
-                .eq("media_id", media_id) \
-                .execute()
+            # DB-Update vormerken (gebündelt per RPC geschrieben)
+            writer.add(media_id, r2_url)
+            manifest.record_media_id(r2_key, media_id)
             
-            print(f" [{i}/{total}] ✅ Updated ID {media_id}: {r2_url}")
+            print(f" [{i}/{total}] ✅ Queued ID {media_id}: {r2_url}")
             updated += 1
         except Exception as e:
             print(f" [{i}/{total}] ❌ Fehler bei ID {media_id}: {e}")
             errors += 1
 
+    try:
+        writer.close()
+    except Exception as e:
+        print(f"❌ Fehler beim Schreiben der letzten Updates: {e}")
+        errors += 1
+
     print("\n" + "="*40)
     print("Fertig!")
     print(f"  Aktualisiert: {updated}")
     print(f"  Übersprungen: {skipped}")
     print(f"  Fehler:       {errors}")
+    print(f"  {writer.summary()}")
     print("="*40)
 
 if __name__ == "__main__":
@@ -1,19 +1,25 @@
 #!/usr/bin/env python3
 """
 Prüft alle Media-Einträge in Supabase.
-Falls ein Bild auf R2 (Public URL) einen 404-Fehler wirft, 
-wird es aus dem lokalen `media/`-Ordner nach R2 hochgeladen.
+Fehlt ein Bild in R2, wird es aus dem lokalen `media/`-Ordner nach R2
+hochgeladen.
+
+Statt eines HEAD-Requests pro Eintrag wird einmal das Bucket-Inventar
+(storage.list(), bei R2 list_objects_v2 mit 1000 Keys pro Call) geladen
+und im Speicher mit `media.storage_path` verglichen – exakt und in Sekunden. Nur für
+storage_paths außerhalb von R2_PUBLIC_URL wird noch per HEAD geprüft.
 """
 
 import os
 import sys
-import boto3
 import urllib.request
 import urllib.error
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from pathlib import Path
 from dotenv import load_dotenv
 from supabase import create_client
+from media_manifest import MediaManifest
+from media_index import MediaIndex
+from r2_upload import get_storage, upload_file
 
 # Load environment variables
 load_dotenv()
@@ -22,7 +28,6 @@ load_dotenv()
 R2_ACCOUNT_ID = os.getenv("R2_ACCOUNT_ID")
 R2_ACCESS_KEY = os.getenv("R2_ACCESS_KEY")
 R2_SECRET_KEY = os.getenv("R2_SECRET_KEY")
-R2_BUCKET_NAME = "simplestravelmedia"
 R2_PUBLIC_URL = os.getenv("R2_PUBLIC_URL")
 
 # Supabase Config
@@ -31,14 +36,7 @@ SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
 LOCAL_MEDIA_PATH = "/home/simple_simon/Codes/traveling_planet_earth/media"
 
-# S3 R2 Client
-s3 = boto3.client(
-    "s3",
-    endpoint_url=f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com",
-    aws_access_key_id=R2_ACCESS_KEY,
-    aws_secret_access_key=R2_SECRET_KEY,
-    region_name="auto",
-)
+manifest = MediaManifest()
 
 def check_url_exists(url: str) -> bool:
     """Prüft per HEAD-Request, ob eine URL existiert (Status 200)."""
@@ -57,48 +55,33 @@ def check_url_exists(url: str) -> bool:
         # Bei Verbindungsfehlern nehmen wir an, es existiert nicht
         return False
 
-def get_content_type(ext: str) -> str:
-    content_type_map = {
-        ".jpg": "image/jpeg", ".jpeg": "image/jpeg",
-        ".png": "image/png", ".gif": "image/gif",
-        ".webp": "image/webp", ".svg": "image/svg+xml",
-        ".mp4": "video/mp4", ".webm": "video/webm",
-        ".mov": "video/quicktime", ".mp3": "audio/mpeg",
-        ".wav": "audio/wav",
-    }
-    return content_type_map.get(ext, "application/octet-stream")
-
-def process_item(item: dict) -> dict:
+def r2_key_from_url(storage_path: str):
+    """Public URL → R2-Key, None wenn die URL nicht auf den Bucket zeigt."""
+    prefix = f"{R2_PUBLIC_URL.rstrip('/')}/"
+    if storage_path.startswith(prefix):
+        return storage_path[len(prefix):].split("?")[0]
+    return None
+
+def process_item(item: dict, index: MediaIndex, storage) -> dict:
+    """Lädt einen laut Inventar fehlenden Eintrag hoch."""
     media_id = item["media_id"]
     local_path = item["local_path"]
-    storage_path = item.get("storage_path")
+    storage_path = item["storage_path"]
 
-    if not storage_path:
-        return {"media_id": media_id, "status": "no_storage_path"}
+    relative_path = local_path.removeprefix("media/").lstrip("/")
 
-    # Prüfen, ob die Datei in R2 existiert (200 OK)
-    exists_in_r2 = check_url_exists(storage_path)
-    if exists_in_r2:
+    # Nicht-R2-URLs lassen sich nicht per Inventar prüfen
+    if r2_key_from_url(storage_path) is None and check_url_exists(storage_path):
         return {"media_id": media_id, "status": "exists"}
 
     # Datei existiert nicht in R2 (404) -> Upload vorbereiten
-    relative_path = local_path.removeprefix("media/").lstrip("/")
-    full_local_path = os.path.join(LOCAL_MEDIA_PATH, relative_path)
-    folder = os.path.dirname(full_local_path)
-    expected_filename = os.path.basename(full_local_path)
+    folder = os.path.dirname(os.path.join(LOCAL_MEDIA_PATH, relative_path))
 
-    if not os.path.exists(folder):
+    if not index.has_folder(os.path.basename(folder)):
         return {"media_id": media_id, "status": "local_folder_missing", "path": folder}
 
-    # Datei suchen (exakt oder Fuzzy)
-    actual_file = None
-    if os.path.exists(full_local_path):
-        actual_file = full_local_path
-    else:
-        for filename in os.listdir(folder):
-            if expected_filename.replace("_img_", "_") == filename.replace("_img_", "_"):
-                actual_file = os.path.join(folder, filename)
-                break
+    # Datei suchen (exakt oder Fuzzy) – Dict-Lookup im Index
+    actual_file = index.find(relative_path)
 
     if not actual_file:
         return {"media_id": media_id, "status": "local_file_missing", "path": relative_path}
@@ -106,22 +89,17 @@ def process_item(item: dict) -> dict:
     # Upload durchführen
     actual_filename = os.path.basename(actual_file)
     r2_key = os.path.join(os.path.dirname(relative_path), actual_filename)
-    ext = Path(actual_file).suffix.lower()
-    content_type = get_content_type(ext)
 
     try:
-        s3.upload_file(
-            actual_file,
-            R2_BUCKET_NAME,
-            r2_key,
-            ExtraArgs={"ContentType": content_type},
-        )
+        upload_file(storage, actual_file, r2_key, manifest=manifest)
+        manifest.record_media_id(r2_key, media_id)
         return {"media_id": media_id, "status": "uploaded", "url": storage_path, "file": actual_filename}
     except Exception as e:
         return {"media_id": media_id, "status": "upload_failed", "error": str(e)}
 
 def main():
-    if not R2_ACCOUNT_ID or not R2_ACCESS_KEY or not R2_SECRET_KEY or not R2_PUBLIC_URL:
+    r2_credentials = R2_ACCOUNT_ID and R2_ACCESS_KEY and R2_SECRET_KEY
+    if not R2_PUBLIC_URL or (os.getenv("STORAGE_BACKEND", "r2") == "r2" and not r2_credentials):
         print("❌ Fehler: Cloudflare R2 Credentials fehlen in .env")
         return
     if not SUPABASE_URL or not SUPABASE_KEY:
@@ -154,16 +132,41 @@ def main():
     total = len(all_media)
     print(f"Gefunden: {total} Media-Einträge in der DB.")
 
-    print("\nPrüfe R2 Status und lade fehlende Dateien hoch (in parallel)...")
-    
+    # Einmal den Media-Ordner einlesen statt os.listdir pro Eintrag
+    index = MediaIndex(LOCAL_MEDIA_PATH)
+    print(f"{len(index)} lokale Dateien indiziert.")
+
+    storage = get_storage()
+    print("Lade R2-Inventar...")
+    inventory = storage.list()
+    print(f"{len(inventory)} Objekte in {storage}.")
+
     uploaded_count = 0
     skipped_count = 0
     missing_local_count = 0
     failed_count = 0
+    no_storage_count = 0
+
+    # Diff im Speicher: nur was nicht im Bucket liegt, wird weiter bearbeitet
+    missing = []
+    for item in all_media:
+        storage_path = item.get("storage_path")
+        if not storage_path:
+            no_storage_count += 1
+            continue
+        r2_key = r2_key_from_url(storage_path)
+        if r2_key is not None and r2_key in inventory:
+            skipped_count += 1
+        else:
+            missing.append(item)
+
+    print(f"{len(missing)} Einträge fehlen in R2.")
+    print("\nLade fehlende Dateien hoch (in parallel)...")
+    total = len(missing)
 
     # Parallel verarbeiten mit ThreadPoolExecutor
     with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = {executor.submit(process_item, item): item for item in all_media}
+        futures = {executor.submit(process_item, item, index, storage): item for item in missing}
         
         for i, future in enumerate(as_completed(futures), 1):
             res = future.result()
@@ -187,6 +190,7 @@ def main():
     print("="*40)
     print(f"  Hochgeladen:      {uploaded_count}")
     print(f"  Bereits in R2:     {skipped_count}")
+    print(f"  Ohne storage_path: {no_storage_count}")
     print(f"  Lokal nicht da:    {missing_local_count}")
     print(f"  Fehlgeschlagen:    {failed_count}")
     print("="*40)
@@ -11,14 +11,26 @@ Usage:
     python3 5_upload_to_r2.py --dry-run          # Test run (no upload)
     python3 5_upload_to_r2.py --limit 10         # Upload only 10 files
     python3 5_upload_to_r2.py --dry-run --limit 5  # Test with 5 files
+    python3 5_upload_to_r2.py --workers 32       # Parallele Uploads (Standard: 16)
+    python3 5_upload_to_r2.py --no-variants      # Keine responsiven Bild-Derivate erzeugen
+    python3 5_upload_to_r2.py --no-renditions    # Keine Video-Poster/-Renditions erzeugen
+    python3 5_upload_to_r2.py --plan             # Nur schätzen: Bytes, Requests, Laufzeit (run_plan.py)
 """
 
 import os
 import sys
-import boto3
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 from supabase import create_client
+from media_manifest import MediaManifest
+from media_index import MediaIndex
+from storage_path_writer import StoragePathWriter, DEFAULT_BATCH_SIZE
+from image_variants import create_variants
+from video_renditions import create_renditions
+from r2_upload import UploadEngine, get_storage, pool_size_for, upload_file, DEFAULT_WORKERS, TRANSFER_CONFIG
+from storage_backend import put_operations
+from run_plan import RunPlan
 
 load_dotenv()
 
@@ -27,10 +39,10 @@ load_dotenv()
 # ============================================================================
 
 # Cloudflare R2 Credentials (Account → R2 → Manage R2 API Tokens)
+# Bucket: R2_BUCKET_NAME, Backend: STORAGE_BACKEND (siehe storage_backend.py)
 R2_ACCOUNT_ID = os.getenv("R2_ACCOUNT_ID")  # Deine Account ID
 R2_ACCESS_KEY = os.getenv("R2_ACCESS_KEY")  # API Token Access Key
 R2_SECRET_KEY = os.getenv("R2_SECRET_KEY")  # API Token Secret Key
-R2_BUCKET_NAME = "simplestravelmedia"
 
 # Public R2 URL (nach Custom Domain Setup oder R2.dev URL)
 R2_PUBLIC_URL = os.getenv("R2_PUBLIC_URL")
@@ -42,27 +54,22 @@ LOCAL_MEDIA_PATH="/home/simple_simon/Codes/traveling_planet_earth/media"
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")  # Service Role für DB-Updates
 
-# ============================================================================
-# S3-COMPATIBLE R2 CLIENT
-# ============================================================================
-
-s3 = boto3.client(
-    "s3",
-    endpoint_url=f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com",
-    aws_access_key_id=R2_ACCESS_KEY,
-    aws_secret_access_key=R2_SECRET_KEY,
-    region_name="auto",  # R2 braucht keine Region
-)
+# Speicher-Backend (R2 oder lokal, siehe storage_backend.py); wird in main
+# mit passend großem Verbindungspool erzeugt, nicht schon beim Import
+storage = None
 
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# Lokales Manifest: was liegt schon in R2, welche Datei gehört zu welcher media_id
+manifest = MediaManifest()
+
 # ============================================================================
 # UPLOAD FUNKTION
 # ============================================================================
 
 def upload_file_to_r2(local_path: str, r2_key: str) -> str:
     """
-    Lädt eine Datei zu R2 hoch.
+    Lädt eine Datei zu R2 hoch (Multipart ab 16 MB).
     
     Args:
         local_path: Lokaler Dateipfad
@@ -71,50 +78,7 @@ def upload_file_to_r2(local_path: str, r2_key: str) -> str:
     Returns:
         Public URL der hochgeladenen Datei
     """
-    # Content-Type für alle gängigen Media-Formate
-    ext = Path(local_path).suffix.lower()
-    content_type_map = {
-        # Images
-        ".jpg": "image/jpeg", 
-        ".jpeg": "image/jpeg",
-        ".png": "image/png", 
-        ".gif": "image/gif",
-        ".webp": "image/webp",
-        ".svg": "image/svg+xml",
-        ".bmp": "image/bmp",
-        ".tiff": "image/tiff",
-        ".tif": "image/tiff",
-        
-        # Videos
-        ".mp4": "video/mp4",
-        ".webm": "video/webm",
-        ".mov": "video/quicktime",
-        ".avi": "video/x-msvideo",
-        ".mkv": "video/x-matroska",
-        ".flv": "video/x-flv",
-        ".wmv": "video/x-ms-wmv",
-        ".m4v": "video/mp4",
-        
-        # Audio
-        ".mp3": "audio/mpeg",
-        ".wav": "audio/wav",
-        ".ogg": "audio/ogg",
-        ".m4a": "audio/mp4",
-        ".aac": "audio/aac",
-        ".flac": "audio/flac",
-        ".wma": "audio/x-ms-wma",
-    }
-    content_type = content_type_map.get(ext, "application/octet-stream")
-
-    # Upload
-    s3.upload_file(
-        local_path,
-        R2_BUCKET_NAME,
-        r2_key,
-        ExtraArgs={"ContentType": content_type},
-    )
-
-    # Public URL
+    upload_file(storage or get_storage(), local_path, r2_key, manifest=manifest)
     return f"{R2_PUBLIC_URL}/{r2_key}"
 
 
@@ -122,17 +86,31 @@ def upload_file_to_r2(local_path: str, r2_key: str) -> str:
 # MIGRATION
 # ============================================================================
 
-def migrate_media(limit: int = None, dry_run: bool = False):
+def media_type_for(path) -> str:
+    ext = Path(path).suffix.lower()
+    return "image" if ext in [".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".bmp", ".tiff"] else \
+           "video" if ext in [".mp4", ".webm", ".mov", ".avi", ".mkv", ".flv", ".wmv", ".m4v"] else \
+           "audio" if ext in [".mp3", ".wav", ".ogg", ".m4a", ".aac", ".flac", ".wma"] else \
+           "other"
+
+
+def migrate_media(limit: int = None, dry_run: bool = False, workers: int = DEFAULT_WORKERS,
+                  variants: bool = True, renditions: bool = True, plan: RunPlan = None):
     """
     1. Lädt alle Medien aus Supabase `media` Tabelle
     2. Für jede Datei mit `local_path`:
-       - Upload zu R2
+       - Upload zu R2 (parallel, `workers` gleichzeitig)
        - Update `storage_path` in DB
     
     Args:
         limit: Limit number of files (for testing)
         dry_run: If True, only check files without uploading
+        workers: Anzahl paralleler Uploads
+        variants: Für hochgeladene Bilder responsive Derivate erzeugen (image_variants.py)
+        renditions: Für hochgeladene Videos Poster + Web-Rendition erzeugen (video_renditions.py)
+        plan: RunPlan – wie dry_run, zählt aber Bytes/Requests und schätzt die Laufzeit
     """
+    dry_run = dry_run or plan is not None
     print("\n" + "="*60)
     print("🚀 R2 MEDIA MIGRATION")
     if dry_run:
@@ -148,11 +126,14 @@ def migrate_media(limit: int = None, dry_run: bool = False):
     offset = 0
     
     while True:
+        start = time.monotonic()
         result = supabase.table("media") \
             .select("media_id, local_path, storage_path") \
             .not_.is_("local_path", "null") \
             .range(offset, offset + page_size - 1) \
             .execute()
+        if plan:
+            plan.measure("postgrest", 1, time.monotonic() - start)
         
         if not result.data:
             break
@@ -172,13 +153,52 @@ def migrate_media(limit: int = None, dry_run: bool = False):
     media_items = all_media
     total = len(media_items)
     
-    print(f"\n📊 {total} Medien gefunden mit local_path\n")
+    print(f"\n📊 {total} Medien gefunden mit local_path")
+
+    # Einmal den Media-Ordner einlesen statt os.listdir pro Eintrag
+    index = MediaIndex(LOCAL_MEDIA_PATH)
+    print(f"📂 {len(index)} lokale Dateien in {len(index.folders)} Ordnern indiziert\n")
 
     uploaded = 0
     skipped = 0
     errors = 0
     by_type = {}  # Track uploads per media type
+    done = 0
+
+    engine = UploadEngine(storage, workers=workers, manifest=manifest)
+    writer = StoragePathWriter(supabase)
+    variant_jobs = []  # (media_id, lokale Datei, r2_key) der hochgeladenen Bilder
+    rendition_jobs = []  # ... der hochgeladenen Videos
+
+    def handle(result):
+        """Fertigen Upload verbuchen: DB-Update, Manifest, Zähler."""
+        nonlocal uploaded, errors, done
+        media_id, relative_path, media_type = result["tag"]
+        done += 1
+        if result["error"]:
+            print(f"  ❌ [{done}/{queued}] ERROR: {relative_path} — {result['error']}")
+            errors += 1
+            return
+        try:
+            r2_url = f"{R2_PUBLIC_URL}/{result['r2_key']}"
+            manifest.record_media_id(result["r2_key"], media_id)
+
+            # DB-Update vormerken (gebündelt per RPC geschrieben)
+            writer.add(media_id, r2_url)
+
+            print(f"  ✅ [{done}/{queued}] {relative_path} → {os.path.basename(result['r2_key'])} "
+                  f"({result['size']:,} bytes)")
+            uploaded += 1
+            by_type[media_type] = by_type.get(media_type, 0) + 1
+            if media_type == "image":
+                variant_jobs.append((media_id, result["local_path"], result["r2_key"]))
+            elif media_type == "video":
+                rendition_jobs.append((media_id, result["local_path"], result["r2_key"]))
+        except Exception as e:
+            print(f"  ❌ [{done}/{queued}] DB ERROR: {relative_path} — {e}")
+            errors += 1
 
+    queued = 0
     for i, item in enumerate(media_items, 1):
         media_id = item["media_id"]
         local_path = item["local_path"]
@@ -191,29 +211,26 @@ def migrate_media(limit: int = None, dry_run: bool = False):
         # Lokaler Pfad absolut machen
         full_local_path = os.path.join(LOCAL_MEDIA_PATH, relative_path)
         folder = os.path.dirname(full_local_path)
-        expected_filename = os.path.basename(full_local_path)
 
-        # Prüfen ob Ordner existiert
-        if not os.path.exists(folder):
-            print(f"  ⚠️  [{i}/{total}] SKIP: Ordner nicht gefunden: {os.path.basename(folder)}")
+        # Manifest kennt die Datei bereits → kein Dateisystem-Crawl nötig
+        known = manifest.get(relative_path)
+        if known and known["uploaded_at"] and current_storage and current_storage.startswith(R2_PUBLIC_URL):
+            if known["media_id"] is None and not dry_run:
+                manifest.record_media_id(relative_path, media_id)
+            print(f"  ⏭️  [{i}/{total}] SKIP: Bereits in R2: {relative_path}")
             skipped += 1
             continue
 
-        # Datei suchen (exakt oder mit _img_ Pattern)
+        # Datei suchen: laut Manifest vorhanden, sonst im Index (exakt oder ohne _img_)
         actual_file = None
-        if os.path.exists(full_local_path):
+        if known and known["downloaded_at"]:
             actual_file = full_local_path
+        elif not index.has_folder(os.path.basename(folder)):
+            print(f"  ⚠️  [{i}/{total}] SKIP: Ordner nicht gefunden: {os.path.basename(folder)}")
+            skipped += 1
+            continue
         else:
-            # Fuzzy match: block_N_hash.jpg → suche block_N_img_hash.jpg
-            # Oder umgekehrt: block_N_img_hash.jpg → suche block_N_hash.jpg
-            for filename in os.listdir(folder):
-                # Entferne "_img_" aus beiden Namen für Vergleich
-                normalized_expected = expected_filename.replace("_img_", "_")
-                normalized_actual = filename.replace("_img_", "_")
-                
-                if normalized_expected == normalized_actual:
-                    actual_file = os.path.join(folder, filename)
-                    break
+            actual_file = index.find(relative_path)
         
         if not actual_file:
             print(f"  ⚠️  [{i}/{total}] SKIP: Datei nicht gefunden: {relative_path}")
@@ -231,37 +248,54 @@ def migrate_media(limit: int = None, dry_run: bool = False):
         actual_filename = os.path.basename(actual_file)
         r2_key = os.path.join(os.path.dirname(relative_path), actual_filename)
 
-        try:
-            # Bestimme Media-Type
-            ext = Path(actual_file).suffix.lower()
-            media_type = "image" if ext in [".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".bmp", ".tiff"] else \
-                         "video" if ext in [".mp4", ".webm", ".mov", ".avi", ".mkv", ".flv", ".wmv", ".m4v"] else \
-                         "audio" if ext in [".mp3", ".wav", ".ogg", ".m4a", ".aac", ".flac", ".wma"] else \
-                         "other"
-            
-            if dry_run:
-                # Dry run: nur checken, nicht hochladen
-                file_size = os.path.getsize(actual_file)
-                print(f"  ✓  [{i}/{total}] OK: {relative_path} → {actual_filename} ({file_size:,} bytes, {media_type})")
-                uploaded += 1
-                by_type[media_type] = by_type.get(media_type, 0) + 1
-            else:
-                # Upload (verwende echten Dateinamen)
-                r2_url = upload_file_to_r2(actual_file, r2_key)
-
-                # Update DB
-                supabase.table("media") \
-                    .update({"storage_path": r2_url}) \
-                    .eq("media_id", media_id) \
-                    .execute()
-
-                print(f"  ✅ [{i}/{total}] {relative_path} → {actual_filename}")
-                uploaded += 1
-                by_type[media_type] = by_type.get(media_type, 0) + 1
+        media_type = media_type_for(actual_file)
+
+        if dry_run:
+            # Dry run: nur checken, nicht hochladen
+            file_size = os.path.getsize(actual_file)
+            print(f"  ✓  [{i}/{total}] OK: {relative_path} → {actual_filename} ({file_size:,} bytes, {media_type})")
+            uploaded += 1
+            by_type[media_type] = by_type.get(media_type, 0) + 1
+            if plan:
+                plan.add("upload", file_size)
+                plan.add("storage", put_operations(file_size), timed=False)
+            continue
 
-        except Exception as e:
-            print(f"  ❌ [{i}/{total}] ERROR: {relative_path} — {e}")
-            errors += 1
+        # Upload einreihen (verwende echten Dateinamen); fertige Uploads zwischendurch verbuchen
+        engine.submit(actual_file, r2_key, tag=(media_id, relative_path, media_type))
+        queued += 1
+        for result in engine.results(wait=False):
+            handle(result)
+
+    for result in engine.results():
+        handle(result)
+    engine.close()
+    try:
+        writer.close()
+    except Exception as e:
+        print(f"  ❌ DB ERROR beim letzten Batch: {e}")
+        errors += 1
+
+    if plan:
+        # storage_path-Updates gebündelt per RPC, dann die Derivate
+        plan.add("postgrest", -(-uploaded // DEFAULT_BATCH_SIZE))
+        plan.add_derivatives(by_type.get("image", 0) if variants else 0,
+                             by_type.get("video", 0) if renditions else 0)
+        plan.note(f"{uploaded} Dateien hochzuladen, {skipped} übersprungen")
+        print(plan.report())
+        return
+
+    # Responsive Derivate (WebP/AVIF in festen Breiten) für die neuen Bilder
+    variants_summary = None
+    if variants and variant_jobs:
+        print(f"\n🖼️  Erzeuge Derivate für {len(variant_jobs)} Bilder...")
+        variants_summary = create_variants(storage, supabase, variant_jobs)
+
+    # Poster-Frames + Web-Renditions für die neuen Videos
+    renditions_summary = None
+    if renditions and rendition_jobs:
+        print(f"\n🎬 Erzeuge Poster/Renditions für {len(rendition_jobs)} Videos...")
+        renditions_summary = create_renditions(storage, supabase, R2_PUBLIC_URL, rendition_jobs)
 
     # Summary
     print("\n" + "="*60)
@@ -270,6 +304,12 @@ def migrate_media(limit: int = None, dry_run: bool = False):
     print(f"  ✅ Hochgeladen:  {uploaded}")
     print(f"  ⏭️  Übersprungen: {skipped}")
     print(f"  ❌ Fehler:       {errors}")
+    if not dry_run:
+        print(f"  🗄️  {writer.summary()}")
+    if variants_summary:
+        print(f"  🖼️  {variants_summary}")
+    if renditions_summary:
+        print(f"  🎬 {renditions_summary}")
     
     if by_type:
         print(f"\n  📊 Nach Media-Type:")
@@ -285,7 +325,9 @@ def migrate_media(limit: int = None, dry_run: bool = False):
 if __name__ == "__main__":
     # Parse CLI args
     dry_run = "--dry-run" in sys.argv
+    plan_only = "--plan" in sys.argv
     limit = None
+    workers = DEFAULT_WORKERS
     
     for i, arg in enumerate(sys.argv):
         if arg == "--limit" and i + 1 < len(sys.argv):
@@ -294,9 +336,11 @@ if __name__ == "__main__":
             except ValueError:
                 print("❌ --limit muss eine Zahl sein")
                 exit(1)
+        if arg == "--workers" and i + 1 < len(sys.argv):
+            workers = int(sys.argv[i + 1])
     
-    # Validierung
-    if not R2_ACCOUNT_ID or not R2_ACCESS_KEY or not R2_SECRET_KEY:
+    # Validierung (STORAGE_BACKEND=local und --plan brauchen keine Credentials)
+    if not plan_only and os.getenv("STORAGE_BACKEND", "r2") == "r2" and not (R2_ACCOUNT_ID and R2_ACCESS_KEY and R2_SECRET_KEY):
         print("❌ Fehler: R2 Credentials fehlen in .env")
         print("   Benötigt: R2_ACCOUNT_ID, R2_ACCESS_KEY, R2_SECRET_KEY")
         exit(1)
@@ -305,16 +349,26 @@ if __name__ == "__main__":
         print(f"❌ Fehler: LOCAL_MEDIA_PATH existiert nicht: {LOCAL_MEDIA_PATH}")
         exit(1)
 
+    # Verbindungspool groß genug für alle Worker × Multipart-Teile
+    storage = get_storage(max_pool_connections=pool_size_for(workers))
+
     print(f"📂 Lokaler Media-Ordner: {LOCAL_MEDIA_PATH}")
-    print(f"🪣 R2 Bucket: {R2_BUCKET_NAME}")
+    print(f"🪣 Ziel: {storage}")
     print(f"🌐 Public URL: {R2_PUBLIC_URL}")
+    print(f"⚡ Parallele Uploads: {workers} (Multipart ab {TRANSFER_CONFIG.multipart_threshold // 1024**2} MB)")
     if limit:
         print(f"📊 Limit: {limit} Dateien")
     if dry_run:
         print(f"🧪 Dry Run: Kein Upload, nur Validierung")
+    if plan_only:
+        print(f"📋 Plan: Kein Upload, nur Schätzung")
     print()
     
-    if not dry_run:
+    if not (dry_run or plan_only):
         input("Fortfahren? [ENTER] oder CTRL+C zum Abbrechen")
 
-    migrate_media(limit=limit, dry_run=dry_run)
+    migrate_media(limit=limit, dry_run=dry_run, workers=workers,
+                  variants="--no-variants" not in sys.argv,
+                  renditions="--no-renditions" not in sys.argv,
+                  plan=RunPlan("upload_to_r2", workers={"upload": workers, "storage": workers})
+                  if plan_only else None)
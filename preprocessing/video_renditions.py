@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Poster-Frames und Web-Renditions für Videos in R2.
+
+Ohne Poster lädt der Browser Video-Bytes, nur um eine Vorschau zu zeigen.
+Pro Video (media_type = 'video') wird hier per ffmpeg erzeugt:
+
+    variants/POST_ID/block_1_vid_abc/poster.jpg   # Poster-Frame (max. 1280 px breit)
+    variants/POST_ID/block_1_vid_abc/720p.mp4     # H.264, max. 720p, Bitrate gedeckelt, +faststart
+
+Dazu `duration_seconds`, Breite und Höhe per ffprobe. Alles wird hochgeladen
+und in `media` eingetragen (sql/add_video_renditions.sql). Ist die Rendition
+nicht kleiner als das Original, bleibt `rendition_path` leer und das
+Frontend spielt das Original.
+
+ffmpeg läuft als eigener Prozess; mehrere Videos werden parallel
+verarbeitet (Worker-Threads warten nur auf ffmpeg).
+
+Voraussetzung: ffmpeg + ffprobe im PATH (oder FFMPEG / FFPROBE in .env)
+
+Usage:
+    python3 video_renditions.py              # alle Videos ohne Poster
+    python3 video_renditions.py --limit 5    # nur 5 Videos
+    python3 video_renditions.py --force      # auch vorhandene neu erzeugen
+    python3 video_renditions.py --workers 4  # parallele ffmpeg-Prozesse
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from dotenv import load_dotenv
+from supabase import create_client
+
+from image_variants import variant_base
+from media_download import download_to_file
+from media_index import MediaIndex, LOCAL_MEDIA_PATH
+from r2_upload import get_storage, upload_file
+from storage_path_writer import StoragePathWriter
+
+load_dotenv()
+
+FFMPEG = os.getenv("FFMPEG", "ffmpeg")
+FFPROBE = os.getenv("FFPROBE", "ffprobe")
+
+RENDITION_HEIGHT = 720
+VIDEO_MAXRATE = "2M"      # Bitrate-Deckel
+VIDEO_BUFSIZE = "4M"
+VIDEO_CRF = "26"
+AUDIO_BITRATE = "128k"
+POSTER_WIDTH = 1280
+FFMPEG_THREADS = 2        # pro Video; parallelisiert wird über Videos
+
+RPC_NAME = "bulk_update_video_renditions"
+VIDEO_EXTENSIONS = {".mp4", ".webm", ".mov", ".avi", ".mkv", ".flv", ".wmv", ".m4v"}
+
+
+def poster_key(r2_key: str) -> str:
+    return f"{variant_base(r2_key)}/poster.jpg"
+
+
+def rendition_key(r2_key: str) -> str:
+    return f"{variant_base(r2_key)}/{RENDITION_HEIGHT}p.mp4"
+
+
+def default_workers() -> int:
+    return max(1, (os.cpu_count() or 2) // FFMPEG_THREADS)
+
+
+def probe(path) -> dict:
+    """Dauer (s), Breite, Höhe des ersten Video-Streams per ffprobe."""
+    out = subprocess.run(
+        [FFPROBE, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", str(path)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    info = json.loads(out)
+    video = next((s for s in info.get("streams", []) if s.get("codec_type") == "video"), {})
+    duration = float(info.get("format", {}).get("duration") or video.get("duration") or 0)
+    width, height = video.get("width"), video.get("height")
+    # Hochkant aufgenommene Handy-Videos: Rotation in den Metadaten
+    rotation = abs(int(video.get("tags", {}).get("rotate", 0) or 0))
+    for side_data in video.get("side_data_list", []):
+        rotation = abs(int(side_data.get("rotation", rotation) or 0))
+    if rotation in (90, 270) and width and height:
+        width, height = height, width
+    return {"duration": duration, "width": width, "height": height}
+
+
+def render_video(source: str, out_dir: str) -> dict:
+    """
+    Poster + Rendition für ein Video erzeugen (blockiert bis ffmpeg fertig ist).
+
+    `source` darf ein lokaler Pfad oder eine URL sein (wird dann erst geladen).
+
+    Returns:
+        dict: {"duration", "width", "height", "poster", "rendition" (Pfad oder None), "source_size"}
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if source.startswith("http"):
+        local = out_dir / f"source{Path(source.split('?')[0]).suffix or '.mp4'}"
+        download_to_file(source, local)
+        source = str(local)
+
+    info = probe(source)
+
+    # Poster-Frame bei 10% der Laufzeit (max. 1 s), schwarze Anfangsframes vermeiden
+    poster = out_dir / "poster.jpg"
+    at = min(1.0, info["duration"] * 0.1)
+    subprocess.run(
+        [FFMPEG, "-v", "error", "-y", "-ss", f"{at:.2f}", "-i", source,
+         "-frames:v", "1", "-vf", f"scale='min({POSTER_WIDTH},iw)':-2", "-q:v", "3", str(poster)],
+        check=True, capture_output=True,
+    )
+
+    # Rendition: H.264 + AAC, max. 720p, gedeckelte Bitrate, moov-Atom vorne (faststart)
+    rendition = out_dir / f"{RENDITION_HEIGHT}p.mp4"
+    subprocess.run(
+        [FFMPEG, "-v", "error", "-y", "-i", source,
+         "-c:v", "libx264", "-preset", "medium", "-crf", VIDEO_CRF,
+         "-maxrate", VIDEO_MAXRATE, "-bufsize", VIDEO_BUFSIZE,
+         "-vf", f"scale=-2:'min({RENDITION_HEIGHT},ih)'", "-pix_fmt", "yuv420p",
+         "-c:a", "aac", "-b:a", AUDIO_BITRATE,
+         "-movflags", "+faststart", "-threads", str(FFMPEG_THREADS), str(rendition)],
+        check=True, capture_output=True,
+    )
+
+    source_size = os.path.getsize(source)
+    if rendition.stat().st_size >= source_size:
+        rendition.unlink()
+        rendition = None
+
+    return {**info, "poster": str(poster), "rendition": str(rendition) if rendition else None,
+            "source_size": source_size}
+
+
+def process_video(storage, public_url: str, media_id: int, source: str, r2_key: str, tmp_root: Path) -> dict:
+    """Rendern + Hochladen eines Videos. Gibt die `media`-Felder zurück."""
+    out_dir = tmp_root / str(media_id)
+    try:
+        result = render_video(str(source), str(out_dir))
+        upload_file(storage, result["poster"], poster_key(r2_key))
+        fields = {
+            "poster_path": f"{public_url}/{poster_key(r2_key)}",
+            "rendition_path": None,
+            "duration_seconds": round(result["duration"]) if result["duration"] else None,
+            "width": result["width"],
+            "height": result["height"],
+        }
+        rendition_size = 0
+        if result["rendition"]:
+            upload_file(storage, result["rendition"], rendition_key(r2_key))
+            fields["rendition_path"] = f"{public_url}/{rendition_key(r2_key)}"
+            rendition_size = os.path.getsize(result["rendition"])
+        return {"fields": fields, "source_size": result["source_size"], "rendition_size": rendition_size}
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def create_renditions(storage, supabase, public_url: str, jobs, workers: int = None) -> str:
+    """
+    Poster + Renditions für (media_id, quelle, r2_key)-Jobs; quelle = lokaler Pfad oder URL.
+    Gibt die Zusammenfassung zurück.
+    """
+    jobs = [job for job in jobs if Path(job[2]).suffix.lower() in VIDEO_EXTENSIONS]
+    if not jobs:
+        return "Renditions: keine Videos"
+    if not shutil.which(FFMPEG) or not shutil.which(FFPROBE):
+        return f"Renditions übersprungen: {FFMPEG}/{FFPROBE} nicht gefunden"
+
+    public_url = public_url.rstrip("/")
+    writer = StoragePathWriter(supabase, column=None, rpc_name=RPC_NAME)
+    tmp_root = Path(tempfile.mkdtemp(prefix="renditions_"))
+    stats = {"videos": 0, "renditions": 0, "errors": 0, "source_bytes": 0, "rendition_bytes": 0}
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers or default_workers()) as executor:
+            futures = {
+                executor.submit(process_video, storage, public_url, media_id, source, r2_key, tmp_root):
+                    (media_id, r2_key)
+                for media_id, source, r2_key in jobs
+            }
+            for future in as_completed(futures):
+                media_id, r2_key = futures[future]
+                try:
+                    result = future.result()
+                except subprocess.CalledProcessError as e:
+                    print(f"  ❌ ffmpeg-Fehler {r2_key}: {(e.stderr or b'').decode(errors='replace').strip()[:200]}")
+                    stats["errors"] += 1
+                    continue
+                except Exception as e:
+                    print(f"  ❌ Fehler {r2_key}: {e}")
+                    stats["errors"] += 1
+                    continue
+
+                writer.add(media_id, result["fields"])
+                stats["videos"] += 1
+                if result["rendition_size"]:
+                    stats["renditions"] += 1
+                    stats["source_bytes"] += result["source_size"]
+                    stats["rendition_bytes"] += result["rendition_size"]
+                size = f"{result['rendition_size'] // 1024} KB" if result["rendition_size"] else "Original behalten"
+                print(f"  🎬 [{stats['videos']}/{len(jobs)}] {r2_key} "
+                      f"({result['fields']['duration_seconds']} s, {size})")
+    finally:
+        writer.close()
+        shutil.rmtree(tmp_root, ignore_errors=True)
+
+    saved = f", Renditions = {stats['rendition_bytes'] / stats['source_bytes'] * 100:.0f}% der Originalgröße" \
+        if stats["source_bytes"] else ""
+    return f"Renditions: {stats['videos']} Videos mit Poster, {stats['renditions']} Renditions, " \
+           f"{stats['errors']} Fehler{saved}"
+
+
+# ============================================================================
+# BACKFILL
+# ============================================================================
+
+def backfill(limit: int = None, force: bool = False, workers: int = None):
+    """Poster + Renditions für alle Videos in R2 nachziehen."""
+    r2_public_url = os.getenv("R2_PUBLIC_URL", "").rstrip("/")
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+    storage = get_storage()
+
+    print("\n📥 Lade Video-Einträge aus DB...")
+    rows = []
+    page_size = 1000
+    offset = 0
+    while True:
+        query = supabase.table("media") \
+            .select("media_id, storage_path") \
+            .eq("media_type", "video") \
+            .not_.is_("storage_path", "null")
+        if not force:
+            query = query.is_("poster_path", "null")
+        result = query.order("media_id").range(offset, offset + page_size - 1).execute()
+        if not result.data:
+            break
+        rows.extend(result.data)
+        if len(result.data) < page_size:
+            break
+        offset += page_size
+
+    # Lokale Datei bevorzugt, sonst aus R2 laden
+    index = MediaIndex(LOCAL_MEDIA_PATH)
+    jobs = []
+    for row in rows:
+        storage_path = row["storage_path"]
+        if not storage_path.startswith(f"{r2_public_url}/"):
+            continue
+        r2_key = storage_path[len(r2_public_url) + 1:].split("?")[0]
+        jobs.append((row["media_id"], index.find(r2_key) or storage_path, r2_key))
+    if limit:
+        jobs = jobs[:limit]
+
+    print(f"📊 {len(jobs)} Videos ohne Poster ({sum(1 for j in jobs if not j[1].startswith('http'))} lokal)")
+    print(f"   Rendition: max. {RENDITION_HEIGHT}p, {VIDEO_MAXRATE}bit/s | "
+          f"{workers or default_workers()} parallele ffmpeg-Prozesse\n")
+    print(f"✅ {create_renditions(storage, supabase, r2_public_url, jobs, workers=workers)}")
+
+
+if __name__ == "__main__":
+    limit = None
+    workers = None
+    for i, arg in enumerate(sys.argv):
+        if arg == "--limit" and i + 1 < len(sys.argv):
+            limit = int(sys.argv[i + 1])
+        if arg == "--workers" and i + 1 < len(sys.argv):
+            workers = int(sys.argv[i + 1])
+
+    backfill(limit=limit, force="--force" in sys.argv, workers=workers)
@@ -1,13 +1,15 @@
 #!/usr/bin/env python3
 import os
-import re
 import json
-import urllib.parse
-import boto3
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 from supabase import create_client
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "preprocessing"))
+from storage_backend import get_storage
+from ref_scanner import KeyScanner, storage_key
+
 # Load environment variables
 load_dotenv()
 
@@ -15,7 +17,6 @@ load_dotenv()
 R2_ACCOUNT_ID = os.getenv("R2_ACCOUNT_ID")
 R2_ACCESS_KEY = os.getenv("R2_ACCESS_KEY")
 R2_SECRET_KEY = os.getenv("R2_SECRET_KEY")
-R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME", "simplestravelmedia")
 R2_PUBLIC_URL = os.getenv("R2_PUBLIC_URL")
 
 # Supabase Config
@@ -23,7 +24,8 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
 
 def main():
-    if not all([R2_ACCOUNT_ID, R2_ACCESS_KEY, R2_SECRET_KEY, R2_PUBLIC_URL]):
+    r2_credentials = all([R2_ACCOUNT_ID, R2_ACCESS_KEY, R2_SECRET_KEY])
+    if not R2_PUBLIC_URL or (os.getenv("STORAGE_BACKEND", "r2") == "r2" and not r2_credentials):
         print("❌ Cloudflare R2 Credentials/Config missing in .env")
         return
     if not all([SUPABASE_URL, SUPABASE_KEY]):
@@ -34,28 +36,17 @@ def main():
     supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
     print("Connecting to Cloudflare R2...")
-    s3 = boto3.client(
-        "s3",
-        endpoint_url=f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com",
-        aws_access_key_id=R2_ACCESS_KEY,
-        aws_secret_access_key=R2_SECRET_KEY,
-        region_name="auto",
-    )
+    storage = get_storage()
 
     # 1. List all objects in R2
-    print(f"Listing all files in R2 bucket '{R2_BUCKET_NAME}'...")
+    print(f"Listing all files in {storage}...")
     r2_files = {}  # key -> size_bytes
-    paginator = s3.get_paginator('list_objects_v2')
     
     total_r2_size = 0
     try:
-        pages = paginator.paginate(Bucket=R2_BUCKET_NAME)
-        for page in pages:
-            for obj in page.get('Contents', []):
-                key = obj['Key']
-                size = obj['Size']
-                r2_files[key] = size
-                total_r2_size += size
+        for key, obj in storage.list().items():
+            r2_files[key] = obj["size"]
+            total_r2_size += obj["size"]
     except Exception as e:
         print(f"❌ Error listing R2 bucket: {e}")
         return
@@ -85,18 +76,7 @@ def main():
             if path:
                 # Extract key from URL
                 # Example: https://pub-b3a0e6a319434721bf2acd7052d64b6e.r2.dev/2023/10/file.jpg -> 2023/10/file.jpg
-                # We can remove the R2_PUBLIC_URL prefix
-                key = path
-                if R2_PUBLIC_URL in key:
-                    key = key.split(R2_PUBLIC_URL)[-1].lstrip('/')
-                elif "r2.dev" in key:
-                    # Generic r2.dev check just in case
-                    key = re.sub(r'https?://[^/]+/', '', key)
-                
-                # Unquote URL encoding (e.g. %20 -> space)
-                key = urllib.parse.unquote(key)
-                
-                referenced_keys.add(key)
+                referenced_keys.add(storage_key(path, R2_PUBLIC_URL))
                 
         if len(result.data) < page_size:
             break
@@ -106,6 +86,8 @@ def main():
 
     # 3. Check for any other references in the db (optional scan)
     # We search the 'posts' content_blocks and text_content/link_url to be absolutely safe.
+    # One automaton over all R2 keys, each row is scanned once
+    scanner = KeyScanner(r2_files)
     print("Scanning 'posts' content_blocks and metadata for additional R2 references...")
     offset = 0
     while True:
@@ -124,13 +106,10 @@ def main():
             if item.get("content_blocks"):
                 text_to_search += json.dumps(item["content_blocks"])
                 
-            # Find any mentions of keys in strings
-            # Look for any matches of our known R2 keys in the JSON or text strings
-            for key in r2_files:
-                if key in text_to_search:
-                    if key not in referenced_keys:
-                        print(f"  ℹ️ Key '{key}' found in post '{item['post_id']}' text/JSON reference.")
-                        referenced_keys.add(key)
+            # Find any mentions of our known R2 keys in the JSON or text strings
+            for key in sorted(scanner.find(text_to_search) - referenced_keys):
+                print(f"  ℹ️ Key '{key}' found in post '{item['post_id']}' text/JSON reference.")
+                referenced_keys.add(key)
                         
         if len(result.data) < page_size:
             break
@@ -155,11 +134,9 @@ def main():
             if item.get("link_url"):
                 text_to_search += item["link_url"]
                 
-            for key in r2_files:
-                if key in text_to_search:
-                    if key not in referenced_keys:
-                        print(f"  ℹ️ Key '{key}' found in content block '{item['block_id']}' text/link reference.")
-                        referenced_keys.add(key)
+            for key in sorted(scanner.find(text_to_search) - referenced_keys):
+                print(f"  ℹ️ Key '{key}' found in content block '{item['block_id']}' text/link reference.")
+                referenced_keys.add(key)
                         
         if len(result.data) < page_size:
             break
@@ -179,11 +156,9 @@ def main():
             
         for item in result.data:
             text_to_search = item.get("content") or ""
-            for key in r2_files:
-                if key in text_to_search:
-                    if key not in referenced_keys:
-                        print(f"  ℹ️ Key '{key}' found in community impulse '{item['impulse_id']}' reference.")
-                        referenced_keys.add(key)
+            for key in sorted(scanner.find(text_to_search) - referenced_keys):
+                print(f"  ℹ️ Key '{key}' found in community impulse '{item['impulse_id']}' reference.")
+                referenced_keys.add(key)
                         
         if len(result.data) < page_size:
             break
@@ -203,11 +178,9 @@ def main():
             
         for item in result.data:
             text_to_search = item.get("content") or ""
-            for key in r2_files:
-                if key in text_to_search:
-                    if key not in referenced_keys:
-                        print(f"  ℹ️ Key '{key}' found in community reply '{item['reply_id']}' reference.")
-                        referenced_keys.add(key)
+            for key in sorted(scanner.find(text_to_search) - referenced_keys):
+                print(f"  ℹ️ Key '{key}' found in community reply '{item['reply_id']}' reference.")
+                referenced_keys.add(key)
                         
         if len(result.data) < page_size:
             break
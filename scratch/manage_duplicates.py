@@ -1,14 +1,25 @@
 #!/usr/bin/env python3
+"""
+Verwaiste und doppelte Dateien im Bucket finden (und sichere Duplikate löschen).
+
+Usage:
+    python3 scratch/manage_duplicates.py                  # Report
+    python3 scratch/manage_duplicates.py --delete         # sichere Duplikate löschen
+    python3 scratch/manage_duplicates.py --delete --plan  # nur schätzen, was --delete kostet
+"""
 import os
-import re
 import json
 import sys
-import urllib.parse
-import boto3
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 from supabase import create_client
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "preprocessing"))
+from storage_backend import get_storage
+from run_plan import RunPlan
+from ref_scanner import KeyScanner, storage_key
+
 # Load environment variables
 load_dotenv()
 
@@ -16,7 +27,6 @@ load_dotenv()
 R2_ACCOUNT_ID = os.getenv("R2_ACCOUNT_ID")
 R2_ACCESS_KEY = os.getenv("R2_ACCESS_KEY")
 R2_SECRET_KEY = os.getenv("R2_SECRET_KEY")
-R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME", "simplestravelmedia")
 R2_PUBLIC_URL = os.getenv("R2_PUBLIC_URL")
 
 # Supabase Config
@@ -26,8 +36,10 @@ SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY
 def main():
     dry_run = "--delete" not in sys.argv
     force_yes = "--yes" in sys.argv
+    plan = RunPlan("manage_duplicates --delete") if "--plan" in sys.argv else None
 
-    if not all([R2_ACCOUNT_ID, R2_ACCESS_KEY, R2_SECRET_KEY, R2_PUBLIC_URL]):
+    r2_credentials = all([R2_ACCOUNT_ID, R2_ACCESS_KEY, R2_SECRET_KEY])
+    if not R2_PUBLIC_URL or (os.getenv("STORAGE_BACKEND", "r2") == "r2" and not r2_credentials):
         print("❌ Cloudflare R2 Credentials/Config missing in .env")
         return
     if not all([SUPABASE_URL, SUPABASE_KEY]):
@@ -38,41 +50,35 @@ def main():
     supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
     print("Connecting to Cloudflare R2...")
-    s3 = boto3.client(
-        "s3",
-        endpoint_url=f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com",
-        aws_access_key_id=R2_ACCESS_KEY,
-        aws_secret_access_key=R2_SECRET_KEY,
-        region_name="auto",
-    )
+    storage = get_storage()
 
     # 1. List all objects in R2 with ETags
-    print(f"Listing all files in R2 bucket '{R2_BUCKET_NAME}'...")
+    print(f"Listing all files in {storage}...")
     r2_objects = {}  # key -> {size, etag}
     etag_map = {}    # etag -> list of keys
     
-    paginator = s3.get_paginator('list_objects_v2')
     total_r2_size = 0
     
     try:
-        pages = paginator.paginate(Bucket=R2_BUCKET_NAME)
-        for page in pages:
-            for obj in page.get('Contents', []):
-                key = obj['Key']
-                size = obj['Size']
-                # Clean ETag (strip double quotes)
-                etag = obj['ETag'].replace('"', '')
-                
-                r2_objects[key] = {
-                    "size_bytes": size,
-                    "size_mb": size / 1024 / 1024,
-                    "etag": etag
-                }
-                total_r2_size += size
-                
-                if etag not in etag_map:
-                    etag_map[etag] = []
-                etag_map[etag].append(key)
+        start = time.monotonic()
+        listing = storage.list()
+        if plan:
+            # LIST liefert max. 1000 Keys pro Seite
+            plan.measure("storage", len(listing) // 1000 + 1, time.monotonic() - start)
+        for key, obj in listing.items():
+            size = obj["size"]
+            etag = obj["etag"]  # already without double quotes
+            
+            r2_objects[key] = {
+                "size_bytes": size,
+                "size_mb": size / 1024 / 1024,
+                "etag": etag
+            }
+            total_r2_size += size
+            
+            if etag not in etag_map:
+                etag_map[etag] = []
+            etag_map[etag].append(key)
     except Exception as e:
         print(f"❌ Error listing R2 bucket: {e}")
         return
@@ -81,39 +87,40 @@ def main():
 
     # 2. Fetch references from Supabase (media, posts, content_blocks, community)
     print("Fetching active media references from Supabase...")
+
+    def fetch_page(query):
+        start = time.monotonic()
+        result = query.execute()
+        if plan:
+            plan.measure("postgrest", 1, time.monotonic() - start)
+        return result
+
     referenced_keys = set()
     page_size = 1000
     
     # 2a. media table
     offset = 0
     while True:
-        result = supabase.table("media") \
+        result = fetch_page(supabase.table("media") \
             .select("media_id, storage_path") \
-            .range(offset, offset + page_size - 1) \
-            .execute()
+            .range(offset, offset + page_size - 1))
         if not result.data:
             break
         for item in result.data:
             path = item.get("storage_path")
             if path:
-                key = path
-                if R2_PUBLIC_URL in key:
-                    key = key.split(R2_PUBLIC_URL)[-1].lstrip('/')
-                elif "r2.dev" in key:
-                    key = re.sub(r'https?://[^/]+/', '', key)
-                key = urllib.parse.unquote(key)
-                referenced_keys.add(key)
+                referenced_keys.add(storage_key(path, R2_PUBLIC_URL))
         if len(result.data) < page_size:
             break
         offset += page_size
 
-    # 2b. posts table
+    # 2b. posts table (ein Automat über alle Keys, jede Zeile ein Durchlauf)
+    scanner = KeyScanner(r2_objects)
     offset = 0
     while True:
-        result = supabase.table("posts") \
+        result = fetch_page(supabase.table("posts") \
             .select("post_id, summary, content_blocks") \
-            .range(offset, offset + page_size - 1) \
-            .execute()
+            .range(offset, offset + page_size - 1))
         if not result.data:
             break
         for item in result.data:
@@ -122,9 +129,7 @@ def main():
                 text_to_search += item["summary"]
             if item.get("content_blocks"):
                 text_to_search += json.dumps(item["content_blocks"])
-            for key in r2_objects:
-                if key in text_to_search:
-                    referenced_keys.add(key)
+            referenced_keys |= scanner.find(text_to_search)
         if len(result.data) < page_size:
             break
         offset += page_size
@@ -132,10 +137,9 @@ def main():
     # 2c. content_blocks table
     offset = 0
     while True:
-        result = supabase.table("content_blocks") \
+        result = fetch_page(supabase.table("content_blocks") \
             .select("block_id, text_content, link_url") \
-            .range(offset, offset + page_size - 1) \
-            .execute()
+            .range(offset, offset + page_size - 1))
         if not result.data:
             break
         for item in result.data:
@@ -144,9 +148,7 @@ def main():
                 text_to_search += item["text_content"]
             if item.get("link_url"):
                 text_to_search += item["link_url"]
-            for key in r2_objects:
-                if key in text_to_search:
-                    referenced_keys.add(key)
+            referenced_keys |= scanner.find(text_to_search)
         if len(result.data) < page_size:
             break
         offset += page_size
@@ -154,34 +156,28 @@ def main():
     # 2d. community impulses & replies
     offset = 0
     while True:
-        result = supabase.table("community_impulses") \
+        result = fetch_page(supabase.table("community_impulses") \
             .select("impulse_id, content") \
-            .range(offset, offset + page_size - 1) \
-            .execute()
+            .range(offset, offset + page_size - 1))
         if not result.data:
             break
         for item in result.data:
             text_to_search = item.get("content") or ""
-            for key in r2_objects:
-                if key in text_to_search:
-                    referenced_keys.add(key)
+            referenced_keys |= scanner.find(text_to_search)
         if len(result.data) < page_size:
             break
         offset += page_size
 
     offset = 0
     while True:
-        result = supabase.table("community_replies") \
+        result = fetch_page(supabase.table("community_replies") \
             .select("reply_id, content") \
-            .range(offset, offset + page_size - 1) \
-            .execute()
+            .range(offset, offset + page_size - 1))
         if not result.data:
             break
         for item in result.data:
             text_to_search = item.get("content") or ""
-            for key in r2_objects:
-                if key in text_to_search:
-                    referenced_keys.add(key)
+            referenced_keys |= scanner.find(text_to_search)
         if len(result.data) < page_size:
             break
         offset += page_size
@@ -230,22 +226,23 @@ def main():
             })
             total_unique_size += info["size_bytes"]
 
-    # Write detailed analysis to JSON
+    # Write detailed analysis to JSON (not in plan mode: it writes nothing)
     analysis_file = Path("scratch/duplicate_analysis.json")
-    with open(analysis_file, "w", encoding="utf-8") as f:
-        json.dump({
-            "summary": {
-                "total_r2_files": len(r2_objects),
-                "total_r2_size_mb": total_r2_size / 1024 / 1024,
-                "referenced_files": len(referenced_keys),
-                "safe_to_delete_duplicates_count": len(safe_to_delete),
-                "safe_to_delete_duplicates_size_mb": total_safe_size / 1024 / 1024,
-                "unique_orphans_count": len(unique_orphans),
-                "unique_orphans_size_mb": total_unique_size / 1024 / 1024
-            },
-            "safe_to_delete_duplicates": safe_to_delete,
-            "unique_orphans": unique_orphans
-        }, f, indent=2, ensure_ascii=False)
+    if not plan:
+        with open(analysis_file, "w", encoding="utf-8") as f:
+            json.dump({
+                "summary": {
+                    "total_r2_files": len(r2_objects),
+                    "total_r2_size_mb": total_r2_size / 1024 / 1024,
+                    "referenced_files": len(referenced_keys),
+                    "safe_to_delete_duplicates_count": len(safe_to_delete),
+                    "safe_to_delete_duplicates_size_mb": total_safe_size / 1024 / 1024,
+                    "unique_orphans_count": len(unique_orphans),
+                    "unique_orphans_size_mb": total_unique_size / 1024 / 1024
+                },
+                "safe_to_delete_duplicates": safe_to_delete,
+                "unique_orphans": unique_orphans
+            }, f, indent=2, ensure_ascii=False)
 
     # 4. Print Summary Report
     print("\n" + "="*60)
@@ -256,7 +253,8 @@ def main():
     print(f" davon einzigartige Orphans:      {len(unique_orphans)} ({total_unique_size / 1024 / 1024:.2f} MB)")
     print(f"Gesamte einsparbare Größe:       {(total_safe_size + total_unique_size) / 1024 / 1024:.2f} MB")
     print("="*60)
-    print(f"Detaillierter Bericht gespeichert in: {analysis_file}")
+    if not plan:
+        print(f"Detaillierter Bericht gespeichert in: {analysis_file}")
     
     if safe_to_delete:
         print("\nBeispiele für sichere Duplikate (Verwaiste Datei -> Referenzierte Datei):")
@@ -273,6 +271,14 @@ def main():
         if len(unique_orphans) > 10:
             print(f"      ... und {len(unique_orphans) - 10} weitere.")
 
+    if plan:
+        # --delete: ein DELETE pro sicherem Duplikat, nacheinander
+        plan.add("storage", len(safe_to_delete))
+        plan.note(f"{len(safe_to_delete)} sichere Duplikate zu löschen "
+                  f"({total_safe_size / 1024 / 1024:.2f} MB), {len(r2_objects)} Objekte im Bucket")
+        print(plan.report())
+        return
+
     # 5. Handle Deletion
     if dry_run:
         print("\n💡 Tipp: Um die sicheren Duplikate automatisch zu löschen, führe aus:")
@@ -306,7 +312,7 @@ def main():
     for i, item in enumerate(safe_to_delete, 1):
         key = item["key"]
         try:
-            s3.delete_object(Bucket=R2_BUCKET_NAME, Key=key)
+            storage.delete(key)
             print(f"  [{i}/{len(safe_to_delete)}] ✅ Gelöscht: {key}")
             deleted_count += 1
         except Exception as e:
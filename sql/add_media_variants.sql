@@ -0,0 +1,53 @@
+-- Migration: Responsive image derivatives (preprocessing/image_variants.py)
+--
+-- variants = {"base": "variants/POST_ID/block_0_img_abc", "widths": [320, 640, 1024, 1600],
+--             "formats": ["webp", "avif"], "width": 4032, "height": 3024}
+-- Object key of one derivative: {base}/w{width}.{format}
+
+-- 1. Column on media
+ALTER TABLE media ADD COLUMN IF NOT EXISTS variants JSONB;
+
+-- 2. Bulk update in one round-trip (write-behind buffer, like bulk_update_storage_paths)
+CREATE OR REPLACE FUNCTION bulk_update_media_variants(updates JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    updated_count INTEGER;
+BEGIN
+    UPDATE media m
+    SET variants = u.variants
+    FROM jsonb_to_recordset(updates) AS u(media_id BIGINT, variants JSONB)
+    WHERE m.media_id = u.media_id;
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+    RETURN updated_count;
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER;
+
+REVOKE EXECUTE ON FUNCTION bulk_update_media_variants(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION bulk_update_media_variants(JSONB) TO service_role;
+
+-- 3. Expose the thumbnail's derivatives next to thumbnail_path
+--    (drop + create: p.* breaks CREATE OR REPLACE once posts columns changed;
+--    keep in sync with preprocessing/recreate_views.py)
+DROP VIEW IF EXISTS posts_with_thumbnail CASCADE;
+
+CREATE VIEW posts_with_thumbnail AS
+SELECT 
+    p.*,
+    (
+        SELECT m.storage_path
+        FROM media m
+        WHERE m.post_id = p.post_id 
+        AND m.media_type = 'image'
+        ORDER BY m.block_index, m.display_order
+        LIMIT 1
+    ) as thumbnail_path,
+    (
+        SELECT m.variants
+        FROM media m
+        WHERE m.post_id = p.post_id 
+        AND m.media_type = 'image'
+        ORDER BY m.block_index, m.display_order
+        LIMIT 1
+    ) as thumbnail_variants
+FROM posts p;
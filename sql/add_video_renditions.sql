@@ -0,0 +1,38 @@
+-- Migration: Video poster frames and web renditions (preprocessing/video_renditions.py)
+--
+-- poster_path    = R2 URL of a JPEG poster frame (<video poster>)
+-- rendition_path = R2 URL of a bitrate-capped faststart MP4 (<= 720p), NULL if the original is already smaller
+
+-- 1. Columns on media
+ALTER TABLE media ADD COLUMN IF NOT EXISTS poster_path TEXT;
+ALTER TABLE media ADD COLUMN IF NOT EXISTS rendition_path TEXT;
+
+-- 2. Bulk update in one round-trip (write-behind buffer, like bulk_update_storage_paths)
+CREATE OR REPLACE FUNCTION bulk_update_video_renditions(updates JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    updated_count INTEGER;
+BEGIN
+    UPDATE media m
+    SET poster_path      = u.poster_path,
+        rendition_path   = u.rendition_path,
+        duration_seconds = COALESCE(u.duration_seconds, m.duration_seconds),
+        width            = COALESCE(u.width, m.width),
+        height           = COALESCE(u.height, m.height)
+    FROM jsonb_to_recordset(updates) AS u(
+        media_id BIGINT,
+        poster_path TEXT,
+        rendition_path TEXT,
+        duration_seconds INTEGER,
+        width INTEGER,
+        height INTEGER
+    )
+    WHERE m.media_id = u.media_id;
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+    RETURN updated_count;
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER;
+
+REVOKE EXECUTE ON FUNCTION bulk_update_video_renditions(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION bulk_update_video_renditions(JSONB) TO service_role;
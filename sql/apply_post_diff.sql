@@ -0,0 +1,144 @@
+-- Migration: Apply a re-import diff (post_diff.py) to one post in one round-trip
+-- Used by preprocessing/import_new_posts.py --reimport
+--
+-- Call via PostgREST:
+--   supabase.rpc('apply_post_diff', {'doc': {
+--       'post_id': '...',
+--       'post': {<changed columns>},
+--       'media_insert': [{...}], 'media_update': [{'media_id': 1, 'changes': {...}}], 'media_delete': [1, ...],
+--       'blocks_insert': [{...}], 'blocks_update': [{'block_id': 1, 'changes': {...}}], 'blocks_delete': [1, ...]
+--   }})
+--
+-- Everything runs in the function's transaction: either the whole diff is
+-- applied, or nothing is – a failed update never leaves a half-written post.
+-- Columns missing from a `changes` object keep their stored value.
+--
+-- Returns: {"post_id": "...", "media": [{"media_id": 1, "block_index": 0, "display_order": 0}, ...]}
+-- (all media of the post after the update)
+
+CREATE OR REPLACE FUNCTION apply_post_diff(doc JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_post_id TEXT := doc->>'post_id';
+    v_media JSONB;
+BEGIN
+    IF v_post_id IS NULL THEN
+        RAISE EXCEPTION 'apply_post_diff: doc.post_id is missing';
+    END IF;
+
+    -- 1. Post (only the Tumblr columns of post_diff.POST_SYNC_COLUMNS, curated ones are kept)
+    IF COALESCE(doc->'post', '{}'::jsonb) <> '{}'::jsonb THEN
+        UPDATE posts AS p SET
+            post_date = r.post_date,
+            tumblr_timestamp = r.tumblr_timestamp,
+            slug = r.slug,
+            original_url = r.original_url,
+            short_url = r.short_url,
+            state = r.state,
+            note_count = r.note_count,
+            summary = r.summary,
+            content_blocks = r.content_blocks,
+            layout_info = r.layout_info,
+            tags = r.tags,
+            media_count = r.media_count,
+            text_blocks_count = r.text_blocks_count
+        FROM posts AS t
+        CROSS JOIN LATERAL jsonb_populate_record(t, doc->'post') AS r
+        WHERE t.post_id = v_post_id
+          AND p.post_id = v_post_id;
+    END IF;
+
+    -- 2. Rows no longer in the post
+    DELETE FROM content_blocks
+    WHERE post_id = v_post_id
+      AND block_id IN (
+          SELECT jsonb_array_elements_text(COALESCE(doc->'blocks_delete', '[]'::jsonb))::BIGINT
+      );
+    DELETE FROM media
+    WHERE post_id = v_post_id
+      AND media_id IN (
+          SELECT jsonb_array_elements_text(COALESCE(doc->'media_delete', '[]'::jsonb))::BIGINT
+      );
+
+    -- 3. Changed rows
+    UPDATE media AS m SET
+        media_type = r.media_type,
+        mime_type = r.mime_type,
+        storage_path = r.storage_path,
+        local_path = r.local_path,
+        original_url = r.original_url,
+        tumblr_url = r.tumblr_url,
+        width = r.width,
+        height = r.height,
+        dominant_colors = r.dominant_colors,
+        exif_data = r.exif_data,
+        camera_make = r.camera_make,
+        camera_model = r.camera_model,
+        lens = r.lens,
+        aperture = r.aperture,
+        exposure_time = r.exposure_time,
+        iso = r.iso,
+        focal_length = r.focal_length,
+        photo_taken_at = r.photo_taken_at,
+        alt_text = r.alt_text,
+        provider = r.provider,
+        duration_seconds = r.duration_seconds
+    FROM jsonb_array_elements(COALESCE(doc->'media_update', '[]'::jsonb)) AS u
+    JOIN media AS t ON t.media_id = (u->>'media_id')::BIGINT
+    CROSS JOIN LATERAL jsonb_populate_record(t, u->'changes') AS r
+    WHERE m.media_id = t.media_id
+      AND m.post_id = v_post_id;
+
+    UPDATE content_blocks AS b SET
+        block_type = r.block_type,
+        layout_row = r.layout_row,
+        text_content = r.text_content,
+        text_formatting = r.text_formatting,
+        text_subtype = r.text_subtype,
+        link_url = r.link_url,
+        link_title = r.link_title,
+        link_description = r.link_description
+    FROM jsonb_array_elements(COALESCE(doc->'blocks_update', '[]'::jsonb)) AS u
+    JOIN content_blocks AS t ON t.block_id = (u->>'block_id')::BIGINT
+    CROSS JOIN LATERAL jsonb_populate_record(t, u->'changes') AS r
+    WHERE b.block_id = t.block_id
+      AND b.post_id = v_post_id;
+
+    -- 4. New rows
+    INSERT INTO media (
+        post_id, block_index, display_order, media_type, mime_type, storage_path, local_path,
+        original_url, tumblr_url, width, height, dominant_colors, exif_data, camera_make,
+        camera_model, lens, aperture, exposure_time, iso, focal_length, photo_taken_at,
+        alt_text, provider, duration_seconds
+    )
+    SELECT
+        v_post_id, m.block_index, COALESCE(m.display_order, 0), m.media_type, m.mime_type,
+        m.storage_path, m.local_path, m.original_url, m.tumblr_url, m.width, m.height,
+        m.dominant_colors, m.exif_data, m.camera_make, m.camera_model, m.lens, m.aperture,
+        m.exposure_time, m.iso, m.focal_length, m.photo_taken_at, m.alt_text, m.provider,
+        m.duration_seconds
+    FROM jsonb_populate_recordset(NULL::media, COALESCE(doc->'media_insert', '[]'::jsonb)) AS m;
+
+    INSERT INTO content_blocks (
+        post_id, block_index, block_type, layout_row, text_content, text_formatting,
+        text_subtype, link_url, link_title, link_description
+    )
+    SELECT
+        v_post_id, b.block_index, b.block_type, b.layout_row, b.text_content, b.text_formatting,
+        b.text_subtype, b.link_url, b.link_title, b.link_description
+    FROM jsonb_populate_recordset(NULL::content_blocks, COALESCE(doc->'blocks_insert', '[]'::jsonb)) AS b;
+
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+        'media_id', media_id, 'block_index', block_index, 'display_order', display_order
+    )), '[]'::jsonb)
+    INTO v_media
+    FROM media
+    WHERE post_id = v_post_id;
+
+    RETURN jsonb_build_object('post_id', v_post_id, 'media', v_media);
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER;
+
+-- Only the service role (preprocessing scripts) may call it
+REVOKE EXECUTE ON FUNCTION apply_post_diff(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION apply_post_diff(JSONB) TO service_role;
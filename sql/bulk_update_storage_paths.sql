@@ -0,0 +1,25 @@
+-- Migration: Bulk update of media.storage_path in one round-trip
+-- Used by the R2 upload tools (write-behind buffer in preprocessing/storage_path_writer.py)
+--
+-- Call via PostgREST:
+--   supabase.rpc('bulk_update_storage_paths', {'updates': [{'media_id': 1, 'storage_path': 'https://...'}, ...]})
+
+CREATE OR REPLACE FUNCTION bulk_update_storage_paths(updates JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    updated_count INTEGER;
+BEGIN
+    UPDATE media m
+    SET storage_path = u.storage_path
+    FROM jsonb_to_recordset(updates) AS u(media_id BIGINT, storage_path TEXT)
+    WHERE m.media_id = u.media_id
+      AND m.storage_path IS DISTINCT FROM u.storage_path;
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+    RETURN updated_count;
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER;
+
+-- Only the service role (preprocessing scripts) may call it
+REVOKE EXECUTE ON FUNCTION bulk_update_storage_paths(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION bulk_update_storage_paths(JSONB) TO service_role;
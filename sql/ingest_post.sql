@@ -0,0 +1,120 @@
+-- Migration: Ingest a whole post (post, media, content blocks) in one round-trip
+-- Used by preprocessing/import_new_posts.py
+--
+-- Call via PostgREST:
+--   supabase.rpc('ingest_post', {'doc': {'post': {...}, 'media': [{...}], 'blocks': [{...}]}})
+--
+-- Everything runs in the function's transaction: either the post with all of
+-- its media and blocks is written, or nothing is. Re-running it with the same
+-- document is safe (upsert on the natural keys).
+--
+-- Returns: {"post_id": "...", "media": [{"media_id": 1, "block_index": 0, "display_order": 0}, ...]}
+
+CREATE OR REPLACE FUNCTION ingest_post(doc JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_post_id TEXT := doc->'post'->>'post_id';
+    v_media JSONB;
+BEGIN
+    IF v_post_id IS NULL THEN
+        RAISE EXCEPTION 'ingest_post: doc.post.post_id is missing';
+    END IF;
+
+    -- 1. Post (title, actual_date, country, trip and companions are curated later and kept)
+    INSERT INTO posts (
+        post_id, post_date, actual_date, tumblr_timestamp, slug, original_url, short_url,
+        state, note_count, title, summary, content_blocks, layout_info, country_id,
+        country_old, trip_id, companions, tags, media_count, text_blocks_count
+    )
+    SELECT
+        p.post_id, p.post_date, COALESCE(p.actual_date, p.post_date), p.tumblr_timestamp, p.slug,
+        p.original_url, p.short_url, COALESCE(p.state, 'published'), COALESCE(p.note_count, 0),
+        p.title, p.summary, p.content_blocks, p.layout_info, p.country_id, p.country_old,
+        p.trip_id, p.companions, p.tags, COALESCE(p.media_count, 0), COALESCE(p.text_blocks_count, 0)
+    FROM jsonb_populate_record(NULL::posts, doc->'post') AS p
+    ON CONFLICT (post_id) DO UPDATE SET
+        post_date = EXCLUDED.post_date,
+        tumblr_timestamp = EXCLUDED.tumblr_timestamp,
+        slug = EXCLUDED.slug,
+        original_url = EXCLUDED.original_url,
+        short_url = EXCLUDED.short_url,
+        state = EXCLUDED.state,
+        note_count = EXCLUDED.note_count,
+        summary = EXCLUDED.summary,
+        content_blocks = EXCLUDED.content_blocks,
+        layout_info = EXCLUDED.layout_info,
+        tags = EXCLUDED.tags,
+        media_count = EXCLUDED.media_count,
+        text_blocks_count = EXCLUDED.text_blocks_count;
+
+    -- 2. Media (storage_path / probed metadata only overwritten when the document has a value)
+    WITH upserted AS (
+        INSERT INTO media (
+            post_id, block_index, display_order, media_type, mime_type, storage_path, local_path,
+            original_url, tumblr_url, width, height, dominant_colors, exif_data, camera_make,
+            camera_model, lens, aperture, exposure_time, iso, focal_length, photo_taken_at,
+            alt_text, provider, duration_seconds
+        )
+        SELECT
+            v_post_id, m.block_index, COALESCE(m.display_order, 0), m.media_type, m.mime_type,
+            m.storage_path, m.local_path, m.original_url, m.tumblr_url, m.width, m.height,
+            m.dominant_colors, m.exif_data, m.camera_make, m.camera_model, m.lens, m.aperture,
+            m.exposure_time, m.iso, m.focal_length, m.photo_taken_at, m.alt_text, m.provider,
+            m.duration_seconds
+        FROM jsonb_populate_recordset(NULL::media, COALESCE(doc->'media', '[]'::jsonb)) AS m
+        ON CONFLICT (post_id, block_index, display_order) DO UPDATE SET
+            media_type = EXCLUDED.media_type,
+            mime_type = EXCLUDED.mime_type,
+            storage_path = COALESCE(EXCLUDED.storage_path, media.storage_path),
+            local_path = EXCLUDED.local_path,
+            original_url = EXCLUDED.original_url,
+            tumblr_url = EXCLUDED.tumblr_url,
+            width = COALESCE(EXCLUDED.width, media.width),
+            height = COALESCE(EXCLUDED.height, media.height),
+            dominant_colors = EXCLUDED.dominant_colors,
+            exif_data = EXCLUDED.exif_data,
+            camera_make = EXCLUDED.camera_make,
+            camera_model = EXCLUDED.camera_model,
+            lens = EXCLUDED.lens,
+            aperture = EXCLUDED.aperture,
+            exposure_time = EXCLUDED.exposure_time,
+            iso = EXCLUDED.iso,
+            focal_length = EXCLUDED.focal_length,
+            photo_taken_at = EXCLUDED.photo_taken_at,
+            alt_text = EXCLUDED.alt_text,
+            provider = EXCLUDED.provider,
+            duration_seconds = COALESCE(EXCLUDED.duration_seconds, media.duration_seconds)
+        RETURNING media_id, block_index, display_order
+    )
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+        'media_id', media_id, 'block_index', block_index, 'display_order', display_order
+    )), '[]'::jsonb)
+    INTO v_media
+    FROM upserted;
+
+    -- 3. Content blocks
+    INSERT INTO content_blocks (
+        post_id, block_index, block_type, layout_row, text_content, text_formatting,
+        text_subtype, link_url, link_title, link_description
+    )
+    SELECT
+        v_post_id, b.block_index, b.block_type, b.layout_row, b.text_content, b.text_formatting,
+        b.text_subtype, b.link_url, b.link_title, b.link_description
+    FROM jsonb_populate_recordset(NULL::content_blocks, COALESCE(doc->'blocks', '[]'::jsonb)) AS b
+    ON CONFLICT (post_id, block_index) DO UPDATE SET
+        block_type = EXCLUDED.block_type,
+        layout_row = EXCLUDED.layout_row,
+        text_content = EXCLUDED.text_content,
+        text_formatting = EXCLUDED.text_formatting,
+        text_subtype = EXCLUDED.text_subtype,
+        link_url = EXCLUDED.link_url,
+        link_title = EXCLUDED.link_title,
+        link_description = EXCLUDED.link_description;
+
+    RETURN jsonb_build_object('post_id', v_post_id, 'media', v_media);
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER;
+
+-- Only the service role (preprocessing scripts) may call it
+REVOKE EXECUTE ON FUNCTION ingest_post(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION ingest_post(JSONB) TO service_role;
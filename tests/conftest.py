@@ -0,0 +1,13 @@
+"""
+Tests für die reinen Kerne in preprocessing/ (ohne Supabase, R2 oder Tumblr).
+
+Die Skripte importieren sich gegenseitig ohne Paket (`from pipeline import ...`),
+deshalb kommt preprocessing/ hier auf den Pfad.
+
+    python -m pytest
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "preprocessing"))
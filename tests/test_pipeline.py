@@ -0,0 +1,184 @@
+import random
+import threading
+import time
+
+import pytest
+
+from pipeline import Pipeline, PipelineAborted, Stage
+
+
+def jitter(x):
+    """Zufällige Dauer, damit parallele Worker in beliebiger Reihenfolge fertig werden."""
+    time.sleep(random.uniform(0, 0.005))
+    return x
+
+
+def test_ordered_stage_sees_source_order():
+    seen = []
+    pipeline = Pipeline(iter(range(50)), [
+        Stage("work", jitter, workers=8),
+        Stage("db", lambda x: seen.append(x) or x, ordered=True),
+    ])
+    pipeline.run()
+
+    assert seen == list(range(50))
+    assert pipeline.total == 50
+    assert pipeline.gap is None
+
+
+def test_ordered_stage_skips_dropped_items_in_order():
+    seen = []
+    pipeline = Pipeline(iter(range(30)), [
+        Stage("filter", lambda x: None if x % 3 == 0 else jitter(x), workers=4),
+        Stage("db", lambda x: seen.append(x) or x, ordered=True),
+    ])
+    pipeline.run()
+
+    assert seen == [x for x in range(30) if x % 3]
+    filter_stage = pipeline.stages[1]
+    assert filter_stage.dropped == 10
+    assert filter_stage.items == 20
+
+
+def test_errors_are_counted_and_reported():
+    reported = []
+
+    def work(x):
+        if x in (3, 7):
+            raise ValueError(f"kaputt {x}")
+        return x
+
+    seen = []
+    pipeline = Pipeline(iter(range(10)), [
+        Stage("work", work, workers=2),
+        Stage("db", lambda x: seen.append(x) or x, ordered=True),
+    ], on_error=lambda stage, item, error: reported.append((stage, item, str(error))))
+    pipeline.run()
+
+    # Ohne gapless geht es hinter dem Fehler weiter
+    assert seen == [0, 1, 2, 4, 5, 6, 8, 9]
+    assert pipeline.error_count() == 2
+    assert sorted(reported) == [("work", 3, "kaputt 3"), ("work", 7, "kaputt 7")]
+
+
+def test_gapless_stage_halts_at_upstream_failure():
+    seen = []
+
+    def work(x):
+        jitter(x)
+        if x == 7:
+            raise ValueError("Download fehlgeschlagen")
+        return x
+
+    pipeline = Pipeline(iter(range(200)), [
+        Stage("download", work, workers=8),
+        Stage("db", lambda x: seen.append(x) or x, ordered=True, gapless=True),
+    ])
+    pipeline.run()  # kein Fehler, nur angehalten
+
+    assert seen == list(range(7))
+    assert pipeline.gap == ("db", 7)
+    # Die Quelle wurde angehalten statt alle 200 Items durchzuschieben
+    assert pipeline.total < 200
+    assert "angehalten" in pipeline.summary()
+
+
+def test_gapless_stage_halts_at_own_failure():
+    seen = []
+
+    def write(x):
+        if x == 4:
+            raise ValueError("DB-Fehler")
+        seen.append(x)
+        return x
+
+    pipeline = Pipeline(iter(range(50)), [
+        Stage("work", jitter, workers=4),
+        Stage("db", write, ordered=True, gapless=True),
+    ])
+    pipeline.run()
+
+    assert seen == [0, 1, 2, 3]
+    assert pipeline.gap == ("db", 4)
+    assert pipeline.error_count() == 1
+
+
+def test_gapless_stage_ignores_intentional_drops():
+    seen = []
+    pipeline = Pipeline(iter(range(20)), [
+        Stage("filter", lambda x: None if x % 2 else x, workers=3),
+        Stage("db", lambda x: seen.append(x) or x, ordered=True, gapless=True),
+    ])
+    pipeline.run()
+
+    assert seen == list(range(0, 20, 2))
+    assert pipeline.gap is None
+
+
+def test_abort_stops_pipeline_and_raises():
+    seen = []
+
+    def write(x):
+        if x == 5:
+            raise PipelineAborted("RPC fehlt")
+        seen.append(x)
+        return x
+
+    pipeline = Pipeline(iter(range(10_000)), [
+        Stage("work", lambda x: x, workers=4),
+        Stage("db", write, ordered=True),
+    ])
+    with pytest.raises(PipelineAborted, match="RPC fehlt"):
+        pipeline.run()
+
+    assert seen == [0, 1, 2, 3, 4]
+    assert pipeline.total < 10_000
+
+
+def test_source_exception_is_raised():
+    def source():
+        yield 1
+        raise RuntimeError("Tumblr down")
+
+    pipeline = Pipeline(source(), [Stage("work", lambda x: x)])
+    with pytest.raises(RuntimeError, match="Tumblr down"):
+        pipeline.run()
+
+
+def test_backpressure_bounds_items_in_flight():
+    lock = threading.Lock()
+    produced = consumed = 0
+    max_in_flight = 0
+
+    def source():
+        nonlocal produced
+        for i in range(40):
+            with lock:
+                produced += 1
+            yield i
+
+    def slow(x):
+        nonlocal consumed, max_in_flight
+        with lock:
+            consumed += 1
+            max_in_flight = max(max_in_flight, produced - consumed)
+        time.sleep(0.005)
+        return x
+
+    stage = Stage("slow", slow, workers=1, queue_size=2)
+    pipeline = Pipeline(source(), [stage])
+    pipeline.run()
+
+    assert stage.items == 40
+    # Queue voll + ein Item, das die Quelle gerade einzureihen versucht
+    assert max_in_flight <= stage.queue_size + 1
+    assert stage.max_queue <= stage.queue_size
+    # Die Quelle musste auf Platz warten
+    assert pipeline.stages[0].blocked > 0
+
+
+def test_stage_validation():
+    with pytest.raises(ValueError):
+        Stage("db", lambda x: x, workers=2, ordered=True)
+    with pytest.raises(ValueError):
+        Stage("db", lambda x: x, gapless=True)
@@ -0,0 +1,180 @@
+from post_diff import apply_diff, changed_columns, count_requests, describe, diff_post, is_empty
+
+
+def make_post(**overrides):
+    post = {
+        "post_id": "1001",
+        "post_date": "2026-03-01T10:00:00+00:00",
+        "actual_date": "2026-03-01T10:00:00+00:00",
+        "tumblr_timestamp": 1772359200,
+        "summary": "Hallo",
+        "content_blocks": [{"type": "text", "text": "Hallo"}],
+        "tags": ["Split"],
+        "media_count": 1,
+        "text_blocks_count": 1,
+        "title": None,
+    }
+    post.update(overrides)
+    return post
+
+
+def make_media(block_index=1, display_order=0, **overrides):
+    row = {
+        "post_id": "1001",
+        "block_index": block_index,
+        "display_order": display_order,
+        "media_type": "image",
+        "original_url": f"https://64.media.tumblr.com/{block_index}_{display_order}.jpg",
+        "storage_path": None,
+        "width": 10,
+        "height": 10,
+    }
+    row.update(overrides)
+    return row
+
+
+def make_block(block_index=0, **overrides):
+    row = {"post_id": "1001", "block_index": block_index, "block_type": "text", "text_content": "Hallo"}
+    row.update(overrides)
+    return row
+
+
+def stored_post(post=None, media=(), blocks=()):
+    """Wie load_stored_post: Post-Zeile mit eingebetteten media und blocks (inkl. IDs)."""
+    stored = dict(post or make_post())
+    stored["media"] = [{"media_id": 100 + i, **row} for i, row in enumerate(media)]
+    stored["blocks"] = [{"block_id": 200 + i, **row} for i, row in enumerate(blocks)]
+    return stored
+
+
+def test_unchanged_post_is_empty():
+    media = [make_media(storage_path="https://r2.example/1001/a.jpg")]
+    blocks = [make_block()]
+    stored = stored_post(media=media, blocks=blocks)
+
+    # Frisch aufgebaut: storage_path kommt erst beim Upload, darf den gespeicherten nicht löschen
+    diff = diff_post(make_post(), [make_media()], blocks, stored)
+
+    assert is_empty(diff)
+    assert describe(diff) == "unverändert"
+    assert count_requests(diff) == 0
+    assert diff["media_ids"] == {(1, 0): 100}
+
+
+def test_curated_post_columns_are_not_synced():
+    stored = stored_post(make_post(title="Split", actual_date="2025-01-01T00:00:00+00:00"))
+
+    diff = diff_post(make_post(summary="Neu"), [], [], stored)
+
+    assert diff["post"] == {"summary": "Neu"}
+    assert count_requests(diff) == 1
+
+
+def test_timestamps_compare_as_datetimes():
+    # PostgREST liefert eine andere Zeitzonen-Schreibweise für denselben Zeitpunkt
+    stored = stored_post(make_post(post_date="2026-03-01T11:00:00+01:00"))
+
+    assert diff_post(make_post(), [], [], stored)["post"] == {}
+    assert diff_post(make_post(post_date="2026-03-02T10:00:00+00:00"), [], [], stored)["post"] == {
+        "post_date": "2026-03-02T10:00:00+00:00"
+    }
+
+
+def test_media_insert_update_delete():
+    stored = stored_post(media=[make_media(1, 0), make_media(1, 1), make_media(2, 0)])
+    new_media = [
+        make_media(1, 0),                                  # unverändert
+        make_media(1, 1, original_url="https://x/b.jpg"),  # geändert
+        make_media(3, 0),                                  # neu
+    ]                                                      # (2, 0) entfernt
+
+    diff = diff_post(make_post(), new_media, [], stored)
+
+    assert diff["media_insert"] == [make_media(3, 0)]
+    assert diff["media_update"] == [(101, {"original_url": "https://x/b.jpg"})]
+    assert diff["media_delete"] == [102]
+    assert diff["media_ids"] == {(1, 0): 100, (1, 1): 101}
+    assert describe(diff) == "media +1 ~1 -1"
+    # Update, Delete und Insert gehen zusammen in einem apply_post_diff-Aufruf raus
+    assert count_requests(diff) == 1
+
+
+def test_media_keep_if_none_still_syncs_new_values():
+    stored = stored_post(media=[make_media(width=None, storage_path="https://r2.example/a.jpg")])
+
+    diff = diff_post(make_post(), [make_media(width=640, storage_path=None)], [], stored)
+
+    assert diff["media_update"] == [(100, {"width": 640})]
+
+
+def test_blocks_insert_update_delete():
+    stored = stored_post(blocks=[make_block(0), make_block(1), make_block(2)])
+    new_blocks = [make_block(0), make_block(1, text_content="Tschüss"), make_block(3)]
+
+    diff = diff_post(make_post(), [], new_blocks, stored)
+
+    assert diff["blocks_insert"] == [make_block(3)]
+    assert diff["blocks_update"] == [(201, {"text_content": "Tschüss"})]
+    assert diff["blocks_delete"] == [202]
+    assert describe(diff) == "blocks +1 ~1 -1"
+
+
+def test_post_removed_all_media_and_blocks():
+    stored = stored_post(media=[make_media(1, 0), make_media(1, 1)], blocks=[make_block(0)])
+
+    diff = diff_post(make_post(), [], [], stored)
+
+    assert diff["media_delete"] == [100, 101]
+    assert diff["blocks_delete"] == [200]
+    assert count_requests(diff) == 1
+
+
+class FakeRpc:
+    """Nimmt den apply_post_diff-Aufruf entgegen und antwortet wie die SQL-Funktion."""
+
+    def __init__(self, media):
+        self.calls = []
+        self.media = media
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        return self
+
+    def execute(self):
+        return type("Result", (), {"data": {"post_id": "1001", "media": self.media}})()
+
+
+def test_apply_diff_sends_one_transactional_rpc():
+    stored = stored_post(media=[make_media(1, 0), make_media(2, 0)], blocks=[make_block(0), make_block(1)])
+    media = [make_media(1, 0, width=640), make_media(3, 0)]
+    blocks = [make_block(0, text_content="Tschüss")]
+    diff = diff_post(make_post(summary="Neu"), media, blocks, stored)
+    client = FakeRpc([{"media_id": 100, "block_index": 1, "display_order": 0},
+                      {"media_id": 300, "block_index": 3, "display_order": 0}])
+
+    media_ids = apply_diff(client, "1001", diff)
+
+    assert media_ids == {(1, 0): 100, (3, 0): 300}
+    [(name, params)] = client.calls
+    assert name == "apply_post_diff"
+    assert params["doc"] == {
+        "post_id": "1001",
+        "post": {"summary": "Neu"},
+        "media_insert": [make_media(3, 0)],
+        "media_update": [{"media_id": 100, "changes": {"width": 640}}],
+        "media_delete": [101],
+        "blocks_insert": [],
+        "blocks_update": [{"block_id": 200, "changes": {"text_content": "Tschüss"}}],
+        "blocks_delete": [201],
+    }
+
+
+def test_changed_columns():
+    old = {"a": 1, "b": [1, 2], "c": "x"}
+
+    assert changed_columns({"a": 1, "b": [1, 2]}, old) == {}
+    assert changed_columns({"a": 2, "b": [2, 1]}, old) == {"a": 2, "b": [2, 1]}
+    # Nur die angefragten Spalten, fehlende werden übersprungen
+    assert changed_columns({"a": 2, "c": "y"}, old, columns=("c", "d")) == {"c": "y"}
+    # None löscht keep_if_none-Spalten nicht, andere schon
+    assert changed_columns({"a": None, "c": None}, old, keep_if_none={"c"}) == {"a": None}